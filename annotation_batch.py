@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+"""按标注布局批量渲染图片。
+
+每个任务是 (标签, AnnotationLayout, 目标路径)：可以是每张图片各自保存的
+.annotations.json，也可以是用 annotation_layout.with_image 把同一个布局套用到
+整个文件夹的图片。渲染和按大小限制编码（与标注工具保存时的策略相同）通过
+image_pipeline.map_ordered 分发到进程池，结果按提交顺序产出。
+
+绘制文字需要 QGuiApplication，每个子进程在第一次渲染时创建 offscreen 平台的应用；
+进程池使用 spawn 启动子进程，不继承父进程中已有的 Qt 状态。
+"""
+import functools
+import multiprocessing
+import os
+import sys
+import traceback
+
+import annotation_layout
+import image_pipeline
+import size_cap
+
+_app = None  # 子进程中的 QGuiApplication，保持引用以免被回收
+
+
+def ensure_gui_app():
+    """在当前进程中创建 offscreen 平台的 QGuiApplication（已有 Qt 应用时直接返回）。"""
+    global _app
+    os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+    from PyQt5.QtCore import QCoreApplication
+    from PyQt5.QtGui import QGuiApplication
+    app = QCoreApplication.instance()
+    if app is None:
+        app = _app = QGuiApplication([sys.argv[0] if sys.argv else 'annotation_batch'])
+    return app
+
+
+def template_jobs(layout, image_paths, output_dir, image_format='jpg'):
+    """把同一个布局套用到多张图片，返回 (标签, 布局, 目标路径) 任务列表；输出文件名重复时加序号。"""
+    jobs = []
+    used = set()
+    for image_path in image_paths:
+        stem = os.path.splitext(os.path.basename(image_path))[0]
+        name = f"{stem}.{image_format}"
+        counter = 1
+        while name.lower() in used:
+            name = f"{stem}_{counter}.{image_format}"
+            counter += 1
+        used.add(name.lower())
+        jobs.append((os.path.basename(image_path), annotation_layout.with_image(layout, image_path),
+                     os.path.join(output_dir, name)))
+    return jobs
+
+
+def _render_job(job, policy=size_cap.DEFAULT_POLICY):
+    label, layout, dest_path = job
+    try:
+        ensure_gui_app()
+        result = annotation_layout.render_to_file(layout, dest_path, policy)
+        return label, dest_path, None, (result.quality, result.attempts)
+    except Exception as e:
+        return label, dest_path, f"{str(e)}\n{traceback.format_exc()}", None
+
+
+def render_ordered(jobs, workers=1, chunk_size=1, policy=size_cap.DEFAULT_POLICY):
+    """渲染 (标签, 布局, 目标路径) 任务，按提交顺序产出 (标签, 目标路径, 错误信息, (质量, 编码次数))。
+
+    成功时错误信息为 None，失败时 (质量, 编码次数) 为 None。workers <= 1 时在当前进程中渲染。
+    """
+    return image_pipeline.map_ordered(functools.partial(_render_job, policy=policy), jobs, workers, chunk_size,
+                                      mp_context=multiprocessing.get_context('spawn'))
@@ -0,0 +1,143 @@
+# -*- coding: utf-8 -*-
+"""标注布局：以 JSON 保存的标注数据和不依赖窗口的渲染器。
+
+布局记录源图片、背景色、固定水平绘制所用的水平线位置，以及每个标注的文字、
+位置（图片像素坐标）、字体、字体大小、颜色和类型（normal 为编号标注，id 为 ID 标注）。
+同一版式的多张图片可以共用一个布局（with_image），由 annotation_batch 批量渲染。渲染时用 QTextDocument
+按与 QGraphicsTextItem 相同的方式绘制文字，因此在 offscreen 平台下也能批量生成
+与标注工具保存结果一致的图片。渲染需要先创建 QGuiApplication（字体依赖它）。
+"""
+import json
+import os
+from collections import namedtuple
+
+from PyQt5.QtCore import QBuffer, Qt
+from PyQt5.QtGui import (
+    QAbstractTextDocumentLayout, QColor, QFont, QImage, QPainter, QPalette, QTextDocument
+)
+
+import size_cap
+
+LAYOUT_VERSION = 1
+LAYOUT_SUFFIX = '.annotations.json'
+DEFAULT_FONT_FAMILY = 'Arial'
+
+# x, y: 文字框左上角在图片中的像素坐标；color: '#rrggbb'
+Annotation = namedtuple('Annotation', ['text', 'x', 'y', 'font_size', 'color', 'type', 'font_family'],
+                        defaults=('normal', DEFAULT_FONT_FAMILY))
+# image: 源图片的绝对路径；background: 背景色 '#rrggbb'；
+# fixed_y: 已固定的水平线的 y 坐标（图片像素），没有时为 None。水平线只用于对齐，不会被渲染
+AnnotationLayout = namedtuple('AnnotationLayout', ['image', 'background', 'annotations', 'fixed_y'],
+                              defaults=(None,))
+
+
+def layout_path(image_path):
+    """图片对应的标注文件路径，如 a.jpg -> a.annotations.json。"""
+    return os.path.splitext(image_path)[0] + LAYOUT_SUFFIX
+
+
+def save(path, layout):
+    """保存布局。图片路径相对标注文件所在目录保存，整个文件夹可以移动到其他机器。"""
+    base = os.path.dirname(os.path.abspath(path))
+    try:
+        image = os.path.relpath(os.path.abspath(layout.image), base)
+    except ValueError:
+        # Windows 上不在同一个盘符时无法计算相对路径
+        image = os.path.abspath(layout.image)
+    data = {
+        'version': LAYOUT_VERSION,
+        'image': image,
+        'background': layout.background,
+        'fixed_y': layout.fixed_y,
+        'annotations': [annotation._asdict() for annotation in layout.annotations],
+    }
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False, indent=1)
+
+
+def load(path):
+    """读取布局，返回 AnnotationLayout；版本不支持时抛出 ValueError。"""
+    with open(path, encoding='utf-8') as f:
+        data = json.load(f)
+    if data.get('version') != LAYOUT_VERSION:
+        raise ValueError(f"不支持的标注文件版本: {data.get('version')}")
+    base = os.path.dirname(os.path.abspath(path))
+    annotations = [
+        Annotation(**{field: item[field] for field in Annotation._fields if field in item})
+        for item in data.get('annotations', [])
+    ]
+    return AnnotationLayout(os.path.join(base, data['image']), data.get('background', '#ffffff'), annotations,
+                            data.get('fixed_y'))
+
+
+def with_image(layout, image_path):
+    """把布局套用到另一张图片（标注位置不变），用于同一版式的批量标注。"""
+    return layout._replace(image=os.path.abspath(image_path))
+
+
+def draw_annotation(painter, annotation):
+    """在 painter 上绘制一个标注，效果与 QGraphicsTextItem 相同（含默认的文档边距）。"""
+    document = QTextDocument()
+    font = QFont(annotation.font_family, annotation.font_size)
+    font.setKerning(True)
+    document.setDefaultFont(font)
+    document.setPlainText(annotation.text)
+    context = QAbstractTextDocumentLayout.PaintContext()
+    context.palette.setColor(QPalette.Text, QColor(annotation.color))
+    painter.save()
+    painter.translate(annotation.x, annotation.y)
+    document.documentLayout().draw(painter, context)
+    painter.restore()
+
+
+def render(layout, source=None):
+    """按布局渲染，返回与源图片同尺寸的 QImage。
+
+    source 为内存中的 QImage（如编辑过尚未写回的图片）时用它代替 layout.image。
+    只使用 QImage 和 QPainter，可以在非界面线程中调用。
+    """
+    if source is None:
+        source = QImage(layout.image)
+    if source.isNull():
+        raise IOError(f"无法读取图片: {layout.image}")
+    image = QImage(source.size(), QImage.Format_RGB32)
+    image.fill(QColor(layout.background))
+    painter = QPainter(image)
+    painter.setRenderHint(QPainter.Antialiasing)
+    painter.setRenderHint(QPainter.SmoothPixmapTransform)
+    painter.drawImage(0, 0, source)
+    for annotation in layout.annotations:
+        draw_annotation(painter, annotation)
+    painter.end()
+    return image
+
+
+def image_format_for(path):
+    return "PNG" if path.lower().endswith(".png") else "JPEG"
+
+
+def encode_qimage(image, image_format="JPEG", policy=None, estimator=size_cap.default_estimator):
+    """在内存中按策略编码 QImage（不超过800KB），返回 size_cap.EncodeResult。"""
+    def make_encoder(width, height):
+        scaled = image
+        if (width, height) != (image.width(), image.height()):
+            scaled = image.scaled(width, height, Qt.IgnoreAspectRatio, Qt.SmoothTransformation)
+
+        def encode(quality):
+            buffer = QBuffer()
+            buffer.open(QBuffer.ReadWrite)
+            if not scaled.save(buffer, image_format, quality):
+                raise IOError(f"无法以 {image_format} 格式编码图片")
+            return bytes(buffer.data())
+        return encode
+
+    policy = (policy or size_cap.DEFAULT_POLICY)._replace(max_quality=100)
+    return size_cap.encode_with_policy(image.width(), image.height(), make_encoder, policy, estimator)
+
+
+def render_to_file(layout, dest_path, policy=None, estimator=size_cap.default_estimator):
+    """渲染布局并按大小限制策略只写一次文件，返回 size_cap.EncodeResult。"""
+    result = encode_qimage(render(layout), image_format_for(dest_path), policy, estimator)
+    with open(dest_path, 'wb') as f:
+        f.write(result.data)
+    return result
@@ -0,0 +1,397 @@
+# -*- coding: utf-8 -*-
+"""流式读取压缩包中的图片成员。
+
+不再把整个压缩包 extractall 到临时目录，而是逐个读取图片成员的字节，
+非图片成员完全不解压。内存占用以单张图片（7z 为一个小批次）为上限。
+7z 支持 py7zr 0.x（SevenZipFile.read）和 1.x（SevenZipFile.extract 加内存写入器工厂）。
+
+threads > 1 时：zip 的成员由多个线程各自打开独立的文件句柄并行解压（zlib 解压时
+释放 GIL），按原顺序产出，同时在途的成员不超过线程数的两倍；tar.gz 只能顺序解压，
+改为在后台线程读取和解压，与调用方对图片的处理形成流水线。
+"""
+import os
+import queue
+import sys
+import tarfile
+import threading
+import zipfile
+from collections import deque, namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.bmp', '.gif')
+ARCHIVE_EXTENSIONS = ('.zip', '.7z', '.rar', '.tgz')
+
+# 7z 按批读取时每批解压后的最大字节数
+SEVEN_ZIP_BATCH_BYTES = 64 * 1024 * 1024
+
+# 并行解压的线程数上限，再多时通常受磁盘读取速度限制
+MAX_EXTRACT_THREADS = 4
+# tar.gz 后台线程最多预先解压的成员数
+TGZ_PIPELINE_DEPTH = 8
+
+
+# size: 解压后字节数；compressed_size: 压缩后字节数（tar.gz 为 None）；
+# crc: CRC-32（tar 没有时为 None）；method: 压缩方法名称
+ArchiveMember = namedtuple('ArchiveMember', ['name', 'size', 'compressed_size', 'crc', 'method'])
+# members: 按压缩包内顺序的图片成员；problems: 无法处理整个压缩包的问题（不为空时不应开始解压）
+ArchiveIndex = namedtuple('ArchiveIndex', ['kind', 'members', 'total_size', 'problems'])
+
+ZIP_METHODS = {
+    zipfile.ZIP_STORED: 'stored',
+    zipfile.ZIP_DEFLATED: 'deflate',
+    zipfile.ZIP_BZIP2: 'bzip2',
+    zipfile.ZIP_LZMA: 'lzma',
+}
+# zip 本地文件头的固定长度，用于判断成员数据是否超出文件末尾
+ZIP_LOCAL_HEADER_SIZE = 30
+
+
+def default_threads():
+    return max(1, min(MAX_EXTRACT_THREADS, os.cpu_count() or 1))
+
+
+def is_image_name(name):
+    return name.lower().endswith(IMAGE_EXTENSIONS)
+
+
+def archive_type(archive_path):
+    """根据扩展名返回压缩包类型（'zip'/'7z'/'rar'/'tgz'），不支持时返回 None。"""
+    lower = archive_path.lower()
+    for ext in ARCHIVE_EXTENSIONS:
+        if lower.endswith(ext):
+            return ext[1:]
+    return None
+
+
+def list_images(archive_path):
+    """按压缩包内顺序返回图片成员名列表，只读取目录/头信息。"""
+    kind = archive_type(archive_path)
+    if kind == 'zip':
+        with zipfile.ZipFile(archive_path, 'r') as zip_ref:
+            return [info.filename for info in zip_ref.infolist()
+                    if not info.is_dir() and is_image_name(info.filename)]
+    if kind == '7z':
+        import py7zr
+        with py7zr.SevenZipFile(archive_path, mode='r') as archive:
+            return [info.filename for info in archive.list()
+                    if not info.is_directory and is_image_name(info.filename)]
+    if kind == 'rar':
+        import rarfile
+        with rarfile.RarFile(archive_path, 'r') as rar_ref:
+            return [info.filename for info in rar_ref.infolist()
+                    if not info.isdir() and is_image_name(info.filename)]
+    if kind == 'tgz':
+        # gzip 没有中央目录，只能顺序读一遍头部（不写盘、不保留数据）
+        with tarfile.open(archive_path, 'r|gz') as tar_ref:
+            return [member.name for member in tar_ref
+                    if member.isfile() and is_image_name(member.name)]
+    raise ValueError(f"不支持的文件格式: {os.path.basename(archive_path)}")
+
+
+def scan(archive_path):
+    """只读取中央目录或文件头，建立图片成员索引并检查明显的问题。
+
+    zip/7z/rar 只读目录，很快；tar.gz 没有目录，需要顺序读一遍头部（不保留数据）。
+    压缩包本身无法打开时抛出 ValueError；加密、不支持的压缩方法、数据被截断等
+    问题记录在 ArchiveIndex.problems 中。
+    """
+    kind = archive_type(archive_path)
+    name = os.path.basename(archive_path)
+    if kind is None:
+        raise ValueError(f"不支持的文件格式: {name}")
+    try:
+        if kind == 'zip':
+            members, problems = _scan_zip(archive_path)
+        elif kind == '7z':
+            members, problems = _scan_7z(archive_path)
+        elif kind == 'rar':
+            members, problems = _scan_rar(archive_path)
+        else:
+            members, problems = _scan_tgz(archive_path)
+    except Exception as e:
+        raise ValueError(f"无法读取压缩包 {name}，文件可能已损坏: {e}") from e
+    return ArchiveIndex(kind, members, sum(member.size for member in members), problems)
+
+
+def _scan_zip(archive_path):
+    file_size = os.path.getsize(archive_path)
+    members, problems = [], []
+    with zipfile.ZipFile(archive_path, 'r') as zip_ref:
+        for info in zip_ref.infolist():
+            if info.is_dir() or not is_image_name(info.filename):
+                continue
+            method = ZIP_METHODS.get(info.compress_type)
+            if method is None:
+                problems.append(f"{info.filename}: 不支持的压缩方法 {info.compress_type}")
+            if info.flag_bits & 0x1:
+                problems.append(f"{info.filename}: 已加密")
+            data_end = (info.header_offset + ZIP_LOCAL_HEADER_SIZE + len(info.orig_filename.encode('utf-8'))
+                        + info.compress_size)
+            if data_end > file_size:
+                problems.append(f"{info.filename}: 数据超出文件末尾，压缩包可能不完整")
+            members.append(ArchiveMember(info.filename, info.file_size, info.compress_size, info.CRC,
+                                         method or str(info.compress_type)))
+    return members, problems
+
+
+def _scan_7z(archive_path):
+    import py7zr
+    members, problems = [], []
+    with py7zr.SevenZipFile(archive_path, mode='r') as archive:
+        if archive.needs_password():
+            problems.append("压缩包已加密")
+        method = ', '.join(archive.archiveinfo().method_names)
+        for info in archive.list():
+            if info.is_directory or not is_image_name(info.filename):
+                continue
+            members.append(ArchiveMember(info.filename, info.uncompressed or 0, info.compressed,
+                                         info.crc32, method))
+    return members, problems
+
+
+def _scan_rar(archive_path):
+    import rarfile
+    members, problems = [], []
+    with rarfile.RarFile(archive_path, 'r') as rar_ref:
+        if rar_ref.needs_password():
+            problems.append("压缩包已加密")
+        for info in rar_ref.infolist():
+            if info.isdir() or not is_image_name(info.filename):
+                continue
+            members.append(ArchiveMember(info.filename, info.file_size, info.compress_size, info.CRC,
+                                         f"rar{info.compress_type}"))
+    return members, problems
+
+
+def _scan_tgz(archive_path):
+    members, problems = [], []
+    try:
+        with tarfile.open(archive_path, 'r|gz') as tar_ref:
+            for member in tar_ref:
+                if member.isfile() and is_image_name(member.name):
+                    members.append(ArchiveMember(member.name, member.size, None, None, 'gzip'))
+    except (tarfile.ReadError, EOFError, OSError) as e:
+        # 已读到的成员仍然有效，但后面的数据已损坏或被截断
+        problems.append(f"压缩包在第 {len(members) + 1} 个图片成员附近损坏或不完整: {e}")
+    return members, problems
+
+
+def estimate_output_size(index, max_bytes):
+    """估计输出 JPEG 的总大小：每张图片不超过原大小，也不超过大小上限。"""
+    return sum(min(member.size, max_bytes) for member in index.members)
+
+
+def iter_images(archive_path, threads=1):
+    """按压缩包内顺序逐个产出 (成员名, 字节数据)。
+
+    threads > 1 时 zip 并行解压、tar.gz 在后台线程解压，7z 和 rar 不受影响。
+    7z 中没有被 py7zr 读出的成员产出 (成员名, None)，调用方应把它作为该图片的错误
+    报告，这样序号和进度仍与 scan() 的成员索引一一对应。
+    """
+    kind = archive_type(archive_path)
+    if kind == 'zip':
+        return _iter_zip_parallel(archive_path, threads) if threads > 1 else _iter_zip(archive_path)
+    if kind == '7z':
+        return _iter_7z(archive_path)
+    if kind == 'rar':
+        return _iter_rar(archive_path)
+    if kind == 'tgz':
+        return _iter_tgz_pipelined(archive_path) if threads > 1 else _iter_tgz(archive_path)
+    raise ValueError(f"不支持的文件格式: {os.path.basename(archive_path)}")
+
+
+def member_path(dest_dir, name):
+    """成员解压后的路径；拒绝绝对路径和 .. 等会写到 dest_dir 之外的成员名。"""
+    dest_dir = os.path.abspath(dest_dir)
+    path = os.path.abspath(os.path.join(dest_dir, name))
+    if os.path.commonpath([dest_dir, path]) != dest_dir:
+        raise ValueError(f"压缩包成员路径不安全: {name}")
+    return path
+
+
+def extract_images(archive_path, dest_dir, threads=1):
+    """只把图片成员写到 dest_dir（保留目录结构），按压缩包内顺序返回写出的路径。
+
+    有成员无法读取时写完其余成员后抛出 IOError。
+    """
+    paths = []
+    missing = []
+    for name, data in iter_images(archive_path, threads):
+        if data is None:
+            missing.append(name)
+            continue
+        path = member_path(dest_dir, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as f:
+            f.write(data)
+        paths.append(path)
+    if missing:
+        raise IOError(f"压缩包中有 {len(missing)} 个图片成员无法读取: {', '.join(missing[:5])}")
+    return paths
+
+
+def _iter_zip(archive_path):
+    with zipfile.ZipFile(archive_path, 'r') as zip_ref:
+        for info in zip_ref.infolist():
+            if info.is_dir() or not is_image_name(info.filename):
+                continue
+            with zip_ref.open(info) as member:
+                yield info.filename, member.read()
+
+
+def _iter_zip_parallel(archive_path, threads):
+    with zipfile.ZipFile(archive_path, 'r') as zip_ref:
+        infos = [info for info in zip_ref.infolist()
+                 if not info.is_dir() and is_image_name(info.filename)]
+
+    # 每个线程使用自己的 ZipFile，避免共享文件句柄时的加锁和来回 seek
+    local = threading.local()
+    handles = []
+    handles_lock = threading.Lock()
+
+    def read_member(info):
+        zip_ref = getattr(local, 'zip_ref', None)
+        if zip_ref is None:
+            zip_ref = local.zip_ref = zipfile.ZipFile(archive_path, 'r')
+            with handles_lock:
+                handles.append(zip_ref)
+        with zip_ref.open(info) as member:
+            return info.filename, member.read()
+
+    executor = ThreadPoolExecutor(max_workers=threads)
+    try:
+        pending = deque()
+        for info in infos:
+            pending.append(executor.submit(read_member, info))
+            if len(pending) >= threads * 2:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+    finally:
+        executor.shutdown(wait=True, cancel_futures=True)
+        for zip_ref in handles:
+            zip_ref.close()
+
+
+def _iter_7z(archive_path):
+    import py7zr
+    with py7zr.SevenZipFile(archive_path, mode='r') as archive:
+        entries = [info for info in archive.list()
+                   if not info.is_directory and is_image_name(info.filename)]
+        # py7zr 只能按目标列表整体读取，这里按解压后大小分批，限制峰值内存
+        batch, batch_bytes = [], 0
+        for info in entries:
+            batch.append(info.filename)
+            batch_bytes += info.uncompressed or 0
+            if batch_bytes >= SEVEN_ZIP_BATCH_BYTES:
+                yield from _read_7z_batch(archive, batch)
+                batch, batch_bytes = [], 0
+        if batch:
+            yield from _read_7z_batch(archive, batch)
+
+
+def _memory_factory():
+    """py7zr 1.x extract(factory=...) 使用的内存写入器工厂，同名成员按出现顺序分别保存。"""
+    from py7zr.io import BytesIOFactory
+
+    class MemoryFactory(BytesIOFactory):
+        def __init__(self):
+            super().__init__(limit=sys.maxsize)
+            self.members = {}
+
+        def create(self, filename):
+            product = super().create(filename)
+            self.members.setdefault(filename, deque()).append(product)
+            return product
+
+    return MemoryFactory()
+
+
+def _read_7z_batch(archive, names):
+    """按 names 的顺序产出这一批成员；没有读出的成员（如 0.x 中的重名成员）数据为 None。"""
+    archive.reset()
+    if hasattr(archive, 'read'):
+        # py7zr 0.x：返回 {成员名: BytesIO}，重名成员只保留一个
+        data = archive.read(targets=names)
+        for name in names:
+            member = data.pop(name, None)
+            yield name, member.read() if member is not None else None
+        return
+    factory = _memory_factory()
+    archive.extract(targets=names, factory=factory)
+    for name in names:
+        products = factory.members.get(name)
+        if not products:
+            yield name, None
+            continue
+        member = products.popleft()
+        member.seek(0)
+        yield name, member.read()
+
+
+def _iter_rar(archive_path):
+    import rarfile
+    with rarfile.RarFile(archive_path, 'r') as rar_ref:
+        for info in rar_ref.infolist():
+            if info.isdir() or not is_image_name(info.filename):
+                continue
+            with rar_ref.open(info) as member:
+                yield info.filename, member.read()
+
+
+def _iter_tgz(archive_path):
+    # 'r|gz' 为流模式，只顺序解压一遍
+    with tarfile.open(archive_path, 'r|gz') as tar_ref:
+        for member in tar_ref:
+            if not member.isfile() or not is_image_name(member.name):
+                continue
+            member_file = tar_ref.extractfile(member)
+            if member_file is not None:
+                yield member.name, member_file.read()
+
+
+class _PipelineError:
+    def __init__(self, error):
+        self.error = error
+
+
+_PIPELINE_DONE = object()
+
+
+def _iter_tgz_pipelined(archive_path):
+    """在后台线程中读取并解压 tar.gz，调用方处理当前图片时下一张已在解压。"""
+    results = queue.Queue(maxsize=TGZ_PIPELINE_DEPTH)
+    stop = threading.Event()
+
+    def put(item):
+        # 调用方提前停止时不再阻塞在已满的队列上
+        while not stop.is_set():
+            try:
+                results.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def produce():
+        try:
+            for item in _iter_tgz(archive_path):
+                if not put(item):
+                    return
+            put(_PIPELINE_DONE)
+        except BaseException as e:
+            put(_PipelineError(e))
+
+    thread = threading.Thread(target=produce, name="tgz-reader", daemon=True)
+    thread.start()
+    try:
+        while True:
+            item = results.get()
+            if item is _PIPELINE_DONE:
+                return
+            if isinstance(item, _PipelineError):
+                raise item.error
+            yield item
+    finally:
+        stop.set()
+        thread.join()
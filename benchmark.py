@@ -0,0 +1,443 @@
+# -*- coding: utf-8 -*-
+"""可重复的性能基准：生成合成图片和压缩包，逐个阶段计时。
+
+    python benchmark.py --count 40 --output result.json
+    python benchmark.py --baseline result.json --max-regression 0.2
+
+语料由固定随机种子生成：JPEG/PNG/BMP/GIF 混合格式，多种尺寸，低熵（渐变）、
+高熵（噪声）和混合内容，并打包为 zip、7z（安装了 py7zr 时）和 tar.gz。
+
+语料生成和每个阶段都在单独的子进程（spawn）中运行，互不影响内存峰值；Linux 上
+ru_maxrss 会继承父进程的峰值，因此阶段开始时通过 /proc/self/clear_refs 重置并读取 VmHWM。结果为 JSON：
+每个阶段的吞吐量（张/秒、MB/秒）、单张延迟百分位和峰值 RSS。指定 --baseline
+时，任何阶段的吞吐量比基准下降超过 --max-regression 则退出码为 1。某个阶段出错时
+其结果只记录 error，其余阶段照常运行，退出码同样为 1。
+"""
+import argparse
+import io
+import json
+import math
+import multiprocessing
+import os
+import platform
+import random
+import sys
+import tarfile
+import tempfile
+import time
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+
+import size_cap
+
+CORPUS_VERSION = 1
+DEFAULT_SIZES = ((640, 480), (1600, 1200), (3000, 2000), (4000, 3000))
+# JPEG 占多数，与实际使用时的比例接近
+FORMATS = ('JPEG', 'JPEG', 'JPEG', 'PNG', 'BMP', 'GIF')
+ENTROPIES = ('low', 'mixed', 'high')
+EXTENSIONS = {'JPEG': '.jpg', 'PNG': '.png', 'BMP': '.bmp', 'GIF': '.gif'}
+THUMBNAIL_SIZE = 128
+CM_TO_PIXELS = 37.795275591
+CATALOG_HEIGHT_CM = 6.7
+
+
+# ---------------------------------------------------------------- 语料
+
+def synthetic_image(rng, size, entropy):
+    """生成指定熵的 RGB 图片：low 为渐变，high 为随机噪声，mixed 为两者混合。"""
+    from PIL import Image
+
+    width, height = size
+    gradient = Image.linear_gradient('L')
+    base = Image.merge('RGB', (
+        gradient.resize((width, height)),
+        gradient.transpose(Image.ROTATE_90).resize((width, height)),
+        gradient.transpose(Image.FLIP_TOP_BOTTOM).resize((width, height)),
+    ))
+    if entropy == 'low':
+        return base
+    noise = Image.frombytes('RGB', (width, height), rng.randbytes(width * height * 3))
+    if entropy == 'high':
+        return noise
+    return Image.blend(base, noise, 0.25)
+
+
+def corpus_params(args):
+    return {'version': CORPUS_VERSION, 'count': args.count, 'seed': args.seed,
+            'sizes': [list(size) for size in args.sizes]}
+
+
+def build_corpus(directory, params):
+    """在 directory 中生成图片和压缩包；参数相同的语料已存在时直接复用。"""
+    from PIL import Image
+
+    index_path = os.path.join(directory, 'corpus.json')
+    if os.path.isfile(index_path):
+        with open(index_path, encoding='utf-8') as f:
+            corpus = json.load(f)
+        if corpus.get('params') == params:
+            return corpus
+
+    rng = random.Random(params['seed'])
+    image_dir = os.path.join(directory, 'images')
+    os.makedirs(image_dir, exist_ok=True)
+    images = []
+    for index in range(params['count']):
+        image_format = rng.choice(FORMATS)
+        size = tuple(rng.choice(params['sizes']))
+        entropy = rng.choice(ENTROPIES)
+        image = synthetic_image(rng, size, entropy)
+        path = os.path.join(image_dir, f"img{index:04d}_{entropy}{EXTENSIONS[image_format]}")
+        if image_format == 'GIF':
+            image = image.convert('P', palette=Image.ADAPTIVE)
+        if image_format == 'JPEG':
+            image.save(path, format='JPEG', quality=92)
+        else:
+            image.save(path, format=image_format)
+        images.append({'path': path, 'format': image_format, 'size': list(size), 'entropy': entropy,
+                       'bytes': os.path.getsize(path)})
+
+    archives = {}
+    zip_path = os.path.join(directory, 'corpus.zip')
+    with zipfile.ZipFile(zip_path, 'w', zipfile.ZIP_DEFLATED) as zf:
+        for item in images:
+            zf.write(item['path'], os.path.basename(item['path']))
+    archives['zip'] = zip_path
+
+    tgz_path = os.path.join(directory, 'corpus.tgz')
+    with tarfile.open(tgz_path, 'w:gz') as tf:
+        for item in images:
+            tf.add(item['path'], os.path.basename(item['path']))
+    archives['tgz'] = tgz_path
+
+    try:
+        import py7zr
+    except ImportError:
+        pass
+    else:
+        seven_zip_path = os.path.join(directory, 'corpus.7z')
+        with py7zr.SevenZipFile(seven_zip_path, 'w') as archive:
+            for item in images:
+                archive.write(item['path'], os.path.basename(item['path']))
+        archives['7z'] = seven_zip_path
+
+    corpus = {'params': params, 'images': images, 'archives': archives}
+    with open(index_path, 'w', encoding='utf-8') as f:
+        json.dump(corpus, f, ensure_ascii=False, indent=1)
+    return corpus
+
+
+# ---------------------------------------------------------------- 阶段
+# 每个阶段返回 [(单张耗时秒, 输入字节数)]
+
+def stage_extract(corpus, options, kind):
+    import archive_stream
+
+    samples = []
+    start = time.perf_counter()
+    for name, data in archive_stream.iter_images(corpus['archives'][kind], options['extract_threads']):
+        if data is None:
+            raise IOError(f"无法从压缩包中读取: {name}")
+        now = time.perf_counter()
+        samples.append((now - start, len(data)))
+        start = now
+    return samples
+
+
+def stage_decode(corpus, options):
+    from PIL import Image
+
+    samples = []
+    for item in corpus['images']:
+        start = time.perf_counter()
+        with Image.open(item['path']) as image:
+            image.load()
+        samples.append((time.perf_counter() - start, item['bytes']))
+    return samples
+
+
+def stage_encode(corpus, options):
+    from PIL import Image
+
+    samples = []
+    for item in corpus['images']:
+        with Image.open(item['path']) as image:
+            image = image.convert('RGB')
+        start = time.perf_counter()
+        buffer = io.BytesIO()
+        image.save(buffer, format='JPEG', quality=95)
+        samples.append((time.perf_counter() - start, item['bytes']))
+    return samples
+
+
+def stage_size_cap(corpus, options):
+    import image_pipeline
+
+    policy = size_cap.POLICIES[options['policy']]
+    samples = []
+    with tempfile.TemporaryDirectory() as out_dir:
+        for index, item in enumerate(corpus['images']):
+            start = time.perf_counter()
+            image_pipeline.reencode_to_jpeg(item['path'], os.path.join(out_dir, f"{index}.jpg"), policy)
+            samples.append((time.perf_counter() - start, item['bytes']))
+    return samples
+
+
+def stage_size_cap_pool(corpus, options):
+    """进程池版本的限制大小阶段，单张耗时为相邻两个结果之间的间隔。"""
+    import image_pipeline
+
+    policy = size_cap.POLICIES[options['policy']]
+    with tempfile.TemporaryDirectory() as out_dir:
+        jobs = [(item['path'], item['path'], os.path.join(out_dir, f"{index}.jpg"))
+                for index, item in enumerate(corpus['images'])]
+        sizes = {item['path']: item['bytes'] for item in corpus['images']}
+        samples = []
+        start = time.perf_counter()
+        for label, _, error, _, _ in image_pipeline.reencode_ordered(jobs, options['jobs'], 4, policy):
+            if error:
+                raise RuntimeError(error)
+            now = time.perf_counter()
+            samples.append((now - start, sizes[label]))
+            start = now
+    return samples
+
+
+def stage_thumbnail(corpus, options):
+    import image_probe
+    import thumbnail_cache
+
+    samples = []
+    for item in corpus['images']:
+        start = time.perf_counter()
+        thumbnail_cache.encode_thumbnail(image_probe.thumbnail(item['path'], THUMBNAIL_SIZE))
+        samples.append((time.perf_counter() - start, item['bytes']))
+    return samples
+
+
+def stage_excel_save(corpus, options):
+    """按默认设置（高 6.7cm、2 倍嵌入分辨率）把所有图片写入流式 xlsx。"""
+    import catalog_prepare
+    import xlsx_stream
+
+    display_height = CATALOG_HEIGHT_CM * CM_TO_PIXELS
+    samples = []
+    with tempfile.TemporaryDirectory() as out_dir:
+        writer = xlsx_stream.StreamingCatalogWriter(os.path.join(out_dir, 'catalog.xlsx'))
+        for row, item in enumerate(corpus['images'], start=2):
+            start = time.perf_counter()
+            probe = catalog_prepare.probe_image(item['path'])
+            display_width = probe.width * display_height / probe.height
+            data, image_format = catalog_prepare.embed_bytes(
+                item['path'], probe.format, (display_width, display_height), catalog_prepare.DEFAULT_EMBED_SCALE)
+            writer.set_cell(row, 1, os.path.basename(item['path']))
+            writer.add_image(data, image_format, 1, row - 1, 0, 0, display_width, display_height)
+            samples.append((time.perf_counter() - start, item['bytes']))
+        # 最后生成工作表和绘图部件的时间计入最后一张
+        start = time.perf_counter()
+        writer.close()
+        if samples:
+            latency, size = samples[-1]
+            samples[-1] = (latency + time.perf_counter() - start, size)
+    return samples
+
+
+STAGES = {
+    'extract_zip': (stage_extract, {'kind': 'zip'}),
+    'extract_7z': (stage_extract, {'kind': '7z'}),
+    'extract_tgz': (stage_extract, {'kind': 'tgz'}),
+    'decode': (stage_decode, {}),
+    'encode': (stage_encode, {}),
+    'size_cap': (stage_size_cap, {}),
+    'size_cap_pool': (stage_size_cap_pool, {}),
+    'thumbnail': (stage_thumbnail, {}),
+    'excel_save': (stage_excel_save, {}),
+}
+
+
+# ---------------------------------------------------------------- 统计
+
+def reset_peak_rss():
+    """把当前进程的峰值常驻内存重置为当前值（仅 Linux），返回是否成功。"""
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+        return True
+    except OSError:
+        return False
+
+
+def _linux_hwm_mb():
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return None
+
+
+def peak_rss_mb():
+    """当前进程的峰值常驻内存（MB）。"""
+    if sys.platform.startswith('win'):
+        import ctypes
+        from ctypes import wintypes
+
+        class ProcessMemoryCounters(ctypes.Structure):
+            _fields_ = [('cb', wintypes.DWORD), ('PageFaultCount', wintypes.DWORD),
+                        ('PeakWorkingSetSize', ctypes.c_size_t), ('WorkingSetSize', ctypes.c_size_t),
+                        ('QuotaPeakPagedPoolUsage', ctypes.c_size_t), ('QuotaPagedPoolUsage', ctypes.c_size_t),
+                        ('QuotaPeakNonPagedPoolUsage', ctypes.c_size_t), ('QuotaNonPagedPoolUsage', ctypes.c_size_t),
+                        ('PagefileUsage', ctypes.c_size_t), ('PeakPagefileUsage', ctypes.c_size_t)]
+
+        counters = ProcessMemoryCounters()
+        counters.cb = ctypes.sizeof(counters)
+        ctypes.windll.psapi.GetProcessMemoryInfo(
+            ctypes.windll.kernel32.GetCurrentProcess(), ctypes.byref(counters), counters.cb)
+        return counters.PeakWorkingSetSize / (1024 * 1024)
+    hwm = _linux_hwm_mb()
+    if hwm is not None:
+        return hwm
+    import resource
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux 以 KB 为单位，macOS 以字节为单位
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    # 最近秩法
+    index = min(len(sorted_values) - 1, max(0, math.ceil(fraction * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+def run_stage(name, corpus, options):
+    """在子进程中运行一个阶段，返回统计结果。"""
+    function, kwargs = STAGES[name]
+    reset_peak_rss()
+    start = time.perf_counter()
+    samples = function(corpus, options, **kwargs)
+    total = time.perf_counter() - start
+    latencies = sorted(latency * 1000 for latency, _ in samples)
+    input_mb = sum(size for _, size in samples) / (1024 * 1024)
+    return {
+        'count': len(samples),
+        'total_s': round(total, 4),
+        'items_per_s': round(len(samples) / total, 2) if total else 0.0,
+        'mb_per_s': round(input_mb / total, 2) if total else 0.0,
+        'latency_ms': {
+            'p50': round(percentile(latencies, 0.50), 2),
+            'p90': round(percentile(latencies, 0.90), 2),
+            'p99': round(percentile(latencies, 0.99), 2),
+            'mean': round(sum(latencies) / len(latencies), 2) if latencies else 0.0,
+            'max': round(latencies[-1], 2) if latencies else 0.0,
+        },
+        'peak_rss_mb': round(peak_rss_mb(), 1),
+    }
+
+
+def compare(report, baseline, max_regression):
+    """返回吞吐量比基准下降超过 max_regression 的阶段说明。"""
+    regressions = []
+    for name, result in report['stages'].items():
+        base = baseline.get('stages', {}).get(name)
+        if 'error' in result or not base or not base.get('items_per_s'):
+            continue
+        ratio = result['items_per_s'] / base['items_per_s']
+        result['vs_baseline'] = round(ratio, 3)
+        if ratio < 1 - max_regression:
+            regressions.append(f"{name}: {result['items_per_s']}/s，基准 {base['items_per_s']}/s（{ratio:.0%}）")
+    return regressions
+
+
+def environment():
+    info = {'python': platform.python_version(), 'platform': platform.platform(),
+            'cpu_count': os.cpu_count()}
+    try:
+        import PIL
+        info['pillow'] = PIL.__version__
+    except ImportError:
+        pass
+    return info
+
+
+def parse_size(text):
+    width, height = text.lower().split('x')
+    return int(width), int(height)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="图片处理流程的性能基准")
+    parser.add_argument('--count', type=int, default=40, help="合成图片数量")
+    parser.add_argument('--seed', type=int, default=20241111, help="随机种子")
+    parser.add_argument('--sizes', type=parse_size, nargs='+', default=list(DEFAULT_SIZES),
+                        help="候选尺寸，如 640x480 4000x3000")
+    parser.add_argument('--corpus-dir', help="语料目录（默认临时目录，参数相同时复用）")
+    parser.add_argument('--stages', nargs='+', choices=sorted(STAGES), default=list(STAGES))
+    parser.add_argument('--jobs', type=int, default=os.cpu_count() or 1, help="size_cap_pool 阶段的进程数")
+    parser.add_argument('--extract-threads', type=int, default=1, help="extract 阶段的解压线程数")
+    parser.add_argument('--policy', choices=sorted(size_cap.POLICIES), default='quality',
+                        help="size_cap 阶段使用的策略")
+    parser.add_argument('--output', help="把 JSON 结果写入文件")
+    parser.add_argument('--baseline', help="与之比较的历史结果 JSON")
+    parser.add_argument('--max-regression', type=float, default=0.2, help="允许的吞吐量下降比例")
+    args = parser.parse_args(argv)
+
+    params = corpus_params(args)
+    temp_dir = None
+    corpus_dir = args.corpus_dir
+    if corpus_dir is None:
+        temp_dir = tempfile.TemporaryDirectory()
+        corpus_dir = temp_dir.name
+    os.makedirs(corpus_dir, exist_ok=True)
+
+    try:
+        start = time.perf_counter()
+        spawn = multiprocessing.get_context('spawn')
+        # 在子进程中生成语料，父进程的内存峰值不会被阶段子进程继承
+        with ProcessPoolExecutor(max_workers=1, mp_context=spawn) as executor:
+            corpus = executor.submit(build_corpus, corpus_dir, params).result()
+        report = {
+            'environment': environment(),
+            'corpus': {**params, 'total_mb': round(sum(item['bytes'] for item in corpus['images']) / (1024 * 1024), 2),
+                       'archives': sorted(corpus['archives']), 'build_s': round(time.perf_counter() - start, 2)},
+            'stages': {},
+        }
+        options = {'jobs': args.jobs, 'policy': args.policy, 'extract_threads': args.extract_threads}
+        failures = []
+        for name in args.stages:
+            if name.startswith('extract_') and name[len('extract_'):] not in corpus['archives']:
+                continue
+            # 每个阶段使用新的子进程，峰值内存互不影响；单个阶段出错不影响其他阶段
+            try:
+                with ProcessPoolExecutor(max_workers=1, mp_context=spawn) as executor:
+                    report['stages'][name] = executor.submit(run_stage, name, corpus, options).result()
+            except Exception as e:
+                report['stages'][name] = {'error': f"{type(e).__name__}: {e}"}
+                failures.append(f"{name}: {report['stages'][name]['error']}")
+                print(f"{name}: 出错 {report['stages'][name]['error']}", file=sys.stderr, flush=True)
+                continue
+            print(f"{name}: {report['stages'][name]['items_per_s']} 张/秒", file=sys.stderr, flush=True)
+
+        if args.baseline:
+            with open(args.baseline, encoding='utf-8') as f:
+                regressions = compare(report, json.load(f), args.max_regression)
+            report['regressions'] = regressions
+            failures.extend(regressions)
+
+        text = json.dumps(report, ensure_ascii=False, indent=1)
+        if args.output:
+            with open(args.output, 'w', encoding='utf-8') as f:
+                f.write(text)
+        print(text)
+        return 1 if failures else 0
+    finally:
+        if temp_dir is not None:
+            temp_dir.cleanup()
+
+
+if __name__ == "__main__":
+    multiprocessing.freeze_support()
+    sys.exit(main())
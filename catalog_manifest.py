@@ -0,0 +1,65 @@
+# -*- coding: utf-8 -*-
+"""Excel 图片目录的增量导出清单。
+
+清单以 JSON 保存在 xlsx 旁边（如 converted.xlsx.manifest.json），记录每张已导出
+图片的文件大小、修改时间、SHA-1、ID、行号、显示尺寸和在 xlsx 中的媒体部件名。
+再次导出时未变化的图片直接复制已有的媒体部件，只有新增或修改的图片需要重新处理；
+已删除的图片保留原来的行并标记为已删除。导出设置不同时清单失效，需要完整导出。
+"""
+import hashlib
+import json
+import os
+
+MANIFEST_VERSION = 1
+MANIFEST_SUFFIX = '.manifest.json'
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+def manifest_path(output_path):
+    return output_path + MANIFEST_SUFFIX
+
+
+def file_sha1(path):
+    digest = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def is_unchanged(entry, stat):
+    """大小和修改时间都没变时认为文件未变化，不必重新计算哈希。"""
+    return entry.get('size') == stat.st_size and entry.get('mtime_ns') == stat.st_mtime_ns
+
+
+def load(output_path, settings):
+    """读取清单；清单或 xlsx 不存在、清单损坏或导出设置不同时返回 None。"""
+    path = manifest_path(output_path)
+    if not os.path.isfile(path) or not os.path.isfile(output_path):
+        return None
+    try:
+        with open(path, encoding='utf-8') as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if manifest.get('version') != MANIFEST_VERSION or manifest.get('settings') != settings:
+        return None
+    return manifest
+
+
+def save(output_path, settings, entries):
+    """写入清单，先写临时文件再替换，避免中断时留下损坏的清单。"""
+    path = manifest_path(output_path)
+    temp_path = path + '.tmp'
+    with open(temp_path, 'w', encoding='utf-8') as f:
+        json.dump({'version': MANIFEST_VERSION, 'settings': settings, 'entries': entries},
+                  f, ensure_ascii=False, indent=1)
+    os.replace(temp_path, path)
+
+
+def remove(output_path):
+    """完整导出覆盖 xlsx 后，旧清单已与文件不符，删除它。"""
+    try:
+        os.remove(manifest_path(output_path))
+    except FileNotFoundError:
+        pass
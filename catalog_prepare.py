@@ -0,0 +1,104 @@
+# -*- coding: utf-8 -*-
+"""Excel 图片目录的单张图片准备阶段。
+
+Excel 只按单元格大小显示图片，但默认会嵌入原始文件。embed_bytes 按显示尺寸的
+倍数（相当于 96 DPI 的倍数）重新采样并编码，只嵌入实际需要的像素。
+
+MPO、GIF、BMP、CMYK 和 16 位 PNG 等格式由 image_normalize 在内存中转换，
+不在用户文件夹中写任何中间文件。probe_image 和 prepare_embed 是模块级函数，可以交给 image_pipeline.map_ordered
+在进程池中执行，由 ExcelWorker 在单线程中按顺序组装工作簿。
+"""
+import os
+import time
+from collections import namedtuple
+
+from PIL import Image
+
+import catalog_manifest
+import image_normalize
+import size_cap
+import stage_trace
+
+EMBED_JPEG_QUALITY = 90
+
+# 嵌入分辨率选项：显示尺寸的倍数，0 表示嵌入原图
+EMBED_SCALES = {
+    0: "原图（不缩小）",
+    1: "1 倍（96 DPI）",
+    2: "2 倍（192 DPI，推荐）",
+    3: "3 倍（288 DPI，适合打印）",
+}
+DEFAULT_EMBED_SCALE = 2
+
+# 只读文件头很快，探测阶段使用更大的批次以减少进程间通信
+PROBE_CHUNK_SIZE = 32
+
+# format: 嵌入时使用的格式（JPEG 或 PNG）；warning 不为 None 时该图片应跳过；
+# sha1: 增量导出时的文件哈希，不需要时为 None；seconds: 探测（及计算哈希）的耗时
+ProbeResult = namedtuple('ProbeResult', ['path', 'width', 'height', 'format', 'warning', 'sha1', 'seconds'],
+                         defaults=(None, None))
+
+
+def embed_size(display_size, scale):
+    """显示尺寸（像素）乘以倍数后的目标像素尺寸。"""
+    return max(1, round(display_size[0] * scale)), max(1, round(display_size[1] * scale))
+
+
+def embed_bytes(path, image_format, display_size, scale=DEFAULT_EMBED_SCALE, timer=None):
+    """返回嵌入 Excel 用的 (字节, 格式)。
+
+    原图比目标尺寸大时在内存中归一化、缩小并重新编码；否则普通 JPEG/PNG 直接
+    返回原文件内容，其他格式返回归一化后的结果。scale <= 0 表示不缩小。
+    timer 为 stage_trace.StageTimer 时记录各阶段的耗时。
+    """
+    timer = timer or stage_trace.StageTimer()
+    with Image.open(path) as im:
+        target = embed_size(display_size, scale) if scale > 0 else None
+        if target and target[0] < im.width and target[1] < im.height:
+            if im.format in ('JPEG', 'MPO'):
+                # 在 DCT 域先缩小到不小于目标的尺寸，避免全分辨率解码
+                im.draft(im.mode, target)
+            timer.mark('open')
+            image, embed_format = image_normalize.for_embed(im)
+            timer.mark('convert')
+            image = size_cap.resize_pil(image, target)
+            timer.mark('resize', pixels=target[0] * target[1])
+            data = image_normalize.encode(image, embed_format, EMBED_JPEG_QUALITY)
+            timer.mark('encode', len(data), quality=EMBED_JPEG_QUALITY, attempts=1)
+            return data, embed_format
+        normalize = image_normalize.needs_normalize(im)
+    timer.mark('open')
+    if normalize:
+        normalized = image_normalize.normalize_file(path)
+        timer.mark('convert', len(normalized.data))
+        return normalized.data, normalized.format
+    with open(path, 'rb') as f:
+        data = f.read()
+    timer.mark('read', len(data))
+    return data, image_format
+
+
+def probe_image(image_path, with_hash=False):
+    """只读取文件头得到尺寸和嵌入格式，返回 ProbeResult；with_hash 时同时计算文件的 SHA-1。"""
+    image_name = os.path.basename(image_path)
+    start = time.perf_counter()
+    try:
+        with Image.open(image_path) as im:
+            result = ProbeResult(image_path, im.width, im.height, image_normalize.embed_format(im), None)
+        if with_hash:
+            result = result._replace(sha1=catalog_manifest.file_sha1(image_path))
+        return result._replace(seconds=time.perf_counter() - start)
+    except Exception as e:
+        return ProbeResult(image_path, None, None, None, f"无法打开图像文件 {image_name}，跳过。错误: {str(e)}",
+                           seconds=time.perf_counter() - start)
+
+
+def prepare_embed(job):
+    """处理 (路径, 格式, 显示尺寸, 倍数) 任务，返回 (字节, 格式, 错误信息, 阶段耗时)。"""
+    image_path, image_format, display_size, scale = job
+    timer = stage_trace.StageTimer()
+    try:
+        data, embed_format = embed_bytes(image_path, image_format, display_size, scale, timer)
+        return data, embed_format, None, timer.stages
+    except Exception as e:
+        return None, image_format, str(e), timer.stages
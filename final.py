@@ -4,23 +4,11 @@ from PyQt5.QtWidgets import (QApplication, QMainWindow, QPushButton, QVBoxLayout
                              QLineEdit, QInputDialog, QProgressBar, QSizePolicy)
 from PyQt5.QtGui import QPixmap, QPainter, QIcon, QPen, QColor, QFont, QImage
 from PyQt5.QtCore import Qt, QPoint, QThread, pyqtSignal
-from PIL import Image, ImageDraw, ImageFont
 import os
-import openpyxl
-from openpyxl import Workbook
-from openpyxl.drawing.image import Image as OpenpyxlImage
-from openpyxl.styles import Font, Alignment
-from openpyxl.drawing.spreadsheet_drawing import AnchorMarker, OneCellAnchor
-from openpyxl.utils.units import pixels_to_EMU
-from openpyxl.drawing.xdr import XDRPositiveSize2D
-import zipfile
-import py7zr  # For .7z files
-import rarfile  # For .rar files
-import tarfile  # For .tgz files
-import tempfile
-import shutil  # To remove temp folder
-from PIL import Image as PILImage  # 使用PIL来获取图片的宽高
-rarfile.UNRAR_TOOL = "D:/WinRar/UnRAR.exe"
+
+# PIL、openpyxl、py7zr、rarfile 等较重的模块在对应功能开始处理时才导入，
+# 启动主界面只需要 PyQt5（用 startup_report.py 检查导入耗时）。
+UNRAR_TOOL = "D:/WinRar/UnRAR.exe"
 
 
 class ImageLabel(QLabel):
@@ -484,6 +472,9 @@ class DecompressRenameWindow(QMainWindow):
 
     def decompress_and_rename(self):
         try:
+            import tempfile
+            from PIL import Image
+
             prefix = self.prefix_input.text().strip() or "BRSF10"
 
             if not self.selected_file:
@@ -554,6 +545,8 @@ class DecompressRenameWindow(QMainWindow):
         image_size_kb = os.path.getsize(image_path) / 1024  # Get size in KB
 
         if image_size_kb > max_size_kb:
+            from PIL import Image
+
             quality = 90  # 开始的压缩质量参数，尽量保持高质量
             with Image.open(image_path) as img:
                 while image_size_kb > max_size_kb and quality > 10:
@@ -562,6 +555,8 @@ class DecompressRenameWindow(QMainWindow):
                     image_size_kb = os.path.getsize(image_path) / 1024
 
     def extract_zip(self, extract_dir):
+        import zipfile
+
         with zipfile.ZipFile(self.selected_file, 'r') as zip_ref:
             zip_ref.extractall(extract_dir)
             self.image_paths = [os.path.join(extract_dir, name) for name in zip_ref.namelist()
@@ -569,6 +564,8 @@ class DecompressRenameWindow(QMainWindow):
 
     def extract_7z(self, extract_dir):
         try:
+            import py7zr  # For .7z files
+
             with py7zr.SevenZipFile(self.selected_file, mode='r') as archive:
                 archive.extractall(path=extract_dir)
                 self.image_paths = [os.path.join(extract_dir, name) for name in archive.getnames()
@@ -578,6 +575,9 @@ class DecompressRenameWindow(QMainWindow):
 
     def extract_rar(self, extract_dir):
         try:
+            import rarfile  # For .rar files
+            rarfile.UNRAR_TOOL = UNRAR_TOOL
+
             with rarfile.RarFile(self.selected_file, 'r') as rar_ref:
                 rar_ref.extractall(extract_dir)
                 self.image_paths = [os.path.join(extract_dir, name) for name in rar_ref.namelist()
@@ -587,6 +587,8 @@ class DecompressRenameWindow(QMainWindow):
 
     def extract_tgz(self, extract_dir):
         try:
+            import tarfile  # For .tgz files
+
             with tarfile.open(self.selected_file, 'r:gz') as tar_ref:
                 tar_ref.extractall(extract_dir)
                 self.image_paths = [os.path.join(extract_dir, member.name) for member in tar_ref.getmembers()
@@ -609,6 +611,14 @@ class ExcelWorker(QThread):
 
     def run(self):
         try:
+            from openpyxl import Workbook
+            from openpyxl.drawing.image import Image as OpenpyxlImage
+            from openpyxl.styles import Font, Alignment
+            from openpyxl.drawing.spreadsheet_drawing import AnchorMarker, OneCellAnchor
+            from openpyxl.utils.units import pixels_to_EMU
+            from openpyxl.drawing.xdr import XDRPositiveSize2D
+            from PIL import Image as PILImage  # 使用PIL来获取图片的宽高
+
             # 获取文件夹中的所有图片文件
             image_files = [f for f in os.listdir(self.folder)
                            if f.lower().endswith(('.png', '.jpg', '.jpeg', '.bmp', '.gif'))]
@@ -0,0 +1,161 @@
+# -*- coding: utf-8 -*-
+"""非破坏性的图片编辑：以操作列表记录旋转、翻转和裁剪，从原图重放。
+
+撤销/重做只保存操作列表（元组共享同一批 EditOp），每一步占用的内存与图片大小
+无关。渲染时把整个操作列表合成为一个 QTransform 和输出尺寸，从原图只重新采样
+一次，因此先旋转再翻转、多次旋转等不会累积插值损失。最近渲染过的结果按操作列表
+缓存在 RenderCache 中（有内存上限），撤销到刚才的状态时不必重新渲染。
+"""
+from collections import OrderedDict, namedtuple
+
+from PyQt5.QtCore import QRectF
+from PyQt5.QtGui import QPainter, QPixmap, QTransform
+
+# kind: 'rotate'（value 为顺时针角度）、'flip'（'h' 或 'v'）、
+# 'crop'（value 为 (x, y, w, h)，坐标是之前所有操作之后的图片像素坐标）
+EditOp = namedtuple('EditOp', ['kind', 'value'])
+# ops: 已确定的操作元组；angle: 滑动条上尚未确定的自由旋转角度，最后应用
+EditState = namedtuple('EditState', ['ops', 'angle'])
+
+DEFAULT_CACHE_BYTES = 256 * 1024 * 1024
+
+
+def append_op(ops, op):
+    """在操作元组末尾添加操作，相邻的旋转合并为一个，抵消为 0 度时删除。"""
+    if op.kind == 'rotate':
+        angle = op.value
+        if ops and ops[-1].kind == 'rotate':
+            angle += ops[-1].value
+            ops = ops[:-1]
+        angle = (angle + 180) % 360 - 180
+        return ops + (EditOp('rotate', angle),) if angle else ops
+    if op.kind == 'flip' and ops and ops[-1] == op:
+        # 连续两次相同方向的翻转相互抵消
+        return ops[:-1]
+    return ops + (op,)
+
+
+def compose(ops, width, height):
+    """把操作合成为从原图坐标到结果坐标的 QTransform，返回 (变换, (宽, 高))。"""
+    transform = QTransform()
+    for op in ops:
+        if op.kind == 'rotate':
+            # 与 QPixmap.transformed 相同：旋转后平移，使外接矩形从 (0, 0) 开始
+            rotation = QTransform().rotate(op.value)
+            bounds = rotation.mapRect(QRectF(0, 0, width, height))
+            transform = transform * rotation * QTransform.fromTranslate(-bounds.x(), -bounds.y())
+            width, height = round(bounds.width()), round(bounds.height())
+        elif op.kind == 'flip':
+            if op.value == 'h':
+                transform = transform * QTransform(-1, 0, 0, 1, width, 0)
+            else:
+                transform = transform * QTransform(1, 0, 0, -1, 0, height)
+        elif op.kind == 'crop':
+            x, y, w, h = op.value
+            transform = transform * QTransform.fromTranslate(-x, -y)
+            width, height = w, h
+        else:
+            raise ValueError(f"未知的编辑操作: {op.kind}")
+    return transform, (max(1, width), max(1, height))
+
+
+def render(source, ops, background):
+    """从原图 source（QPixmap）按操作一次渲染出结果，空白区域用 background 填充。"""
+    if not ops:
+        return source
+    transform, (width, height) = compose(ops, source.width(), source.height())
+    result = QPixmap(width, height)
+    result.fill(background)
+    painter = QPainter(result)
+    painter.setRenderHint(QPainter.SmoothPixmapTransform)
+    painter.setTransform(transform)
+    painter.drawPixmap(0, 0, source)
+    painter.end()
+    return result
+
+
+def output_size(ops, width, height):
+    """按操作渲染 width x height 的图片得到的尺寸，不需要实际渲染。"""
+    return compose(ops, width, height)[1]
+
+
+def scale_ops(ops, factor):
+    """把操作换算到按 factor 缩放的图片上（只有裁剪区域与尺寸有关），用于在预览图上渲染。"""
+    if factor == 1:
+        return ops
+    return tuple(
+        EditOp('crop', tuple(max(1, round(v * factor)) if i >= 2 else round(v * factor)
+                             for i, v in enumerate(op.value)))
+        if op.kind == 'crop' else op
+        for op in ops)
+
+
+class EditHistory:
+    """撤销/重做历史，只保存 EditState。"""
+
+    def __init__(self, initial):
+        self._states = [initial]
+        self._index = 0
+
+    @property
+    def current(self):
+        return self._states[self._index]
+
+    def push(self, state):
+        if state == self.current:
+            return
+        # 新操作会丢弃所有可重做的状态
+        del self._states[self._index + 1:]
+        self._states.append(state)
+        self._index += 1
+
+    def can_undo(self):
+        return self._index > 0
+
+    def can_redo(self):
+        return self._index < len(self._states) - 1
+
+    def undo(self):
+        if self.can_undo():
+            self._index -= 1
+        return self.current
+
+    def redo(self):
+        if self.can_redo():
+            self._index += 1
+        return self.current
+
+
+class RenderCache:
+    """按操作元组缓存渲染结果，总像素内存超过 max_bytes 时淘汰最久未用的结果。"""
+
+    def __init__(self, max_bytes=DEFAULT_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self._items = OrderedDict()
+        self._bytes = 0
+
+    @staticmethod
+    def _size(pixmap):
+        return pixmap.width() * pixmap.height() * 4
+
+    def get(self, key):
+        pixmap = self._items.get(key)
+        if pixmap is not None:
+            self._items.move_to_end(key)
+        return pixmap
+
+    def put(self, key, pixmap):
+        if key in self._items:
+            self._bytes -= self._size(self._items.pop(key))
+        size = self._size(pixmap)
+        if size > self.max_bytes:
+            return
+        self._items[key] = pixmap
+        self._bytes += size
+        while self._bytes > self.max_bytes:
+            _, evicted = self._items.popitem(last=False)
+            self._bytes -= self._size(evicted)
+
+    def clear(self):
+        self._items.clear()
+        self._bytes = 0
@@ -0,0 +1,116 @@
+# -*- coding: utf-8 -*-
+"""在内存中把图片归一化为可直接嵌入或编码的格式。
+
+Excel 只能稳定地显示普通的 JPEG/PNG，JPEG 编码也只接受 RGB 或灰度。
+本模块把 MPO、多帧 GIF、BMP、CMYK 和 16 位 PNG 等输入在内存中转换：
+有透明通道的转为 PNG，其余转为 JPEG，不写任何临时文件。
+最近转换的结果保存在一个按字节数限制的小型 LRU 缓存中。
+"""
+import io
+import os
+import threading
+from collections import OrderedDict, namedtuple
+
+from PIL import Image
+
+JPEG_QUALITY = 95
+CACHE_MAX_ENTRIES = 32
+CACHE_MAX_BYTES = 64 * 1024 * 1024
+
+SIXTEEN_BIT_MODES = ('I;16', 'I;16B', 'I;16L', 'I')
+
+NormalizedImage = namedtuple('NormalizedImage', ['data', 'format', 'width', 'height'])
+
+_cache = OrderedDict()  # (路径, 修改时间, 大小) -> NormalizedImage
+_cache_bytes = 0
+_cache_lock = threading.Lock()
+
+
+def has_alpha(image):
+    return image.mode in ('RGBA', 'LA', 'PA') or 'transparency' in image.info
+
+
+def needs_normalize(image):
+    """刚打开（尚未解码）的图片是否需要转换才能直接嵌入 Excel。"""
+    if image.format == 'JPEG':
+        return image.mode not in ('RGB', 'L')
+    if image.format == 'PNG':
+        return image.mode in SIXTEEN_BIT_MODES
+    # MPO、GIF、BMP、TIFF 等一律转换
+    return True
+
+
+def embed_format(image):
+    """只根据文件头判断嵌入时使用的格式。"""
+    if not needs_normalize(image):
+        return image.format
+    return 'PNG' if has_alpha(image) else 'JPEG'
+
+
+def _first_frame(image):
+    # 只在不是第一帧时 seek，避免重置 draft() 设置的缩小解码
+    if getattr(image, 'n_frames', 1) > 1 and image.tell() != 0:
+        image.seek(0)
+    return image
+
+
+def _from_sixteen_bit(image):
+    # 直接 convert('L') 会把超过 255 的值截断成白色，先按比例缩放到 8 位
+    return image.convert('I').point(lambda value: value * (1 / 256)).convert('L')
+
+
+def for_jpeg(image):
+    """返回可以编码为 JPEG 的 RGB 或灰度图，透明区域合成到白色背景上。"""
+    image = _first_frame(image)
+    if image.mode in SIXTEEN_BIT_MODES:
+        return _from_sixteen_bit(image)
+    if has_alpha(image):
+        rgba = image.convert('RGBA')
+        background = Image.new('RGB', rgba.size, (255, 255, 255))
+        background.paste(rgba, mask=rgba.getchannel('A'))
+        return background
+    if image.mode in ('RGB', 'L'):
+        return image
+    return image.convert('RGB')
+
+
+def for_embed(image):
+    """返回 (图片, 格式)：有透明通道时为 RGBA/PNG，否则为 RGB 或灰度/JPEG。"""
+    image = _first_frame(image)
+    if image.mode not in SIXTEEN_BIT_MODES and has_alpha(image):
+        return (image if image.mode in ('RGBA', 'LA') else image.convert('RGBA')), 'PNG'
+    return for_jpeg(image), 'JPEG'
+
+
+def encode(image, image_format, quality=JPEG_QUALITY):
+    buffer = io.BytesIO()
+    if image_format == 'PNG':
+        image.save(buffer, format='PNG')
+    else:
+        image.save(buffer, format='JPEG', quality=quality)
+    return buffer.getvalue()
+
+
+def normalize_file(path):
+    """把文件转换为可嵌入的 NormalizedImage，结果按路径、修改时间和大小缓存。"""
+    global _cache_bytes
+    stat = os.stat(path)
+    key = (os.path.abspath(path), stat.st_mtime_ns, stat.st_size)
+    with _cache_lock:
+        cached = _cache.get(key)
+        if cached is not None:
+            _cache.move_to_end(key)
+            return cached
+
+    with Image.open(path) as im:
+        image, image_format = for_embed(im)
+        result = NormalizedImage(encode(image, image_format), image_format, image.width, image.height)
+
+    with _cache_lock:
+        if key not in _cache:
+            _cache[key] = result
+            _cache_bytes += len(result.data)
+        while _cache and (len(_cache) > CACHE_MAX_ENTRIES or _cache_bytes > CACHE_MAX_BYTES):
+            _, evicted = _cache.popitem(last=False)
+            _cache_bytes -= len(evicted.data)
+    return result
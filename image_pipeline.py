@@ -0,0 +1,106 @@
+# -*- coding: utf-8 -*-
+"""解压/改名流程中的单张图片重编码阶段。
+
+每张图片的解码、转 RGB、保存 JPEG 和限制大小都是独立的，可以分发到进程池，
+结果按提交顺序产出，保证输出序号和进度都按压缩包顺序。map_ordered 是通用的
+有序进程池映射，Excel 导出的图片准备阶段也使用它。
+"""
+import functools
+import io
+import os
+import traceback
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from PIL import Image
+
+import image_normalize
+import size_cap
+import stage_trace
+
+
+def default_workers():
+    return os.cpu_count() or 1
+
+
+def reencode_to_jpeg(source, dest_path, policy=size_cap.DEFAULT_POLICY, timer=None):
+    """将图片（路径、文件对象或字节）按大小限制策略保存为 JPEG。
+
+    质量参数在内存中二分查找，文件只写一次。返回 (质量, 编码次数)。
+    timer 为 stage_trace.StageTimer 时依次记录打开、解码、转换、编码和写入的耗时。
+    """
+    if isinstance(source, (bytes, bytearray)):
+        source = io.BytesIO(source)
+    with Image.open(source) as image:
+        # 超过像素预算的 JPEG 直接按 draft 解码到较小尺寸
+        size_cap.open_with_draft(image, policy)
+        if timer:
+            timer.mark('open')
+            image.load()
+            timer.mark('decode', pixels=image.width * image.height)
+        # MPO、多帧 GIF、BMP、CMYK、16 位 PNG 等在内存中转换为 RGB 或灰度图
+        image = image_normalize.for_jpeg(image)
+        if timer:
+            timer.mark('convert')
+        result = size_cap.save_jpeg_capped(image, dest_path, policy, timer=timer)
+    return result.quality, result.attempts
+
+
+def _run_job(job, policy=size_cap.DEFAULT_POLICY):
+    label, source, dest_path = job
+    timer = stage_trace.StageTimer()
+    try:
+        if source is None:
+            # archive_stream.iter_images 中无法读取的压缩包成员
+            raise IOError(f"无法从压缩包中读取: {label}")
+        return label, dest_path, None, reencode_to_jpeg(source, dest_path, policy, timer), timer.stages
+    except Exception as e:
+        return label, dest_path, f"{str(e)}\n{traceback.format_exc()}", None, timer.stages
+
+
+def _run_chunk(function, chunk):
+    return [function(item) for item in chunk]
+
+
+def _chunks(jobs, chunk_size):
+    chunk = []
+    for job in jobs:
+        chunk.append(job)
+        if len(chunk) >= chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def map_ordered(function, items, workers=1, chunk_size=1, mp_context=None):
+    """对每个元素调用 function，按提交顺序产出结果。
+
+    workers <= 1 时在当前线程串行处理；否则使用进程池，每次提交 chunk_size 个任务，
+    同时在途的批次不超过 workers 的两倍，所以惰性产生的任务（如流式读取的字节）
+    不会一次性全部读入内存。function 必须能被 pickle（模块级函数或其 partial）。
+    mp_context 为 multiprocessing 上下文，子进程需要创建 Qt 应用时应使用 spawn。
+    """
+    if workers <= 1:
+        for item in items:
+            yield function(item)
+        return
+
+    chunk_size = max(1, chunk_size)
+    with ProcessPoolExecutor(max_workers=workers, mp_context=mp_context) as executor:
+        pending = deque()
+        for chunk in _chunks(items, chunk_size):
+            pending.append(executor.submit(_run_chunk, function, chunk))
+            if len(pending) >= workers * 2:
+                yield from pending.popleft().result()
+        while pending:
+            yield from pending.popleft().result()
+
+
+def reencode_ordered(jobs, workers=1, chunk_size=1, policy=size_cap.DEFAULT_POLICY):
+    """处理 (标签, 来源, 目标路径) 任务，按提交顺序产出 (标签, 目标路径, 错误信息, (质量, 编码次数), 阶段耗时)。
+
+    成功时错误信息为 None，失败时 (质量, 编码次数) 为 None。阶段耗时是
+    stage_trace.StageTimer.stages（失败时只包含出错前完成的阶段）。并行方式见 map_ordered。
+    """
+    return map_ordered(functools.partial(_run_job, policy=policy), jobs, workers, chunk_size)
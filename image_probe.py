@@ -0,0 +1,29 @@
+# -*- coding: utf-8 -*-
+"""快速读取图片信息和缩略图。
+
+probe 只读取文件头获得尺寸和格式，不解码像素；thumbnail 对 JPEG 使用
+draft() 在 DCT 域按 1/2、1/4、1/8 缩小解码，避免以原始分辨率解码整张图片。
+"""
+from collections import namedtuple
+
+from PIL import Image
+
+ImageInfo = namedtuple('ImageInfo', ['width', 'height', 'format', 'mode'])
+
+
+def probe(path):
+    """只读取文件头，返回 ImageInfo。"""
+    with Image.open(path) as im:
+        return ImageInfo(im.width, im.height, im.format, im.mode)
+
+
+def thumbnail(path, max_size):
+    """返回长边不超过 max_size 的 PIL 缩略图（RGB 或 RGBA），保持宽高比。"""
+    with Image.open(path) as im:
+        if im.format in ('JPEG', 'MPO'):
+            # draft 选择不小于目标尺寸的最小缩放比例，只能在 load 之前调用
+            im.draft('RGB', (max_size, max_size))
+        if im.mode not in ('RGB', 'RGBA'):
+            im = im.convert('RGBA' if 'A' in im.getbands() or 'transparency' in im.info else 'RGB')
+        im.thumbnail((max_size, max_size), Image.LANCZOS)
+        return im
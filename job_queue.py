@@ -0,0 +1,175 @@
+# -*- coding: utf-8 -*-
+"""批量解压改名的任务队列。
+
+每个压缩包（或文件夹）是一个任务，带有自己的前缀和序号位数。队列按顺序启动任务，
+同时运行的任务数不超过 max_running：一个任务读取压缩包时另一个任务可以编码图片，
+但不会因为同时读取太多压缩包而让磁盘来回寻道。图片编码的进程总数 total_workers
+平均分给同时运行的任务，避免超过 CPU 核数。
+
+尚未开始的任务可以调整顺序或取消；运行中的任务取消后在当前图片处理完时停止。
+任务由 worker_factory(job, workers) 创建的 Worker 执行，Worker 需要提供
+progress_update、status_update、error_signal、completion_signal、cancelled_signal、
+finished_signal 信号和 cancel() 方法（见解压模块的 Worker）。
+"""
+import itertools
+
+from PyQt5.QtCore import QObject, QThread, pyqtSignal
+
+PENDING = 'pending'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+CANCELLED = 'cancelled'
+
+STATUS_LABELS = {
+    PENDING: "等待中",
+    RUNNING: "处理中",
+    DONE: "完成",
+    FAILED: "失败",
+    CANCELLED: "已取消",
+}
+DEFAULT_MAX_RUNNING = 2
+
+
+class QueueJob:
+    """队列中的一个任务及其当前状态。"""
+
+    def __init__(self, job_id, mode, path, prefix, digits):
+        self.id = job_id
+        self.mode = mode  # 'decompress' or 'rename'
+        self.path = path
+        self.prefix = prefix
+        self.digits = digits
+        self.status = PENDING
+        self.progress = 0
+        self.message = ""
+        self.errors = 0  # 单张图片出错的次数，任务仍会继续
+
+    @property
+    def finished(self):
+        return self.status in (DONE, FAILED, CANCELLED)
+
+
+class JobQueue(QObject):
+    job_changed = pyqtSignal(int)  # 任务 ID
+    jobs_reordered = pyqtSignal()
+    queue_finished = pyqtSignal()
+
+    def __init__(self, worker_factory, max_running=DEFAULT_MAX_RUNNING, total_workers=1, parent=None):
+        super().__init__(parent)
+        self.worker_factory = worker_factory
+        self.max_running = max_running
+        self.total_workers = total_workers
+        self.jobs = []  # 按执行顺序排列
+        self.running = False
+        self._ids = itertools.count(1)
+        self._active = {}  # 任务 ID -> (QThread, Worker)
+
+    def add(self, mode, path, prefix, digits):
+        job = QueueJob(next(self._ids), mode, path, prefix, digits)
+        self.jobs.append(job)
+        self.jobs_reordered.emit()
+        if self.running:
+            self._schedule()
+        return job
+
+    def job(self, job_id):
+        return next(job for job in self.jobs if job.id == job_id)
+
+    def move(self, job_id, offset):
+        """把任务前后移动 offset 个位置；只调整等待中的任务之间的顺序。"""
+        job = self.job(job_id)
+        if job.status != PENDING:
+            return False
+        pending = [item for item in self.jobs if item.status == PENDING]
+        index = pending.index(job)
+        target = index + offset
+        if target < 0 or target >= len(pending) or target == index:
+            return False
+        # 与相邻的等待任务交换在总列表中的位置
+        other = pending[target]
+        a, b = self.jobs.index(job), self.jobs.index(other)
+        self.jobs[a], self.jobs[b] = other, job
+        self.jobs_reordered.emit()
+        return True
+
+    def cancel(self, job_id):
+        job = self.job(job_id)
+        if job.status == PENDING:
+            job.status = CANCELLED
+            self.job_changed.emit(job.id)
+            self._check_finished()
+        elif job.status == RUNNING:
+            job.message = "正在取消..."
+            self.job_changed.emit(job.id)
+            self._active[job.id][1].cancel()
+
+    def remove_finished(self):
+        self.jobs = [job for job in self.jobs if not job.finished]
+        self.jobs_reordered.emit()
+
+    def start(self):
+        self.running = True
+        self._schedule()
+        self._check_finished()
+
+    def workers_per_job(self):
+        return max(1, self.total_workers // max(1, self.max_running))
+
+    def _schedule(self):
+        for job in self.jobs:
+            if len(self._active) >= self.max_running:
+                break
+            if job.status == PENDING:
+                self._start_job(job)
+
+    def _start_job(self, job):
+        job.status = RUNNING
+        job.message = "开始处理..."
+        thread = QThread()
+        worker = self.worker_factory(job, self.workers_per_job())
+        worker.moveToThread(thread)
+        self._active[job.id] = (thread, worker)
+
+        thread.started.connect(worker.run)
+        worker.progress_update.connect(lambda value, job=job: self._update(job, progress=value))
+        worker.status_update.connect(lambda message, job=job: self._update(job, message=message))
+        worker.error_signal.connect(lambda message, job=job: self._on_error(job, message))
+        worker.completion_signal.connect(lambda message, job=job: self._update(job, status=DONE, progress=100,
+                                                                               message=message))
+        worker.cancelled_signal.connect(lambda message, job=job: self._update(job, status=CANCELLED,
+                                                                              message=message))
+        worker.finished_signal.connect(thread.quit)
+        thread.finished.connect(lambda job=job: self._on_thread_finished(job))
+        self.job_changed.emit(job.id)
+        thread.start()
+
+    def _update(self, job, status=None, progress=None, message=None):
+        if status is not None:
+            job.status = status
+        if progress is not None:
+            job.progress = max(0, min(100, progress))
+        if message is not None:
+            job.message = message
+        self.job_changed.emit(job.id)
+
+    def _on_error(self, job, message):
+        job.errors += 1
+        self._update(job, message=message.splitlines()[0] if message else "")
+
+    def _on_thread_finished(self, job):
+        thread, worker = self._active.pop(job.id)
+        if job.status == RUNNING:
+            # 没有发出完成或取消信号就结束，说明整个任务失败
+            job.status = FAILED
+            self.job_changed.emit(job.id)
+        worker.deleteLater()
+        thread.deleteLater()
+        if self.running:
+            self._schedule()
+        self._check_finished()
+
+    def _check_finished(self):
+        if self.running and not self._active and not any(job.status == PENDING for job in self.jobs):
+            self.running = False
+            self.queue_finished.emit()
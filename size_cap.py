@@ -0,0 +1,205 @@
+# -*- coding: utf-8 -*-
+"""按目标大小编码图片。
+
+在内存中二分查找满足大小上限的最高质量参数，最终只写一次文件。
+编码函数由调用方提供（PIL 或 QImage 均可），本模块不依赖具体图像库。
+
+SizeCapPolicy 决定先降分辨率还是先降质量：超过像素预算的图片先缩小，
+质量不低于 min_quality；最低可接受质量仍放不下时再按比例缩小分辨率。
+"""
+import math
+import threading
+from collections import namedtuple
+
+MAX_SIZE_KB = 800
+MAX_QUALITY = 95
+MIN_QUALITY = 10
+MAX_DOWNSCALE_ROUNDS = 6
+
+# data: 最终编码结果；quality: 选中的质量参数；attempts: 实际编码次数；size: 输出 (宽, 高)
+EncodeResult = namedtuple('EncodeResult', ['data', 'quality', 'attempts', 'size'], defaults=(None,))
+
+# max_pixels: 像素预算，None 表示不限制；downscale: 最低质量仍超限时是否继续缩小分辨率
+SizeCapPolicy = namedtuple(
+    'SizeCapPolicy', ['max_size_kb', 'max_pixels', 'min_quality', 'max_quality', 'downscale'],
+    defaults=(MAX_SIZE_KB, None, MIN_QUALITY, MAX_QUALITY, False))
+
+POLICIES = {
+    'quality': SizeCapPolicy(),
+    'balanced': SizeCapPolicy(max_pixels=12_000_000, min_quality=75, downscale=True),
+    'resolution': SizeCapPolicy(max_pixels=6_000_000, min_quality=85, downscale=True),
+}
+POLICY_LABELS = {
+    'quality': "仅降低质量（原有方式）",
+    'balanced': "均衡：超过1200万像素先缩小，质量不低于75",
+    'resolution': "清晰优先：超过600万像素先缩小，质量不低于85",
+}
+DEFAULT_POLICY = POLICIES['quality']
+
+
+class QualityEstimator:
+    """缓存各质量参数下的每像素字节数（相对最高质量的比例），用于给二分查找一个初始猜测。"""
+
+    def __init__(self):
+        self._ratios = {}  # quality -> (比例之和, 样本数)
+        self._lock = threading.Lock()
+
+    def record(self, max_quality_size, sizes):
+        """记录一张图片各次尝试的大小，sizes 为 {quality: 字节数}。"""
+        if not max_quality_size:
+            return
+        with self._lock:
+            for quality, size in sizes.items():
+                total, count = self._ratios.get(quality, (0.0, 0))
+                self._ratios[quality] = (total + size / max_quality_size, count + 1)
+
+    def guess(self, max_quality_size, max_bytes):
+        """返回预计满足大小上限的最高质量，没有样本时返回 None。"""
+        target = max_bytes / max_quality_size
+        with self._lock:
+            candidates = [quality for quality, (total, count) in self._ratios.items()
+                          if total / count <= target]
+        return max(candidates) if candidates else None
+
+
+default_estimator = QualityEstimator()
+
+
+def solve_quality(encode, max_bytes, max_quality=MAX_QUALITY, min_quality=MIN_QUALITY,
+                  estimator=default_estimator):
+    """查找编码后不超过 max_bytes 的最高质量。
+
+    encode(quality) 返回编码后的 bytes。先尝试 max_quality，放不下时在
+    [min_quality, max_quality) 中二分查找；若有 estimator，则先在估计值附近试探
+    以缩小区间。最低质量仍超过上限时返回最低质量的结果。
+    """
+    sizes = {}
+    results = {}
+
+    def attempt(quality):
+        if quality not in results:
+            data = encode(quality)
+            results[quality] = data
+            sizes[quality] = len(data)
+        return sizes[quality] <= max_bytes
+
+    if attempt(max_quality):
+        return EncodeResult(results[max_quality], max_quality, 1)
+
+    best = None
+    lo, hi = min_quality, max_quality - 1
+    guess = estimator.guess(sizes[max_quality], max_bytes) if estimator else None
+    if guess is not None and lo <= guess <= hi:
+        # 先试估计值，再向相应方向试探两步，得到一个很小的区间
+        if attempt(guess):
+            best, lo = guess, guess + 1
+            probe = min(hi, guess + 2)
+        else:
+            hi = guess - 1
+            probe = max(lo, guess - 2)
+        if lo <= probe <= hi:
+            if attempt(probe):
+                best, lo = probe, probe + 1
+            else:
+                hi = probe - 1
+
+    while lo <= hi:
+        mid = (lo + hi) // 2
+        if attempt(mid):
+            best, lo = mid, mid + 1
+        else:
+            hi = mid - 1
+
+    if best is None:
+        attempt(min_quality)
+        best = min_quality
+
+    if estimator:
+        estimator.record(sizes[max_quality], sizes)
+    return EncodeResult(results[best], best, len(results))
+
+
+def fit_pixel_budget(width, height, max_pixels):
+    """返回按比例缩小到不超过 max_pixels 后的尺寸。"""
+    if not max_pixels or width * height <= max_pixels:
+        return width, height
+    scale = math.sqrt(max_pixels / (width * height))
+    return max(1, int(width * scale)), max(1, int(height * scale))
+
+
+def encode_with_policy(width, height, make_encoder, policy=DEFAULT_POLICY, estimator=default_estimator):
+    """按策略编码：先满足像素预算，再查找质量，必要时继续缩小分辨率。
+
+    make_encoder(width, height) 返回该尺寸下的 encode(quality) 函数。
+    """
+    max_bytes = policy.max_size_kb * 1024
+    size = fit_pixel_budget(width, height, policy.max_pixels)
+    attempts = 0
+    for _ in range(MAX_DOWNSCALE_ROUNDS):
+        result = solve_quality(make_encoder(*size), max_bytes, policy.max_quality,
+                               policy.min_quality, estimator)
+        attempts += result.attempts
+        if len(result.data) <= max_bytes or not policy.downscale:
+            break
+        # 最低可接受质量仍放不下：文件大小约与像素数成正比，按比例缩小
+        scale = math.sqrt(max_bytes / len(result.data)) * 0.95
+        size = max(1, int(size[0] * scale)), max(1, int(size[1] * scale))
+    return EncodeResult(result.data, result.quality, attempts, size)
+
+
+def open_with_draft(image, policy=DEFAULT_POLICY):
+    """对刚打开、尚未解码的 JPEG 使用 draft()，在 DCT 域直接缩小到接近像素预算的尺寸。"""
+    if policy.max_pixels and image.format == 'JPEG':
+        target = fit_pixel_budget(image.width, image.height, policy.max_pixels)
+        if target != image.size:
+            image.draft(image.mode, target)
+    return image
+
+
+def resize_pil(image, size):
+    """缩放 PIL 图像：先用 reduce() 做整数倍快速缩小，剩余部分再用 LANCZOS。"""
+    from PIL import Image
+
+    if image.size == size:
+        return image
+    factor = min(image.width // size[0], image.height // size[1])
+    if factor >= 2:
+        image = image.reduce(factor)
+    if image.size != size:
+        image = image.resize(size, Image.LANCZOS)
+    return image
+
+
+def pil_jpeg_encoder(image):
+    """返回把 PIL 图像编码为 JPEG 字节的函数。"""
+    from io import BytesIO
+
+    if image.mode not in ('RGB', 'L', 'CMYK'):
+        image = image.convert('RGB')
+    image.load()
+
+    def encode(quality):
+        buffer = BytesIO()
+        image.save(buffer, format='JPEG', quality=quality)
+        return buffer.getvalue()
+
+    return encode
+
+
+def save_jpeg_capped(image, dest_path, policy=DEFAULT_POLICY, estimator=default_estimator, timer=None):
+    """将 PIL 图像按策略编码为 JPEG 并只写一次文件，返回 EncodeResult。
+
+    timer 为 stage_trace.StageTimer 时记录编码（含所有试探）和写入两个阶段。
+    """
+    image.load()
+    result = encode_with_policy(
+        image.width, image.height,
+        lambda width, height: pil_jpeg_encoder(resize_pil(image, (width, height))),
+        policy, estimator)
+    if timer:
+        timer.mark('encode', len(result.data), quality=result.quality, attempts=result.attempts)
+    with open(dest_path, 'wb') as f:
+        f.write(result.data)
+    if timer:
+        timer.mark('write', len(result.data))
+    return result
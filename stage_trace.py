@@ -0,0 +1,124 @@
+# -*- coding: utf-8 -*-
+"""解压改名和 Excel 导出的分阶段耗时记录。
+
+每张图片的每个阶段（读取压缩包成员、打开、解码、转换、缩放、编码、写入等）产生
+一个事件字典：
+
+    {'job': 任务名, 'item': 图片名, 'stage': 阶段, 'seconds': 耗时, 'bytes': 字节数, ...}
+
+编码阶段另外带有 quality（最终质量）和 attempts（为满足800KB限制的编码次数）。
+Worker / ExcelWorker 通过 stage_event 信号发出事件，可选地写入 JSONL 记录文件，
+任务结束时由 StageSummary 汇总成按阶段统计的表格，用于找出批量任务中最慢的阶段。
+"""
+import json
+import os
+import time
+
+TRACE_SUFFIX = '.trace.jsonl'
+
+# 汇总表中各阶段的显示顺序和名称
+STAGE_LABELS = {
+    'extract': "读取压缩包",
+    'probe': "读取文件头",
+    'open': "打开",
+    'decode': "解码",
+    'convert': "格式转换",
+    'resize': "缩放",
+    'encode': "编码",
+    'read': "读取原文件",
+    'write': "写入",
+    'copy': "复制已有图片",
+    'save': "保存工作簿",
+}
+SUMMARY_HEADERS = ("阶段", "次数", "总耗时 (s)", "平均 (ms)", "最大 (ms)", "数据量 (MB)", "占比")
+
+
+def trace_path(path):
+    """压缩包或文件夹对应的记录文件路径，如 a.zip -> a.trace.jsonl。"""
+    path = os.path.normpath(path)
+    if os.path.isfile(path):
+        path = os.path.splitext(path)[0]
+    return path + TRACE_SUFFIX
+
+
+class StageTimer:
+    """按顺序记录一张图片各阶段的耗时，每次 mark 记录距上一次 mark 的时间。
+
+    stages 是 [(阶段, 秒, 字节数, 附加信息)]，可以 pickle，因此可以从进程池返回。
+    """
+
+    def __init__(self):
+        self.stages = []
+        self._last = time.perf_counter()
+
+    def mark(self, stage, nbytes=None, **extra):
+        now = time.perf_counter()
+        self.stages.append((stage, now - self._last, nbytes, extra))
+        self._last = now
+
+
+def make_event(job, item, stage, seconds, nbytes=None, **extra):
+    return {'job': job, 'item': item, 'stage': stage, 'seconds': round(seconds, 6), 'bytes': nbytes, **extra}
+
+
+class TraceWriter:
+    """以 JSON 行追加写入事件，同一文件可以记录多次任务。"""
+
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, 'a', encoding='utf-8')
+
+    def write(self, event):
+        self._file.write(json.dumps(event, ensure_ascii=False) + '\n')
+
+    def close(self):
+        self._file.close()
+
+
+class StageSummary:
+    """按阶段汇总事件的次数、总耗时、最大耗时和数据量。"""
+
+    def __init__(self):
+        self._stats = {}  # 阶段 -> [次数, 总秒数, 最大秒数, 字节数]
+
+    def add(self, event):
+        stats = self._stats.setdefault(event['stage'], [0, 0.0, 0.0, 0])
+        stats[0] += 1
+        stats[1] += event['seconds']
+        stats[2] = max(stats[2], event['seconds'])
+        stats[3] += event.get('bytes') or 0
+
+    def rows(self):
+        """返回按阶段顺序排列的统计字典列表。"""
+        order = list(STAGE_LABELS)
+        total = sum(stats[1] for stats in self._stats.values()) or 1
+        rows = []
+        for stage in sorted(self._stats, key=lambda s: order.index(s) if s in order else len(order)):
+            count, seconds, max_seconds, nbytes = self._stats[stage]
+            rows.append({
+                'stage': stage,
+                'count': count,
+                'seconds': round(seconds, 3),
+                'mean_ms': round(seconds / count * 1000, 1),
+                'max_ms': round(max_seconds * 1000, 1),
+                'mb': round(nbytes / (1024 * 1024), 2),
+                'share': round(seconds / total, 3),
+            })
+        return rows
+
+    def display_rows(self):
+        """与 SUMMARY_HEADERS 对应的文字行，用于界面表格。"""
+        return [display_row(row) for row in self.rows()]
+
+
+def display_row(row):
+    """把 StageSummary.rows() 的一行转换为与 SUMMARY_HEADERS 对应的文字。"""
+    return (STAGE_LABELS.get(row['stage'], row['stage']), str(row['count']), f"{row['seconds']:.2f}",
+            f"{row['mean_ms']:.1f}", f"{row['max_ms']:.1f}", f"{row['mb']:.1f}", f"{row['share']:.0%}")
+
+
+def format_table(rows):
+    """把 StageSummary.rows() 格式化为对齐的纯文本表格，用于命令行和日志。"""
+    lines = [SUMMARY_HEADERS] + [display_row(row) for row in rows]
+    widths = [max(len(line[i]) for line in lines) for i in range(len(SUMMARY_HEADERS))]
+    return '\n'.join('  '.join(cell.ljust(width) for cell, width in zip(line, widths)) for line in lines)
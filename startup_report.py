@@ -0,0 +1,134 @@
+# -*- coding: utf-8 -*-
+"""启动耗时报告，可以在 CI 中检查主界面的冷启动是否变慢。
+
+    python startup_report.py                       # 导入 final 的耗时分布（JSON）
+    python startup_report.py --first-window        # 同时测量显示主界面所需的时间
+    python startup_report.py --threshold-ms 800 --forbid PIL openpyxl py7zr rarfile
+
+导入耗时通过在子进程中运行 python -X importtime 得到；--first-window 在 offscreen
+平台下创建 MainWindow 并处理一次事件，测量整个子进程的耗时。超过阈值或启动时
+导入了被禁止的模块时退出码为 1。
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+HEAVY_MODULES = ('PIL', 'openpyxl', 'py7zr', 'rarfile')
+
+FIRST_WINDOW_SNIPPET = (
+    "import sys\n"
+    "from PyQt5.QtWidgets import QApplication\n"
+    "import {module}\n"
+    "app = QApplication(sys.argv)\n"
+    "window = {module}.MainWindow()\n"
+    "window.show()\n"
+    "app.processEvents()\n"
+)
+
+
+def child_env():
+    env = dict(os.environ)
+    env.setdefault('QT_QPA_PLATFORM', 'offscreen')
+    return env
+
+
+def parse_importtime(stderr):
+    """解析 -X importtime 的输出，返回 [(模块名, 自身微秒, 累计微秒)]。"""
+    records = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:'):
+            continue
+        fields = line[len('import time:'):].split('|')
+        if len(fields) != 3:
+            continue
+        try:
+            self_us, cumulative_us = int(fields[0]), int(fields[1])
+        except ValueError:
+            continue  # 表头
+        records.append((fields[2].strip(), self_us, cumulative_us))
+    return records
+
+
+def import_breakdown(module, top=20):
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f"import {module}"],
+        cwd=SCRIPT_DIR, env=child_env(), capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(f"导入 {module} 失败:\n{result.stderr[-2000:]}")
+    records = parse_importtime(result.stderr)
+    total_us = next((cumulative for name, _, cumulative in records if name == module), 0)
+
+    # 按顶层包汇总自身耗时
+    packages = {}
+    for name, self_us, _ in records:
+        package = name.split('.')[0]
+        packages[package] = packages.get(package, 0) + self_us
+    loaded = {name.split('.')[0] for name, _, _ in records}
+
+    report = {
+        'module': module,
+        'total_ms': round(total_us / 1000, 1),
+        'module_count': len(records),
+        'top_modules': [
+            {'module': name, 'self_ms': round(self_us / 1000, 1), 'cumulative_ms': round(cumulative_us / 1000, 1)}
+            for name, self_us, cumulative_us in sorted(records, key=lambda r: r[1], reverse=True)[:top]
+        ],
+        'top_packages': [
+            {'package': package, 'self_ms': round(self_us / 1000, 1)}
+            for package, self_us in sorted(packages.items(), key=lambda item: item[1], reverse=True)[:top]
+        ],
+        'heavy_modules_loaded': sorted(name for name in HEAVY_MODULES if name in loaded),
+    }
+    return report, loaded
+
+
+def first_window_ms(module):
+    start = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, '-c', FIRST_WINDOW_SNIPPET.format(module=module)],
+        cwd=SCRIPT_DIR, env=child_env(), capture_output=True, text=True)
+    elapsed = time.perf_counter() - start
+    if result.returncode != 0:
+        raise RuntimeError(f"显示主界面失败:\n{result.stderr[-2000:]}")
+    return round(elapsed * 1000, 1)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="主界面启动耗时报告")
+    parser.add_argument('--module', default='final', help="要测量的模块（默认 final）")
+    parser.add_argument('--first-window', action='store_true', help="同时测量显示主界面的耗时")
+    parser.add_argument('--repeat', type=int, default=3, help="重复次数，取最小值以减少抖动")
+    parser.add_argument('--top', type=int, default=20, help="列出耗时最多的模块数")
+    parser.add_argument('--threshold-ms', type=float, help="导入总耗时超过该值时退出码为 1")
+    parser.add_argument('--forbid', nargs='*', default=[], help="启动时不允许导入的顶层包")
+    parser.add_argument('--output', help="把 JSON 报告写入文件")
+    args = parser.parse_args(argv)
+
+    runs = [import_breakdown(args.module, args.top) for _ in range(max(1, args.repeat))]
+    report, loaded = min(runs, key=lambda run: run[0]['total_ms'])
+    report['runs_ms'] = [run['total_ms'] for run, _ in runs]
+    if args.first_window:
+        report['first_window_ms'] = min(first_window_ms(args.module) for _ in range(max(1, args.repeat)))
+
+    failures = []
+    if args.threshold_ms is not None and report['total_ms'] > args.threshold_ms:
+        failures.append(f"导入耗时 {report['total_ms']}ms 超过阈值 {args.threshold_ms}ms")
+    forbidden = sorted(set(args.forbid) & loaded)
+    if forbidden:
+        failures.append(f"启动时导入了: {', '.join(forbidden)}")
+    report['failures'] = failures
+
+    text = json.dumps(report, ensure_ascii=False, indent=1)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(text)
+    print(text)
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
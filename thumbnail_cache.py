@@ -0,0 +1,132 @@
+# -*- coding: utf-8 -*-
+"""持久化的缩略图缓存。
+
+缓存保存在用户缓存目录下的一个 SQLite 文件中，键由文件路径、修改时间、
+文件大小和缩略图尺寸计算得到，文件被修改后旧条目自然失效并在写入新条目时删除。
+总大小超过上限时按最近使用时间（LRU）淘汰。
+"""
+import hashlib
+import io
+import os
+import sqlite3
+import sys
+import threading
+import time
+
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+EVICT_CHECK_INTERVAL = 64  # 每写入多少条检查一次总大小
+
+
+def default_cache_dir():
+    if sys.platform.startswith('win'):
+        base = os.environ.get('LOCALAPPDATA') or os.path.expanduser('~')
+    else:
+        base = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(base, 'xian_yu')
+
+
+def encode_thumbnail(image):
+    """把 PIL 缩略图编码为缓存用的字节：不透明图片用 JPEG，带透明通道的用 PNG。"""
+    buffer = io.BytesIO()
+    if image.mode == 'RGBA':
+        image.save(buffer, format='PNG', optimize=False)
+    else:
+        image.convert('RGB').save(buffer, format='JPEG', quality=90)
+    return buffer.getvalue()
+
+
+class ThumbnailCache:
+    """线程安全的缩略图缓存，每个线程使用独立的 SQLite 连接。"""
+
+    def __init__(self, db_path=None, max_bytes=DEFAULT_MAX_BYTES):
+        if db_path is None:
+            cache_dir = default_cache_dir()
+            os.makedirs(cache_dir, exist_ok=True)
+            db_path = os.path.join(cache_dir, 'thumbnails.sqlite3')
+        self.db_path = db_path
+        self.max_bytes = max_bytes
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._puts = 0
+        self._connection()  # 立即建表，路径不可用时在构造时就报错
+
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS thumbnails ("
+                " key TEXT PRIMARY KEY, path TEXT NOT NULL, icon_size INTEGER NOT NULL,"
+                " data BLOB NOT NULL, bytes INTEGER NOT NULL, last_used REAL NOT NULL)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_thumbnails_path ON thumbnails (path, icon_size)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_thumbnails_last_used ON thumbnails (last_used)")
+            conn.commit()
+            self._local.conn = conn
+        return conn
+
+    @staticmethod
+    def make_key(path, icon_size):
+        """根据路径、修改时间、大小和缩略图尺寸计算缓存键，文件不存在时返回 None。"""
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        identity = f"{os.path.abspath(path)}|{stat.st_mtime_ns}|{stat.st_size}|{icon_size}"
+        return hashlib.sha1(identity.encode('utf-8')).hexdigest()
+
+    def get(self, path, icon_size):
+        """返回缓存的缩略图字节，未命中或已过期时返回 None。"""
+        key = self.make_key(path, icon_size)
+        if key is None:
+            return None
+        conn = self._connection()
+        row = conn.execute("SELECT data FROM thumbnails WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        conn.execute("UPDATE thumbnails SET last_used = ? WHERE key = ?", (time.time(), key))
+        conn.commit()
+        return row[0]
+
+    def put(self, path, icon_size, data):
+        key = self.make_key(path, icon_size)
+        if key is None:
+            return
+        conn = self._connection()
+        # 同一文件同一尺寸的旧版本已失效，直接删除
+        conn.execute("DELETE FROM thumbnails WHERE path = ? AND icon_size = ? AND key != ?",
+                     (os.path.abspath(path), icon_size, key))
+        conn.execute(
+            "INSERT OR REPLACE INTO thumbnails (key, path, icon_size, data, bytes, last_used)"
+            " VALUES (?, ?, ?, ?, ?, ?)",
+            (key, os.path.abspath(path), icon_size, sqlite3.Binary(data), len(data), time.time()))
+        conn.commit()
+        with self._lock:
+            self._puts += 1
+            check = self._puts % EVICT_CHECK_INTERVAL == 0
+        if check:
+            self.evict()
+
+    def evict(self):
+        """总大小超过上限时，按最近使用时间删除旧条目，直到降到上限的 90%。"""
+        conn = self._connection()
+        total = conn.execute("SELECT COALESCE(SUM(bytes), 0) FROM thumbnails").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        target = total - int(self.max_bytes * 0.9)
+        freed = 0
+        stale_keys = []
+        for key, size in conn.execute("SELECT key, bytes FROM thumbnails ORDER BY last_used"):
+            stale_keys.append((key,))
+            freed += size
+            if freed >= target:
+                break
+        conn.executemany("DELETE FROM thumbnails WHERE key = ?", stale_keys)
+        conn.commit()
+
+    def close(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
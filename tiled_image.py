@@ -0,0 +1,223 @@
+# -*- coding: utf-8 -*-
+"""超大图片的分块、多级细节显示。
+
+QGraphicsPixmapItem 每次绘制都要把整张图片按当前缩放重新采样，上亿像素的扫描件
+在平移和缩放时会非常卡。TiledImageItem 把图片看作金字塔：第 0 层是原图，每往上
+一层宽高各缩小一半，每层切成 TILE_SIZE 见方的图块。绘制时按当前缩放选择不比屏幕
+粗糙的最粗一层，只画与可见区域相交的图块。
+
+图块由 TileLoader 在线程池中按需生成（各层在第一次需要时由上一层缩小得到），生成
+后在界面线程转为 QPixmap，放入有内存上限的 LRU 缓存。尚未生成的图块先用载入时
+快速缩小的概览图代替。scene.render 导出（没有 widget）时直接从原图绘制，结果与
+普通图形项相同。
+"""
+import math
+import threading
+
+from PyQt5.QtCore import QObject, QRectF, QThreadPool, QRunnable, Qt, pyqtSignal
+from PyQt5.QtGui import QImage, QPixmap
+from PyQt5.QtWidgets import QGraphicsItem
+
+import image_edits
+
+TILE_SIZE = 512
+TILE_CACHE_BYTES = 192 * 1024 * 1024
+# 像素数超过该值的图片才分块显示，较小的图片仍使用 QGraphicsPixmapItem
+TILED_MIN_PIXELS = 16 * 1000 * 1000
+
+
+def use_tiles(width, height):
+    return width * height > TILED_MIN_PIXELS
+
+
+class TilePyramid:
+    """原图及逐层缩小一半的图像，各层在第一次使用时生成，可以在多个线程中读取。"""
+
+    def __init__(self, image, tile_size=TILE_SIZE):
+        self.tile_size = tile_size
+        self.sizes = [(image.width(), image.height())]
+        width, height = self.sizes[0]
+        while max(width, height) > tile_size:
+            width, height = max(1, (width + 1) // 2), max(1, (height + 1) // 2)
+            self.sizes.append((width, height))
+        self._levels = [image]
+        self._lock = threading.Lock()
+
+    @property
+    def level_count(self):
+        return len(self.sizes)
+
+    def level_for_scale(self, scale):
+        """每个图块像素不小于一个屏幕像素的最粗一层。"""
+        if scale <= 0 or scale >= 1:
+            return 0
+        return min(self.level_count - 1, int(math.floor(math.log2(1 / scale))))
+
+    def grid(self, level):
+        width, height = self.sizes[level]
+        return math.ceil(width / self.tile_size), math.ceil(height / self.tile_size)
+
+    def level_image(self, level):
+        with self._lock:
+            while len(self._levels) <= level:
+                width, height = self.sizes[len(self._levels)]
+                self._levels.append(self._levels[-1].scaled(width, height, Qt.IgnoreAspectRatio,
+                                                            Qt.SmoothTransformation))
+            return self._levels[level]
+
+    def tile(self, key):
+        """生成 (层, 列, 行) 对应的图块 QImage。"""
+        level, col, row = key
+        image = self.level_image(level)
+        x, y = col * self.tile_size, row * self.tile_size
+        return image.copy(x, y, min(self.tile_size, image.width() - x), min(self.tile_size, image.height() - y))
+
+    def tile_rect(self, key):
+        """图块在原图（第 0 层）坐标中的位置。"""
+        level, col, row = key
+        width, height = self.sizes[level]
+        scale_x, scale_y = self.sizes[0][0] / width, self.sizes[0][1] / height
+        x, y = col * self.tile_size, row * self.tile_size
+        return QRectF(x * scale_x, y * scale_y,
+                      min(self.tile_size, width - x) * scale_x, min(self.tile_size, height - y) * scale_y)
+
+    def tiles_in(self, level, rect):
+        """与原图坐标中的 rect 相交的图块。"""
+        width, height = self.sizes[level]
+        scale_x, scale_y = width / self.sizes[0][0], height / self.sizes[0][1]
+        cols, rows = self.grid(level)
+        first_col = max(0, int(rect.left() * scale_x) // self.tile_size)
+        last_col = min(cols - 1, int(math.ceil(rect.right() * scale_x)) // self.tile_size)
+        first_row = max(0, int(rect.top() * scale_y) // self.tile_size)
+        last_row = min(rows - 1, int(math.ceil(rect.bottom() * scale_y)) // self.tile_size)
+        return [(level, col, row) for row in range(first_row, last_row + 1)
+                for col in range(first_col, last_col + 1)]
+
+
+class _TileWorker(QRunnable):
+    """线程池中的图块工作项，不断从加载器中取任务直到没有任务或图片已切换"""
+
+    def __init__(self, loader, generation):
+        super().__init__()
+        self.loader = loader
+        self.generation = generation
+
+    def run(self):
+        while True:
+            task = self.loader._take(self.generation)
+            if task is None:
+                break
+            pyramid, key = task
+            try:
+                image = pyramid.tile(key)
+            except Exception:
+                image = QImage()
+            self.loader._deliver(self.generation, key, image)
+
+
+class TileLoader(QObject):
+    """在线程池中生成图块。
+
+    每次 request 用当前可见但尚未缓存的图块替换等待列表，已经滚出视野的请求直接
+    丢弃；reset 切换到新图片时，正在生成的旧图块完成后也会被丢弃。
+    """
+    tile_ready = pyqtSignal(int, object, QImage)  # 代号, (层, 列, 行), 图块
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.pool = QThreadPool(self)
+        self._lock = threading.Lock()
+        self._pyramid = None
+        self._pending = []
+        self._running = set()
+        self._active_workers = 0
+        self._generation = 0
+
+    def reset(self, pyramid):
+        """切换到新的金字塔（None 表示不再分块显示），返回新的代号"""
+        with self._lock:
+            self._generation += 1
+            self._pyramid = pyramid
+            self._pending = []
+            self._running = set()
+            self._active_workers = 0
+            return self._generation
+
+    def request(self, generation, keys):
+        with self._lock:
+            if generation != self._generation:
+                return
+            self._pending = [key for key in keys if key not in self._running]
+            starts = max(0, min(self.pool.maxThreadCount() - self._active_workers, len(self._pending)))
+            self._active_workers += starts
+        for _ in range(starts):
+            self.pool.start(_TileWorker(self, generation))
+
+    def shutdown(self, timeout_ms=3000):
+        self.reset(None)
+        self.pool.waitForDone(timeout_ms)
+
+    def _take(self, generation):
+        with self._lock:
+            if generation != self._generation:
+                return None
+            if not self._pending:
+                self._active_workers -= 1
+                return None
+            key = self._pending.pop(0)
+            self._running.add(key)
+            return self._pyramid, key
+
+    def _deliver(self, generation, key, image):
+        with self._lock:
+            if generation != self._generation:
+                return
+            self._running.discard(key)
+        self.tile_ready.emit(generation, key, image)
+
+
+class TiledImageItem(QGraphicsItem):
+    """按可见区域和缩放只绘制所需图块的图片图形项，尺寸和坐标与 QGraphicsPixmapItem 相同。"""
+
+    def __init__(self, image, loader, parent=None):
+        super().__init__(parent)
+        self.setFlag(QGraphicsItem.ItemUsesExtendedStyleOption)  # 需要 exposedRect
+        self._image = image
+        self.loader = loader
+        self.pyramid = TilePyramid(image)
+        self.generation = loader.reset(self.pyramid)
+        self.cache = image_edits.RenderCache(TILE_CACHE_BYTES)
+        # 载入时快速缩小的概览图，图块生成之前先显示它
+        self._overview = QPixmap.fromImage(image.scaled(TILE_SIZE, TILE_SIZE, Qt.KeepAspectRatio,
+                                                        Qt.FastTransformation))
+
+    def image(self):
+        return self._image
+
+    def boundingRect(self):
+        return QRectF(0, 0, self._image.width(), self._image.height())
+
+    def paint(self, painter, option, widget=None):
+        exposed = option.exposedRect
+        if widget is None:
+            # scene.render 导出到图片时直接从原图绘制全分辨率结果
+            painter.drawImage(exposed, self._image, exposed)
+            return
+        scale = option.levelOfDetailFromTransform(painter.worldTransform()) * widget.devicePixelRatioF()
+        level = self.pyramid.level_for_scale(scale)
+        keys = self.pyramid.tiles_in(level, exposed)
+        tiles = [(key, self.cache.get(key)) for key in keys]
+        missing = [key for key, pixmap in tiles if pixmap is None]
+        if missing:
+            painter.drawPixmap(self.boundingRect(), self._overview, QRectF(self._overview.rect()))
+            self.loader.request(self.generation, missing)
+        for key, pixmap in tiles:
+            if pixmap is not None:
+                painter.drawPixmap(self.pyramid.tile_rect(key), pixmap, QRectF(pixmap.rect()))
+
+    def add_tile(self, generation, key, image):
+        """TileLoader.tile_ready 的处理函数，在界面线程中调用"""
+        if generation != self.generation or image.isNull():
+            return
+        self.cache.put(key, QPixmap.fromImage(image))
+        self.update(self.pyramid.tile_rect(key))
@@ -0,0 +1,341 @@
+# -*- coding: utf-8 -*-
+"""命令行批处理入口，不打开任何窗口。
+
+    python -m xianyu_cli decompress 压缩包或文件夹... --prefix BR --digits 3 --jobs 8 --concurrent 2
+    python -m xianyu_cli rename 图片文件夹... --prefix BR --digits 3
+    python -m xianyu_cli size-cap 图片或文件夹... --output-dir 输出 --policy balanced
+    python -m xianyu_cli export 图片文件夹 --height-cm 6.7 --output 目录.xlsx
+    python -m xianyu_cli render-annotations 标注文件或文件夹... --output-dir 输出 --jobs 8
+    python -m xianyu_cli render-annotations 图片或文件夹... --layout 版式.annotations.json --output-dir 输出
+
+解压改名和 Excel 导出直接复用界面脚本中的 Worker / ExcelWorker，在当前线程同步运行；
+--jobs 是图片处理的进程数。解压或改名多个输入时，--concurrent 大于 1 则使用 job_queue
+同时处理多个任务，--jobs 个进程由同时运行的任务平分。--json 时每个事件在标准输出打印一行 JSON，
+否则在标准错误打印可读的进度。每个解压、改名或导出任务结束时输出各阶段的耗时汇总，
+--trace 时另外在输入旁写入逐张图片的阶段耗时记录（.trace.jsonl）。渲染标注使用 Qt 的 offscreen 平台，不需要显示器，
+--jobs 个进程并行渲染；指定 --layout 时把同一个标注布局套用到所有输入图片。
+有任何错误时退出码为 1。
+"""
+import argparse
+import importlib.util
+import json
+import multiprocessing
+import os
+import sys
+from pathlib import Path
+
+import size_cap
+import stage_trace
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+DECOMPRESS_SCRIPT = "解压模块测试（11.11 ok）.py"
+EXPORT_SCRIPT = "转换文档测试11.08（ok）.py"
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.bmp', '.gif')
+
+
+def load_script(filename, module_name):
+    """按路径导入界面脚本（文件名不是合法的模块名）。"""
+    if module_name in sys.modules:
+        return sys.modules[module_name]
+    spec = importlib.util.spec_from_file_location(module_name, os.path.join(SCRIPT_DIR, filename))
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[module_name] = module
+    spec.loader.exec_module(module)
+    return module
+
+
+def ensure_app(gui=False):
+    """创建 Qt 应用对象；需要绘制文字时使用 offscreen 平台的 QGuiApplication。"""
+    if gui:
+        os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+    from PyQt5.QtCore import QCoreApplication
+    app = QCoreApplication.instance()
+    if app is None:
+        if gui:
+            from PyQt5.QtGui import QGuiApplication
+            app = QGuiApplication([sys.argv[0]])
+        else:
+            app = QCoreApplication([sys.argv[0]])
+    return app
+
+
+class Reporter:
+    """输出进度事件：JSON 行写到标准输出，可读文字写到标准错误。"""
+
+    def __init__(self, as_json):
+        self.as_json = as_json
+        self.errors = 0
+        self._last_progress = {}
+        self._eta = {}
+
+    def emit(self, event, job, **fields):
+        if event == 'error':
+            self.errors += 1
+        if self.as_json:
+            print(json.dumps({'event': event, 'job': job, **fields}, ensure_ascii=False), flush=True)
+            return
+        if event == 'eta':
+            self._eta[job] = fields['seconds']
+        elif event == 'progress':
+            # 文字模式下每 10% 打印一次
+            step = fields['value'] // 10
+            if self._last_progress.get(job) == step:
+                return
+            self._last_progress[job] = step
+            eta = f"（预计剩余 {self._eta[job]} 秒）" if job in self._eta and fields['value'] < 100 else ""
+            print(f"[{job}] {fields['value']}%{eta}", file=sys.stderr, flush=True)
+        elif event in ('status', 'error', 'done', 'skipped'):
+            print(f"[{job}] {fields.get('message', '')}", file=sys.stderr, flush=True)
+        elif event == 'summary':
+            print(f"[{job}] 阶段耗时:\n{stage_trace.format_table(fields['stages'])}", file=sys.stderr, flush=True)
+
+
+def collect_files(inputs, accept):
+    """展开命令行中的文件和文件夹（文件夹只取第一层），保持给定顺序。"""
+    paths = []
+    for item in inputs:
+        path = Path(item)
+        if path.is_dir():
+            paths.extend(sorted(p for p in path.iterdir() if p.is_file() and accept(p)))
+        elif path.is_file():
+            paths.append(path)
+    return paths
+
+
+def make_worker(module, reporter, mode, path, args, workers):
+    """创建 Worker 并把它的信号接到 reporter；run() 结束时输出阶段耗时汇总。"""
+    worker = module.Worker(mode, str(path), args.prefix, args.digits, streaming=not args.no_streaming,
+                           workers=workers, chunk_size=args.chunk_size, policy=size_cap.POLICIES[args.policy],
+                           trace_path=stage_trace.trace_path(str(path)) if args.trace else None,
+                           extract_threads=args.extract_threads)
+    job = Path(path).name
+    summary = stage_trace.StageSummary()
+    worker.stage_event.connect(summary.add)
+    worker.eta_update.connect(lambda seconds: reporter.emit('eta', job, seconds=seconds))
+    worker.progress_update.connect(lambda value: reporter.emit('progress', job, value=value))
+    worker.status_update.connect(lambda message: reporter.emit('status', job, message=message))
+    worker.image_encoded.connect(
+        lambda name, quality, attempts: reporter.emit('image', job, name=name, quality=quality, attempts=attempts))
+    worker.error_signal.connect(lambda message: reporter.emit('error', job, message=message))
+    worker.completion_signal.connect(lambda message: reporter.emit('done', job, message=message))
+    worker.cancelled_signal.connect(lambda message: reporter.emit('error', job, message=message))
+    worker.finished_signal.connect(lambda: reporter.emit('summary', job, stages=summary.rows()))
+    return worker
+
+
+def run_jobs(module, reporter, mode, paths, args):
+    """依次处理每个输入；--concurrent > 1 时用任务队列在后台线程中并发处理。"""
+    if args.concurrent <= 1 or len(paths) <= 1:
+        for path in paths:
+            make_worker(module, reporter, mode, path, args, args.jobs).run()
+        return
+
+    import job_queue
+
+    app = ensure_app()
+    queue = job_queue.JobQueue(
+        lambda job, workers: make_worker(module, reporter, job.mode, job.path, args, workers),
+        max_running=args.concurrent, total_workers=args.jobs)
+    for path in paths:
+        queue.add(mode, str(path), args.prefix, args.digits)
+    queue.queue_finished.connect(app.quit)
+    queue.start()
+    if queue.running:
+        app.exec_()
+
+
+def command_decompress(args, reporter):
+    import archive_stream
+
+    ensure_app()
+    module = load_script(DECOMPRESS_SCRIPT, 'xianyu_decompress')
+    archives = collect_files(args.inputs, lambda p: archive_stream.archive_type(p.name) is not None)
+    if not archives:
+        reporter.emit('error', 'decompress', message="没有找到支持的压缩包。")
+    run_jobs(module, reporter, 'decompress', archives, args)
+
+
+def command_rename(args, reporter):
+    ensure_app()
+    module = load_script(DECOMPRESS_SCRIPT, 'xianyu_decompress')
+    folders = []
+    for folder in args.inputs:
+        if not os.path.isdir(folder):
+            reporter.emit('error', folder, message="不是文件夹。")
+            continue
+        folders.append(folder)
+    run_jobs(module, reporter, 'rename', folders, args)
+
+
+def command_size_cap(args, reporter):
+    import image_pipeline
+
+    images = collect_files(args.inputs, lambda p: p.suffix.lower() in IMAGE_EXTENSIONS)
+    if not images:
+        reporter.emit('error', 'size-cap', message="没有找到图片文件。")
+        return
+    output_dir = Path(args.output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+
+    jobs = []
+    used = set()
+    for image in images:
+        name = f"{image.stem}.jpg"
+        counter = 1
+        while name.lower() in used:
+            name = f"{image.stem}_{counter}.jpg"
+            counter += 1
+        used.add(name.lower())
+        jobs.append((str(image), str(image), output_dir / name))
+
+    results = image_pipeline.reencode_ordered(jobs, args.jobs, args.chunk_size, size_cap.POLICIES[args.policy])
+    for index, (label, dest_path, error, encode_stats, _) in enumerate(results):
+        if error:
+            reporter.emit('error', label, message=error)
+        else:
+            quality, attempts = encode_stats
+            reporter.emit('image', label, name=Path(dest_path).name, quality=quality, attempts=attempts)
+        reporter.emit('progress', 'size-cap', value=int((index + 1) / len(jobs) * 100))
+    reporter.emit('done', 'size-cap', message=f"已处理 {len(jobs)} 张图片，保存于: {output_dir}")
+
+
+def command_export(args, reporter):
+    ensure_app()
+    module = load_script(EXPORT_SCRIPT, 'xianyu_export')
+    folder = os.path.abspath(args.folder)
+    output = args.output or os.path.join(os.path.dirname(folder), "converted.xlsx")
+    use_height = args.width_cm is None
+    size_cm = args.height_cm if use_height else args.width_cm
+    worker = module.ExcelWorker(folder, output, use_height, size_cm, args.buffer_width, args.buffer_height,
+                                streaming=not args.no_streaming, embed_scale=args.embed_scale,
+                                workers=args.jobs, chunk_size=args.chunk_size, incremental=args.incremental,
+                                trace_path=stage_trace.trace_path(folder) if args.trace else None)
+    job = Path(folder).name
+    summary = stage_trace.StageSummary()
+    worker.stage_event.connect(summary.add)
+    worker.progress.connect(lambda value: reporter.emit('progress', job, value=value))
+    worker.error.connect(lambda message: reporter.emit('error', job, message=message))
+    worker.skipped.connect(lambda message: reporter.emit('skipped', job, message=f"已跳过: {message}"))
+    worker.finished.connect(lambda message: reporter.emit('done', job, message=message))
+    worker.run()
+    reporter.emit('summary', job, stages=summary.rows())
+
+
+def command_render_annotations(args, reporter):
+    ensure_app(gui=True)
+    import annotation_batch
+    import annotation_layout
+
+    output_dir = Path(args.output_dir)
+    if args.layout:
+        # 同一版式：把一个布局套用到所有图片
+        images = collect_files(args.inputs, lambda p: p.suffix.lower() in IMAGE_EXTENSIONS)
+        if not images:
+            reporter.emit('error', 'render', message="没有找到图片。")
+            return
+        try:
+            layout = annotation_layout.load(args.layout)
+        except Exception as e:
+            reporter.emit('error', 'render', message=f"无法读取标注文件 {args.layout}: {str(e)}")
+            return
+        output_dir.mkdir(parents=True, exist_ok=True)
+        jobs = annotation_batch.template_jobs(layout, [str(p) for p in images], str(output_dir), args.format)
+    else:
+        layout_files = collect_files(args.inputs, lambda p: p.name.endswith(annotation_layout.LAYOUT_SUFFIX))
+        if not layout_files:
+            reporter.emit('error', 'render', message="没有找到标注文件。")
+            return
+        output_dir.mkdir(parents=True, exist_ok=True)
+        jobs = []
+        for layout_file in layout_files:
+            name = layout_file.name[:-len(annotation_layout.LAYOUT_SUFFIX)] + f".{args.format}"
+            try:
+                jobs.append((layout_file.name, annotation_layout.load(layout_file), str(output_dir / name)))
+            except Exception as e:
+                reporter.emit('error', layout_file.name, message=str(e))
+
+    policy = size_cap.POLICIES[args.policy]
+    results = annotation_batch.render_ordered(jobs, args.jobs, args.chunk_size, policy)
+    for index, (label, dest_path, error, encode_stats) in enumerate(results):
+        if error:
+            reporter.emit('error', label, message=error)
+        else:
+            quality, attempts = encode_stats
+            reporter.emit('image', label, name=Path(dest_path).name, quality=quality, attempts=attempts)
+        reporter.emit('progress', 'render', value=int((index + 1) / len(jobs) * 100))
+    reporter.emit('done', 'render', message=f"已渲染 {len(jobs)} 张图片，保存于: {output_dir}")
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="python -m xianyu_cli", description="图片解压改名、限制大小、导出 Excel 和渲染标注")
+    parser.add_argument('--json', action='store_true', help="以 JSON 行输出进度事件")
+    parser.add_argument('--jobs', type=int, default=os.cpu_count() or 1, help="图片处理进程数（默认 CPU 核数）")
+    parser.add_argument('--chunk-size', type=int, default=4, help="每次分发给进程池的图片数")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    def add_policy(sub):
+        sub.add_argument('--policy', choices=sorted(size_cap.POLICIES), default='quality',
+                         help="超过800KB时的处理方式")
+
+    def add_trace(sub):
+        sub.add_argument('--trace', action='store_true', help="在输入旁写入逐张图片的阶段耗时记录（.trace.jsonl）")
+
+    def add_naming(sub):
+        sub.add_argument('--prefix', default="BRSF", help="新文件名前缀（默认 BRSF，与界面相同）")
+        sub.add_argument('--digits', type=int, default=3, help="序号位数")
+        sub.add_argument('--no-streaming', action='store_true', help="先解压到临时目录（旧方式）")
+        sub.add_argument('--concurrent', type=int, default=1, help="同时处理的压缩包或文件夹数")
+        sub.add_argument('--extract-threads', type=int, help="zip 并行解压的线程数（默认不超过 4）")
+        add_policy(sub)
+        add_trace(sub)
+
+    sub = subparsers.add_parser('decompress', help="解压并重命名压缩包中的图片")
+    sub.add_argument('inputs', nargs='+', help="压缩包或包含压缩包的文件夹")
+    add_naming(sub)
+    sub.set_defaults(handler=command_decompress)
+
+    sub = subparsers.add_parser('rename', help="重命名文件夹中的图片")
+    sub.add_argument('inputs', nargs='+', help="图片文件夹")
+    add_naming(sub)
+    sub.set_defaults(handler=command_rename)
+
+    sub = subparsers.add_parser('size-cap', help="把图片转为 JPEG 并限制在800KB以内")
+    sub.add_argument('inputs', nargs='+', help="图片或图片文件夹")
+    sub.add_argument('--output-dir', required=True)
+    add_policy(sub)
+    sub.set_defaults(handler=command_size_cap)
+
+    sub = subparsers.add_parser('export', help="把文件夹中的图片导出为 Excel 目录")
+    sub.add_argument('folder')
+    sub.add_argument('--output', help="默认为文件夹旁的 converted.xlsx")
+    size = sub.add_mutually_exclusive_group()
+    size.add_argument('--height-cm', type=float, default=6.7, help="按高度调整图片（默认 6.7cm）")
+    size.add_argument('--width-cm', type=float, help="按宽度调整图片")
+    sub.add_argument('--buffer-width', type=float, default=10, help="单元格宽度缓冲百分比")
+    sub.add_argument('--buffer-height', type=float, default=10, help="单元格高度缓冲百分比")
+    sub.add_argument('--embed-scale', type=int, default=2, help="嵌入分辨率（显示尺寸的倍数，0 为原图）")
+    sub.add_argument('--no-streaming', action='store_true', help="使用 openpyxl 在内存中生成工作簿")
+    sub.add_argument('--incremental', action='store_true', help="只处理新增或修改的图片")
+    add_trace(sub)
+    sub.set_defaults(handler=command_export)
+
+    sub = subparsers.add_parser('render-annotations', help="按标注文件渲染图片")
+    sub.add_argument('inputs', nargs='+', help="*.annotations.json 或包含它们的文件夹；指定 --layout 时为图片或图片文件夹")
+    sub.add_argument('--layout', help="套用到所有输入图片的标注文件")
+    sub.add_argument('--output-dir', required=True)
+    sub.add_argument('--format', choices=('jpg', 'png'), default='jpg')
+    add_policy(sub)
+    sub.set_defaults(handler=command_render_annotations)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    reporter = Reporter(args.json)
+    args.handler(args, reporter)
+    return 1 if reporter.errors else 0
+
+
+if __name__ == "__main__":
+    multiprocessing.freeze_support()
+    sys.exit(main())
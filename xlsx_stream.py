@@ -0,0 +1,241 @@
+# -*- coding: utf-8 -*-
+"""流式写出带图片的 Excel（xlsx）目录。
+
+直接按 OOXML 结构写 zip：每张图片在 add_image 时立即写入 xl/media 并释放字节，
+之后只保留几十字节的行和锚点信息，工作表和绘图部件在 close 时生成，
+因此内存占用不随图片总大小增长。copy_image 可以把已有 xlsx 中的图片部件原样
+复制过来，增量更新时未变化的图片不必重新解码。
+"""
+import shutil
+import time
+import zipfile
+from xml.sax.saxutils import escape, quoteattr
+
+EMU_PER_PIXEL = 9525
+
+NS_MAIN = "http://schemas.openxmlformats.org/spreadsheetml/2006/main"
+NS_REL = "http://schemas.openxmlformats.org/officeDocument/2006/relationships"
+NS_PKG_REL = "http://schemas.openxmlformats.org/package/2006/relationships"
+NS_XDR = "http://schemas.openxmlformats.org/drawingml/2006/spreadsheetDrawing"
+NS_A = "http://schemas.openxmlformats.org/drawingml/2006/main"
+REL_DOCUMENT = "http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument"
+REL_WORKSHEET = "http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet"
+REL_STYLES = "http://schemas.openxmlformats.org/officeDocument/2006/relationships/styles"
+REL_DRAWING = "http://schemas.openxmlformats.org/officeDocument/2006/relationships/drawing"
+REL_IMAGE = "http://schemas.openxmlformats.org/officeDocument/2006/relationships/image"
+
+IMAGE_CONTENT_TYPES = {'jpeg': 'image/jpeg', 'png': 'image/png', 'gif': 'image/gif'}
+
+# 样式 0 为默认，样式 1 为加粗并水平垂直居中（与 ExcelWorker 中 ID 列一致）
+STYLES_XML = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    f'<styleSheet xmlns="{NS_MAIN}">'
+    '<fonts count="2">'
+    '<font><sz val="11"/><name val="Calibri"/><family val="2"/></font>'
+    '<font><b/><sz val="11"/><name val="Calibri"/><family val="2"/></font>'
+    '</fonts>'
+    '<fills count="2"><fill><patternFill patternType="none"/></fill>'
+    '<fill><patternFill patternType="gray125"/></fill></fills>'
+    '<borders count="1"><border><left/><right/><top/><bottom/><diagonal/></border></borders>'
+    '<cellStyleXfs count="1"><xf numFmtId="0" fontId="0" fillId="0" borderId="0"/></cellStyleXfs>'
+    '<cellXfs count="2">'
+    '<xf numFmtId="0" fontId="0" fillId="0" borderId="0" xfId="0"/>'
+    '<xf numFmtId="0" fontId="1" fillId="0" borderId="0" xfId="0" applyFont="1" applyAlignment="1">'
+    '<alignment horizontal="center" vertical="center"/></xf>'
+    '</cellXfs>'
+    '<cellStyles count="1"><cellStyle name="Normal" xfId="0" builtinId="0"/></cellStyles>'
+    '</styleSheet>'
+)
+
+STYLE_DEFAULT = 0
+STYLE_BOLD_CENTER = 1
+
+
+def pixels_to_emu(pixels):
+    return int(pixels * EMU_PER_PIXEL)
+
+
+def column_letter(index):
+    """1 -> 'A'，27 -> 'AA'"""
+    letters = ""
+    while index > 0:
+        index, remainder = divmod(index - 1, 26)
+        letters = chr(65 + remainder) + letters
+    return letters
+
+
+class StreamingCatalogWriter:
+    """单工作表的流式 xlsx 写入器。"""
+
+    def __init__(self, output_path, sheet_title="Sheet1"):
+        self.output_path = output_path
+        self.sheet_title = sheet_title
+        self._zip = zipfile.ZipFile(output_path, 'w', zipfile.ZIP_DEFLATED)
+        self._column_widths = {}  # 列号（从 1 开始） -> 宽度
+        self._rows = {}  # 行号（从 1 开始） -> {'height': 磅, 'cells': {列号: (值, 样式)}}
+        self._anchors = []  # (媒体序号, 扩展名, 列, 列偏移, 行, 行偏移, 宽, 高)，位置从 0 开始，尺寸为 EMU
+        self._media_types = set()
+
+    def set_column_width(self, column, width):
+        self._column_widths[column] = width
+
+    def set_row_height(self, row, height_points):
+        self._rows.setdefault(row, {'height': None, 'cells': {}})['height'] = height_points
+
+    def set_cell(self, row, column, value, style=STYLE_DEFAULT):
+        self._rows.setdefault(row, {'height': None, 'cells': {}})['cells'][column] = (value, style)
+
+    def add_image(self, data, extension, column, row, offset_x_px, offset_y_px, width_px, height_px):
+        """立即写入图片数据并只记录锚点，返回媒体部件名；column/row 从 0 开始，与 AnchorMarker 一致。"""
+        index, extension, member = self._next_media(extension)
+        # 图片本身已压缩，直接存储
+        self._zip.writestr(member, data, compress_type=zipfile.ZIP_STORED)
+        self._add_anchor(index, extension, column, row, offset_x_px, offset_y_px, width_px, height_px)
+        return member
+
+    def copy_image(self, source_zip, source_member, extension, column, row,
+                   offset_x_px, offset_y_px, width_px, height_px):
+        """从已打开的 xlsx（ZipFile）中分块复制图片部件，不解码、不读入整张图片。"""
+        index, extension, member = self._next_media(extension)
+        info = zipfile.ZipInfo(member, date_time=time.localtime()[:6])
+        info.compress_type = zipfile.ZIP_STORED
+        with source_zip.open(source_member) as src, self._zip.open(info, 'w') as dst:
+            shutil.copyfileobj(src, dst, 1024 * 1024)
+        self._add_anchor(index, extension, column, row, offset_x_px, offset_y_px, width_px, height_px)
+        return member
+
+    def _next_media(self, extension):
+        extension = extension.lower()
+        if extension == 'jpg':
+            extension = 'jpeg'
+        if extension not in IMAGE_CONTENT_TYPES:
+            raise ValueError(f"不支持的图片格式: {extension}")
+        index = len(self._anchors) + 1
+        return index, extension, f"xl/media/image{index}.{extension}"
+
+    def _add_anchor(self, index, extension, column, row, offset_x_px, offset_y_px, width_px, height_px):
+        self._media_types.add(extension)
+        self._anchors.append((index, extension, column, pixels_to_emu(offset_x_px), row,
+                              pixels_to_emu(offset_y_px), pixels_to_emu(width_px), pixels_to_emu(height_px)))
+
+    def close(self):
+        try:
+            self._write_sheet()
+            if self._anchors:
+                self._write_drawing()
+            self._write_package_parts()
+        finally:
+            self._zip.close()
+
+    def abort(self):
+        self._zip.close()
+
+    def _write_sheet(self):
+        with self._zip.open("xl/worksheets/sheet1.xml", 'w') as f:
+            f.write(('<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+                     f'<worksheet xmlns="{NS_MAIN}" xmlns:r="{NS_REL}">').encode('utf-8'))
+            if self._column_widths:
+                f.write(b'<cols>')
+                for column in sorted(self._column_widths):
+                    f.write(f'<col min="{column}" max="{column}" width="{self._column_widths[column]:.6f}" '
+                            f'customWidth="1"/>'.encode('utf-8'))
+                f.write(b'</cols>')
+            f.write(b'<sheetData>')
+            for row in sorted(self._rows):
+                info = self._rows[row]
+                height = info['height']
+                row_attrs = f' ht="{height:.6f}" customHeight="1"' if height is not None else ''
+                parts = [f'<row r="{row}"{row_attrs}>']
+                for column in sorted(info['cells']):
+                    value, style = info['cells'][column]
+                    ref = f"{column_letter(column)}{row}"
+                    style_attr = f' s="{style}"' if style else ''
+                    if isinstance(value, (int, float)) and not isinstance(value, bool):
+                        parts.append(f'<c r="{ref}"{style_attr}><v>{value}</v></c>')
+                    else:
+                        parts.append(f'<c r="{ref}"{style_attr} t="inlineStr"><is>'
+                                     f'<t xml:space="preserve">{escape(str(value))}</t></is></c>')
+                parts.append('</row>')
+                f.write(''.join(parts).encode('utf-8'))
+            f.write(b'</sheetData>')
+            if self._anchors:
+                f.write(b'<drawing r:id="rId1"/>')
+            f.write(b'</worksheet>')
+
+        if self._anchors:
+            self._zip.writestr(
+                "xl/worksheets/_rels/sheet1.xml.rels",
+                '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+                f'<Relationships xmlns="{NS_PKG_REL}">'
+                f'<Relationship Id="rId1" Type="{REL_DRAWING}" Target="../drawings/drawing1.xml"/>'
+                '</Relationships>')
+
+    def _write_drawing(self):
+        with self._zip.open("xl/drawings/drawing1.xml", 'w') as f:
+            f.write(('<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+                     f'<xdr:wsDr xmlns:xdr="{NS_XDR}" xmlns:a="{NS_A}" xmlns:r="{NS_REL}">').encode('utf-8'))
+            for index, _, column, col_off, row, row_off, cx, cy in self._anchors:
+                f.write((
+                    '<xdr:oneCellAnchor>'
+                    f'<xdr:from><xdr:col>{column}</xdr:col><xdr:colOff>{col_off}</xdr:colOff>'
+                    f'<xdr:row>{row}</xdr:row><xdr:rowOff>{row_off}</xdr:rowOff></xdr:from>'
+                    f'<xdr:ext cx="{cx}" cy="{cy}"/>'
+                    '<xdr:pic>'
+                    f'<xdr:nvPicPr><xdr:cNvPr id="{index + 1}" name="Image {index}"/>'
+                    '<xdr:cNvPicPr><a:picLocks noChangeAspect="1"/></xdr:cNvPicPr></xdr:nvPicPr>'
+                    f'<xdr:blipFill><a:blip r:embed="rId{index}"/><a:stretch><a:fillRect/></a:stretch></xdr:blipFill>'
+                    f'<xdr:spPr><a:xfrm><a:off x="0" y="0"/><a:ext cx="{cx}" cy="{cy}"/></a:xfrm>'
+                    '<a:prstGeom prst="rect"><a:avLst/></a:prstGeom></xdr:spPr>'
+                    '</xdr:pic><xdr:clientData/></xdr:oneCellAnchor>').encode('utf-8'))
+            f.write(b'</xdr:wsDr>')
+
+        with self._zip.open("xl/drawings/_rels/drawing1.xml.rels", 'w') as f:
+            f.write(('<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+                     f'<Relationships xmlns="{NS_PKG_REL}">').encode('utf-8'))
+            for index, extension, *_ in self._anchors:
+                f.write(f'<Relationship Id="rId{index}" Type="{REL_IMAGE}" '
+                        f'Target="../media/image{index}.{extension}"/>'.encode('utf-8'))
+            f.write(b'</Relationships>')
+
+    def _write_package_parts(self):
+        defaults = ''.join(f'<Default Extension="{ext}" ContentType="{IMAGE_CONTENT_TYPES[ext]}"/>'
+                           for ext in sorted(self._media_types))
+        drawing_override = (
+            '<Override PartName="/xl/drawings/drawing1.xml" '
+            'ContentType="application/vnd.openxmlformats-officedocument.drawing+xml"/>'
+            if self._anchors else '')
+        self._zip.writestr(
+            "[Content_Types].xml",
+            '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+            '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+            '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+            '<Default Extension="xml" ContentType="application/xml"/>'
+            f'{defaults}'
+            '<Override PartName="/xl/workbook.xml" '
+            'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+            '<Override PartName="/xl/worksheets/sheet1.xml" '
+            'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+            '<Override PartName="/xl/styles.xml" '
+            'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.styles+xml"/>'
+            f'{drawing_override}'
+            '</Types>')
+        self._zip.writestr(
+            "_rels/.rels",
+            '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+            f'<Relationships xmlns="{NS_PKG_REL}">'
+            f'<Relationship Id="rId1" Type="{REL_DOCUMENT}" Target="xl/workbook.xml"/>'
+            '</Relationships>')
+        self._zip.writestr(
+            "xl/workbook.xml",
+            '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+            f'<workbook xmlns="{NS_MAIN}" xmlns:r="{NS_REL}">'
+            f'<sheets><sheet name={quoteattr(self.sheet_title)} sheetId="1" r:id="rId1"/></sheets>'
+            '</workbook>')
+        self._zip.writestr(
+            "xl/_rels/workbook.xml.rels",
+            '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+            f'<Relationships xmlns="{NS_PKG_REL}">'
+            f'<Relationship Id="rId1" Type="{REL_WORKSHEET}" Target="worksheets/sheet1.xml"/>'
+            f'<Relationship Id="rId2" Type="{REL_STYLES}" Target="styles.xml"/>'
+            '</Relationships>')
+        self._zip.writestr("xl/styles.xml", STYLES_XML)
@@ -1,47 +1,390 @@
 import sys
 import os
+import heapq
+import multiprocessing
+import itertools
+import sqlite3
+import threading
+from collections import OrderedDict
 from PyQt5.QtWidgets import (
     QApplication, QMainWindow, QPushButton, QVBoxLayout, QHBoxLayout, QWidget,
     QFileDialog, QMessageBox, QLabel, QListWidget, QListWidgetItem,
     QColorDialog, QSpinBox, QLineEdit, QGroupBox, QGridLayout, QStatusBar,
     QListView, QGraphicsView, QGraphicsScene, QGraphicsPixmapItem,
     QGraphicsTextItem, QGraphicsItem, QGraphicsItemGroup, QSplitter,
-    QSizePolicy, QGraphicsLineItem, QDialog, QRubberBand, QSlider
+    QSizePolicy, QGraphicsLineItem, QDialog, QRubberBand, QSlider, QComboBox
 )
 from PyQt5.QtGui import (
     QPixmap, QPainter, QPen, QColor, QFont, QIcon, QImage,
-    QFontMetrics, QTransform, QCursor
+    QFontMetrics, QCursor
 )
 from PyQt5.QtCore import (
-    Qt, QPoint, QSize, QRectF, pyqtSignal, QThread, QObject,
-    pyqtSlot, QBuffer, QRect, QEvent
+    Qt, QPoint, QSize, pyqtSignal, QThread, QObject,
+    pyqtSlot, QRect, QEvent, QThreadPool, QRunnable, QTimer,
+    QAbstractListModel, QModelIndex
 )
 
+import annotation_batch
+import annotation_layout
+import image_edits
+import image_pipeline
+import image_probe
+import size_cap
+import thumbnail_cache
+import tiled_image
+
+
+def pil_to_qimage(image):
+    """将 RGB/RGBA 的 PIL 图像转换为独立的 QImage"""
+    if image.mode == 'RGBA':
+        image_format, bytes_per_pixel = QImage.Format_RGBA8888, 4
+    else:
+        image = image.convert('RGB')
+        image_format, bytes_per_pixel = QImage.Format_RGB888, 3
+    data = image.tobytes()
+    return QImage(data, image.width, image.height,
+                  image.width * bytes_per_pixel, image_format).copy()
+
+
+def load_thumbnail_image(file_path, icon_size, cache=None):
+    """生成缩略图 QImage，优先读取磁盘缓存；JPEG 使用 draft 缩小解码"""
+    if cache is not None:
+        try:
+            data = cache.get(file_path, icon_size)
+        except sqlite3.Error:
+            data = None
+        if data:
+            image = QImage.fromData(data)
+            if not image.isNull():
+                return image
+    try:
+        thumbnail = image_probe.thumbnail(file_path, icon_size)
+    except Exception:
+        # PIL 无法识别的文件交给 Qt 处理
+        return QImage(file_path).scaled(
+            icon_size, icon_size, Qt.KeepAspectRatio, Qt.SmoothTransformation)
+    if cache is not None:
+        try:
+            cache.put(file_path, icon_size, thumbnail_cache.encode_thumbnail(thumbnail))
+        except sqlite3.Error:
+            pass
+    return pil_to_qimage(thumbnail)
 
-class ThumbnailLoader(QObject):
-    """异步加载缩略图的工作线程"""
-    finished = pyqtSignal()
-    thumbnail_loaded = pyqtSignal(str, QIcon)
 
-    def __init__(self, file_paths, icon_size):
+class _ThumbnailWorker(QRunnable):
+    """线程池中的缩略图工作项，不断从引擎队列中取任务直到队列为空或被取消"""
+
+    def __init__(self, engine, generation):
         super().__init__()
-        self.file_paths = file_paths
+        self.engine = engine
+        self.generation = generation
+
+    def run(self):
+        while True:
+            file_path = self.engine._take(self.generation)
+            if file_path is None:
+                break
+            try:
+                image = load_thumbnail_image(file_path, self.engine.icon_size, self.engine.cache)
+            except Exception:
+                image = QImage()
+            self.engine._deliver(self.generation, file_path, image)
+
+
+class ThumbnailEngine(QObject):
+    """多线程缩略图加载引擎
+
+    图片解码在线程池中并行进行（解码时释放 GIL）。通过 request 按需提交任务，
+    可见项使用较高优先级插队；切换文件夹时 cancel 丢弃所有未完成的任务和结果。
+    结果在界面线程中定时批量发送，避免成千上万次单独的信号。
+    """
+    thumbnails_loaded = pyqtSignal(list)  # [(file_path, QImage), ...]
+    finished = pyqtSignal()
+
+    NORMAL_PRIORITY = 1
+    VISIBLE_PRIORITY = 0
+
+    def __init__(self, icon_size, cache=None, parent=None, flush_interval=50):
+        super().__init__(parent)
         self.icon_size = icon_size
-        self.is_running = True
+        self.cache = cache
+        self.pool = QThreadPool(self)
+        self._lock = threading.Lock()
+        self._queue = []  # 堆：(优先级, 序号, 文件路径)
+        self._queued = {}  # 文件路径 -> 当前优先级，用于跳过堆中过期的条目
+        self._results = []
+        self._remaining = 0  # 排队中和解码中的任务数
+        self._active_workers = 0
+        self._generation = 0
+        self._sequence = itertools.count()
+        self._flush_timer = QTimer(self)
+        self._flush_timer.setInterval(flush_interval)
+        self._flush_timer.timeout.connect(self._flush)
+
+    def request(self, file_paths, priority=VISIBLE_PRIORITY):
+        """提交需要加载的文件；已在队列中的文件只会提升优先级"""
+        with self._lock:
+            for file_path in file_paths:
+                current = self._queued.get(file_path)
+                if current is not None and current <= priority:
+                    continue
+                heapq.heappush(self._queue, (priority, next(self._sequence), file_path))
+                self._queued[file_path] = priority
+                if current is None:
+                    self._remaining += 1
+            generation = self._generation
+            starts = max(0, min(self.pool.maxThreadCount() - self._active_workers, len(self._queued)))
+            self._active_workers += starts
+        for _ in range(starts):
+            self.pool.start(_ThumbnailWorker(self, generation))
+        if self._remaining and not self._flush_timer.isActive():
+            self._flush_timer.start()
+
+    def cancel(self):
+        """丢弃所有排队的任务和未发送的结果，正在解码的图片完成后也会被丢弃"""
+        with self._lock:
+            self._generation += 1
+            self._queue = []
+            self._queued.clear()
+            self._results = []
+            self._remaining = 0
+            self._active_workers = 0
+        self._flush_timer.stop()
+
+    def shutdown(self, timeout_ms=3000):
+        self.cancel()
+        self.pool.waitForDone(timeout_ms)
+
+    def _take(self, generation):
+        with self._lock:
+            if generation != self._generation:
+                return None
+            while self._queue:
+                priority, _, file_path = heapq.heappop(self._queue)
+                if self._queued.get(file_path) == priority:
+                    del self._queued[file_path]
+                    return file_path
+            # 队列已空，工作项退出；之后的 request 会重新启动工作项
+            self._active_workers -= 1
+            return None
+
+    def _deliver(self, generation, file_path, image):
+        with self._lock:
+            if generation == self._generation:
+                self._results.append((file_path, image))
+                self._remaining -= 1
+
+    def _flush(self):
+        with self._lock:
+            batch, self._results = self._results, []
+            done = self._remaining <= 0
+        if batch:
+            self.thumbnails_loaded.emit(batch)
+        if done:
+            self._flush_timer.stop()
+            self.finished.emit()
+
+
+class _ExportWorker(QRunnable):
+    """线程池中的导出工作项：渲染标注、按大小限制编码并写入文件"""
+
+    def __init__(self, service, job_id, layout, source, save_path, policy):
+        super().__init__()
+        self.service = service
+        self.job_id = job_id
+        self.layout = layout
+        self.source = source
+        self.save_path = save_path
+        self.policy = policy
+
+    def run(self):
+        # 先写同一目录中的临时文件再替换原图，写入中途失败或被读取时原图保持完整
+        temp_path = self.save_path + '.tmp'
+        try:
+            image = annotation_layout.render(self.layout, self.source)
+            result = annotation_layout.encode_qimage(
+                image, annotation_layout.image_format_for(self.save_path), self.policy,
+                estimator=self.service.estimator)
+            with open(temp_path, 'wb') as f:
+                f.write(result.data)
+            os.replace(temp_path, self.save_path)
+        except Exception as e:
+            if os.path.exists(temp_path):
+                try:
+                    os.remove(temp_path)
+                except OSError:
+                    pass
+            self.service._finish(self.job_id, self.save_path, None, str(e))
+        else:
+            self.service._finish(self.job_id, self.save_path, result, None)
+
 
-    def stop(self):
-        self.is_running = False
+class ExportService(QObject):
+    """在后台线程中保存标注后的图片
 
+    submit 只接收标注布局和源图片 QImage 的快照，界面线程立即返回，可以继续切换
+    和标注下一张图片。导出按提交顺序逐个执行，同一文件连续保存时最后一次的结果
+    生效；质量估计缓存只在导出线程中使用。
+    """
+    export_finished = pyqtSignal(int, str, object)  # 任务 ID, 保存路径, size_cap.EncodeResult
+    export_failed = pyqtSignal(int, str, str)  # 任务 ID, 保存路径, 错误信息
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.pool = QThreadPool(self)
+        self.pool.setMaxThreadCount(1)
+        self.estimator = size_cap.QualityEstimator()
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self._pending = 0
+
+    @property
+    def pending(self):
+        with self._lock:
+            return self._pending
+
+    def submit(self, layout, source, save_path, policy=None):
+        """提交一次导出，返回任务 ID"""
+        job_id = next(self._ids)
+        with self._lock:
+            self._pending += 1
+        self.pool.start(_ExportWorker(self, job_id, layout, source, save_path, policy))
+        return job_id
+
+    def wait_for_done(self, timeout_ms=-1):
+        """等待所有已提交的导出写完，关闭窗口时调用以免丢失保存"""
+        return self.pool.waitForDone(timeout_ms)
+
+    def _finish(self, job_id, save_path, result, error):
+        with self._lock:
+            self._pending -= 1
+        if error is None:
+            self.export_finished.emit(job_id, save_path, result)
+        else:
+            self.export_failed.emit(job_id, save_path, error)
+
+
+class BatchRenderWorker(QObject):
+    """把同一个标注布局套用到多张图片，在子进程中并行渲染并按大小限制保存"""
+    progress = pyqtSignal(int)
+    error = pyqtSignal(str)
+    finished = pyqtSignal(str)
+
+    def __init__(self, layout, image_paths, output_dir, policy, workers):
+        super().__init__()
+        self.layout = layout
+        self.image_paths = image_paths
+        self.output_dir = output_dir
+        self.policy = policy
+        self.workers = workers
+        self._cancelled = False
+
+    def cancel(self):
+        """在当前这批图片渲染完后停止"""
+        self._cancelled = True
+
+    @pyqtSlot()
     def run(self):
-        for file_path in self.file_paths:
-            if not self.is_running:
-                break
-            pixmap = QPixmap(file_path).scaled(
-                self.icon_size, self.icon_size,
-                Qt.KeepAspectRatio, Qt.SmoothTransformation)
-            icon = QIcon(pixmap)
-            self.thumbnail_loaded.emit(file_path, icon)
-        self.finished.emit()
+        jobs = annotation_batch.template_jobs(self.layout, self.image_paths, self.output_dir)
+        results = annotation_batch.render_ordered(jobs, self.workers, 2, self.policy)
+        done = failed = 0
+        try:
+            for label, _, error, _ in results:
+                done += 1
+                if error:
+                    failed += 1
+                    self.error.emit(f"{label}: {error.splitlines()[0]}")
+                self.progress.emit(int(done / len(jobs) * 100))
+                if self._cancelled:
+                    break
+        except Exception as e:
+            self.error.emit(f"批量渲染时出错: {str(e)}")
+        finally:
+            results.close()
+        self.finished.emit(f"已渲染 {done - failed}/{len(jobs)} 张图片，保存于: {self.output_dir}")
+
+
+class ThumbnailListModel(QAbstractListModel):
+    """虚拟化的缩略图列表模型
+
+    只有视图真正绘制某一行时才通过 data(DecorationRole) 请求它的缩略图，
+    图标保存在有上限的 LRU 缓存中，滚出视野的图标会被逐步淘汰，
+    因此内存占用与文件夹大小无关。
+    """
+
+    def __init__(self, engine, max_cached_icons=400, parent=None):
+        super().__init__(parent)
+        self.engine = engine
+        self.max_cached_icons = max_cached_icons
+        self.file_paths = []
+        self._rows = {}  # 文件路径 -> 行号
+        self._icons = OrderedDict()  # 文件路径 -> QIcon，按最近使用排序
+        self._requested = set()  # 已提交但尚未返回的文件
+        placeholder = QPixmap(engine.icon_size, engine.icon_size)
+        placeholder.fill(Qt.transparent)
+        self.placeholder_icon = QIcon(placeholder)
+        self.engine.thumbnails_loaded.connect(self.on_thumbnails_loaded)
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.file_paths)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid() or index.row() >= len(self.file_paths):
+            return None
+        file_path = self.file_paths[index.row()]
+        if role == Qt.DisplayRole:
+            return os.path.basename(file_path)
+        if role == Qt.UserRole or role == Qt.ToolTipRole:
+            return file_path
+        if role == Qt.DecorationRole:
+            icon = self._icons.get(file_path)
+            if icon is not None:
+                self._icons.move_to_end(file_path)
+                return icon
+            if file_path not in self._requested:
+                self._requested.add(file_path)
+                self.engine.request([file_path], ThumbnailEngine.VISIBLE_PRIORITY)
+            return self.placeholder_icon
+        return None
+
+    def set_file_paths(self, file_paths):
+        self.beginResetModel()
+        self.engine.cancel()
+        self.file_paths = list(file_paths)
+        self._rows = {file_path: row for row, file_path in enumerate(self.file_paths)}
+        self._icons.clear()
+        self._requested.clear()
+        self.endResetModel()
+
+    def prefetch(self, rows):
+        """以普通优先级预取这些行的缩略图（不在缓存中且未请求的）"""
+        file_paths = []
+        for row in rows:
+            if 0 <= row < len(self.file_paths):
+                file_path = self.file_paths[row]
+                if file_path not in self._icons and file_path not in self._requested:
+                    self._requested.add(file_path)
+                    file_paths.append(file_path)
+        if file_paths:
+            self.engine.request(file_paths, ThumbnailEngine.NORMAL_PRIORITY)
+
+    @pyqtSlot(list)
+    def on_thumbnails_loaded(self, batch):
+        changed_rows = []
+        for file_path, image in batch:
+            self._requested.discard(file_path)
+            row = self._rows.get(file_path)
+            if row is None:
+                continue
+            # 解码失败时缓存空图标，避免重复请求
+            self._icons[file_path] = QIcon(QPixmap.fromImage(image)) if not image.isNull() else QIcon()
+            self._icons.move_to_end(file_path)
+            changed_rows.append(row)
+        while len(self._icons) > self.max_cached_icons:
+            self._icons.popitem(last=False)
+        if changed_rows:
+            self.dataChanged.emit(self.index(min(changed_rows)), self.index(max(changed_rows)),
+                                  [Qt.DecorationRole])
 
 
 class ImageGraphicsView(QGraphicsView):
@@ -60,6 +403,7 @@ class ImageGraphicsView(QGraphicsView):
         self.scene.addItem(self.image_group)
 
         self.image_item = None  # 原始图片的图形项
+        self.image = QImage()  # 原始图片的 QImage，载入时转换一次，供检测背景色和后台导出使用
         self.annotations = []  # 存储所有的标注项
         self.prefix = "BR"
         self.num_digits = 2  # 序号位数，默认为2
@@ -91,17 +435,24 @@ class ImageGraphicsView(QGraphicsView):
         # 背景颜色
         self.background_color = QColor(255, 255, 255)  # 默认白色
 
+        # 超大图片的图块在线程池中生成
+        self.tile_loader = tiled_image.TileLoader(self)
+        self.tile_loader.tile_ready.connect(self.on_tile_ready)
+
         # 启用鼠标跟踪
         self.setMouseTracking(True)
 
+    def source_image(self):
+        """当前图片的 QImage，载入时已转换好，导出时不需要在界面线程中再转换"""
+        return self.image
+
     def detect_background_color(self):
         """检测图像背景颜色，通过采样四个角的像素颜色并取平均"""
         if not self.image_item:
             self.background_color = QColor(255, 255, 255)  # 默认白色
             return
 
-        pixmap = self.image_item.pixmap()
-        image = pixmap.toImage()
+        image = self.source_image()
         width = image.width()
         height = image.height()
 
@@ -128,8 +479,14 @@ class ImageGraphicsView(QGraphicsView):
         self.image_group = QGraphicsItemGroup()
         self.scene.addItem(self.image_group)
 
-        self.image_item = QGraphicsPixmapItem(pixmap)
-        self.image_item.setTransformationMode(Qt.SmoothTransformation)
+        self.image = pixmap.toImage()
+        if tiled_image.use_tiles(pixmap.width(), pixmap.height()):
+            # 超大图片分块、分级显示，平移和缩放时只重新采样可见的图块
+            self.image_item = tiled_image.TiledImageItem(self.image, self.tile_loader)
+        else:
+            self.tile_loader.reset(None)
+            self.image_item = QGraphicsPixmapItem(pixmap)
+            self.image_item.setTransformationMode(Qt.SmoothTransformation)
         self.image_item.setTransformOriginPoint(
             pixmap.width() / 2, pixmap.height() / 2)
         self.image_item.setPos(
@@ -153,6 +510,10 @@ class ImageGraphicsView(QGraphicsView):
 
         self.annotations_changed.emit()
 
+    def on_tile_ready(self, generation, key, image):
+        if isinstance(self.image_item, tiled_image.TiledImageItem):
+            self.image_item.add_tile(generation, key, image)
+
     def set_prefix(self, prefix):
         self.prefix = prefix
         for i, item in enumerate(self.annotations, start=1):
@@ -417,78 +778,59 @@ class ImageGraphicsView(QGraphicsView):
     def mouseReleaseEvent(self, event):
         super().mouseReleaseEvent(event)
 
-    def save_image(self, save_path):
-        if not self.image_item:
-            return False
+    def export_snapshot(self, save_path):
+        """返回后台导出所需的 (标注布局, 源图片 QImage)，没有图片时返回 None。
 
-        # 临时隐藏悬浮的标注和未固定的水平线
-        items_to_hide = []
-        if self.floating_annotation_item:
-            self.floating_annotation_item.setVisible(False)
-            items_to_hide.append(self.floating_annotation_item)
-        if self.fixed_y_line and not self.fixed_y_line_fixed:
-            self.fixed_y_line.setVisible(False)
-            items_to_hide.append(self.fixed_y_line)
+        保存的内容与场景中显示的相同：原图加上已固定的标注，不含悬浮标注。
+        """
+        if not self.image_item:
+            return None
+        return self.layout_snapshot(save_path), self.source_image()
 
-        try:
-            rect = self.image_group.mapToScene(
-                self.image_group.boundingRect()).boundingRect()
-            image = QImage(rect.size().toSize(), QImage.Format_RGB32)
-            image.fill(self.background_color)  # 填充背景颜色
-            painter = QPainter(image)
-            painter.setRenderHint(QPainter.Antialiasing)
-            painter.setRenderHint(QPainter.SmoothPixmapTransform)
-            self.scene.render(painter, QRectF(image.rect()), rect)
-            painter.end()
-
-            # 检查图片格式，默认保存为JPEG
-            format = "JPEG"
-            if save_path.lower().endswith(".png"):
-                format = "PNG"
-
-            # 保存到内存中，检查大小
-            buffer = QBuffer()
-            buffer.open(QBuffer.ReadWrite)
-            quality = 100
-            while quality >= 10:
-                buffer.seek(0)
-                buffer.buffer().clear()
-                if image.save(buffer, format, quality):
-                    size_kb = buffer.size() / 1024
-                    if size_kb <= 800:
-                        with open(save_path, 'wb') as f:
-                            f.write(buffer.data())
-                        return True
-                quality -= 10
-            # 如果最低质量仍然大于800KB，强制保存
-            return image.save(save_path, format, quality=10)
-        except Exception as e:
-            QMessageBox.critical(self, "保存失败", f"保存图片时出错: {str(e)}")
-            return False
-        finally:
-            # 恢复可见性
-            for item in items_to_hide:
-                item.setVisible(True)
+    def layout_snapshot(self, image_path):
+        """把当前的标注导出为 annotation_layout.AnnotationLayout（不含悬浮标注）。"""
+        items = list(self.annotations)
+        if self.id_item:
+            items.append(self.id_item)
+        annotations = [
+            annotation_layout.Annotation(
+                text=item.toPlainText(), x=item.pos().x(), y=item.pos().y(),
+                font_size=item.font().pointSize(), color=item.defaultTextColor().name(),
+                type=item.data(0) or 'normal', font_family=item.font().family())
+            for item in items
+        ]
+        fixed_y = None
+        if self.fixed_y_line and self.fixed_y_line_fixed:
+            fixed_y = self.fixed_y_line.line().y1()
+        return annotation_layout.AnnotationLayout(image_path, self.background_color.name(), annotations, fixed_y)
 
 
 class ImageEditorDialog(QDialog):
-    """图片编辑对话框，提供旋转、翻转和裁剪功能，并增加撤销功能"""
+    """图片编辑对话框，提供旋转、翻转和裁剪功能，并增加撤销功能
+
+    编辑以 image_edits 的操作列表记录，撤销/重做只保存操作列表。对话框中显示的
+    结果都从按显示区域大小缩小的预览图一次渲染，只有保存时才对原图做一次全分辨率
+    渲染。
+    """
     edited_pixmap = pyqtSignal(QPixmap)
 
+    # 键盘等非拖动方式调整角度后，停止调整多久再把角度记入撤销历史（毫秒）
+    ROTATION_COMMIT_DELAY_MS = 250
+
     def __init__(self, pixmap, background_color, parent=None):
         super().__init__(parent)
         self.setWindowTitle("图片编辑")
         self.resize(900, 800)
         self.original_pixmap = pixmap
-        self.base_pixmap = pixmap.copy()  # 基础图像，用于旋转
-        self.current_pixmap = pixmap.copy()
+        self.ops = ()  # 已确定的编辑操作，不含滑动条上的旋转角度
         self.rotation_angle = 0  # 当前旋转角度
-        self.history_stack = []  # 操作历史堆栈
+        self.history = image_edits.EditHistory(image_edits.EditState(self.ops, self.rotation_angle))
+        self.render_cache = image_edits.RenderCache()  # 预览图的渲染结果
         self.background_color = background_color  # 背景颜色
 
         self.image_label = QLabel()
         self.image_label.setAlignment(Qt.AlignCenter)
-        self.image_label.setPixmap(self.current_pixmap)
+        self.image_label.setPixmap(self.original_pixmap)
         self.image_label.setScaledContents(True)
         self.image_label.setMinimumSize(800, 600)
 
@@ -502,6 +844,7 @@ class ImageEditorDialog(QDialog):
         self.confirm_crop_button.setToolTip("确认裁剪")
         self.confirm_crop_button.setVisible(False)  # 初始隐藏
         self.undo_button = QPushButton("撤销")
+        self.redo_button = QPushButton("重做")
         self.save_button = QPushButton("保存")
         self.cancel_button = QPushButton("取消")
 
@@ -527,6 +870,7 @@ class ImageEditorDialog(QDialog):
         button_layout.addWidget(self.crop_button)
         button_layout.addWidget(self.confirm_crop_button)  # 添加确认裁剪按钮
         button_layout.addWidget(self.undo_button)
+        button_layout.addWidget(self.redo_button)
 
         rotation_layout = QHBoxLayout()
         rotation_layout.addWidget(QLabel("手动旋转:"))
@@ -555,6 +899,7 @@ class ImageEditorDialog(QDialog):
         self.crop_button.clicked.connect(self.toggle_crop_mode)
         self.confirm_crop_button.clicked.connect(self.apply_crop)
         self.undo_button.clicked.connect(self.undo_operation)
+        self.redo_button.clicked.connect(self.redo_operation)
         self.save_button.clicked.connect(self.save_edits)
         self.cancel_button.clicked.connect(self.reject)
         self.rotation_slider.valueChanged.connect(self.manual_rotate)
@@ -566,39 +911,75 @@ class ImageEditorDialog(QDialog):
         self.rubber_band = QRubberBand(QRubberBand.Rectangle, self.image_label)
         self.origin = QPoint()
         self.crop_rect = QRect()
-        self.manual_rotate_previous_pixmap = None
+
+        # 预览用的原图缩小图，显示区域变大时重新生成
+        self.proxy_pixmap = None
+        self.proxy_max_edge = None
+        # 滑动条上的角度还没有记入撤销历史
+        self.rotation_pending = False
+        self.rotation_commit_timer = QTimer(self)
+        self.rotation_commit_timer.setSingleShot(True)
+        self.rotation_commit_timer.setInterval(self.ROTATION_COMMIT_DELAY_MS)
+        self.rotation_commit_timer.timeout.connect(self.commit_rotation)
+
+    def preview_source(self):
+        """不超过显示区域大小的原图缩小图"""
+        max_edge = max(1, int(max(self.image_label.width(), self.image_label.height()) * self.devicePixelRatioF()))
+        if self.proxy_pixmap is None or self.proxy_max_edge != max_edge:
+            if max(self.original_pixmap.width(), self.original_pixmap.height()) > max_edge:
+                self.proxy_pixmap = self.original_pixmap.scaled(max_edge, max_edge, Qt.KeepAspectRatio,
+                                                                Qt.SmoothTransformation)
+            else:
+                self.proxy_pixmap = self.original_pixmap
+            self.proxy_max_edge = max_edge
+            self.render_cache.clear()
+        return self.proxy_pixmap
+
+    def current_ops(self, angle):
+        """已确定的操作加上滑动条上的旋转角度"""
+        return image_edits.append_op(self.ops, image_edits.EditOp('rotate', angle))
 
     def rotate_pixmap(self, angle):
-        """根据累积旋转角度旋转图像并使用背景颜色填充空白区域"""
+        """按已有操作和旋转角度从预览图一次渲染并显示，空白区域使用背景颜色填充"""
         try:
-            transform = QTransform().rotate(angle)
-            rotated_pixmap = self.base_pixmap.transformed(transform, Qt.SmoothTransformation)
-            # 计算旋转后的边界矩形
-            rotated_rect = rotated_pixmap.rect()
-            # 创建一个新的 QPixmap，填充背景颜色
-            final_pixmap = QPixmap(rotated_rect.size())
-            final_pixmap.fill(self.background_color)
-            # 将旋转后的图像绘制到新的 QPixmap 上
-            painter = QPainter(final_pixmap)
-            painter.drawPixmap(0, 0, rotated_pixmap)
-            painter.end()
-            self.current_pixmap = final_pixmap
-            self.image_label.setPixmap(self.current_pixmap)
+            ops = self.current_ops(angle)
+            proxy = self.preview_source()
+            pixmap = self.render_cache.get(ops)
+            if pixmap is None:
+                factor = proxy.width() / self.original_pixmap.width()
+                pixmap = image_edits.render(proxy, image_edits.scale_ops(ops, factor), self.background_color)
+                self.render_cache.put(ops, pixmap)
+            self.image_label.setPixmap(pixmap)
         except Exception as e:
             QMessageBox.critical(self, "旋转失败", f"旋转图片时出错: {str(e)}")
 
+    def record_state(self):
+        """把当前操作和旋转角度记入撤销历史"""
+        self.rotation_commit_timer.stop()
+        self.rotation_pending = False
+        self.history.push(image_edits.EditState(self.ops, self.rotation_angle))
+
+    def set_rotation_angle(self, angle):
+        self.rotation_angle = angle
+        self.rotation_slider.blockSignals(True)
+        self.rotation_slider.setValue(angle)
+        self.rotation_slider.blockSignals(False)
+        self.rotation_label.setText(f"旋转角度: {angle}°")
+
+    def commit_rotation(self):
+        """滑动条调整结束后把角度记入撤销历史"""
+        if self.rotation_pending:
+            self.record_state()
+
     def rotate_left(self):
         """左旋转90°"""
         try:
-            self.history_stack.append(self.base_pixmap.copy())
-            self.rotation_angle -= 90
-            if self.rotation_angle < -180:
-                self.rotation_angle += 360
-            self.rotation_slider.blockSignals(True)
-            self.rotation_slider.setValue(self.rotation_angle)
-            self.rotation_slider.blockSignals(False)
-            self.rotation_label.setText(f"旋转角度: {self.rotation_angle}°")
+            angle = self.rotation_angle - 90
+            if angle < -180:
+                angle += 360
+            self.set_rotation_angle(angle)
             self.rotate_pixmap(self.rotation_angle)
+            self.record_state()
             self.status_label.setText("")
         except Exception as e:
             QMessageBox.critical(self, "旋转失败", f"旋转图片时出错: {str(e)}")
@@ -606,48 +987,44 @@ class ImageEditorDialog(QDialog):
     def rotate_right(self):
         """右旋转90°"""
         try:
-            self.history_stack.append(self.base_pixmap.copy())
-            self.rotation_angle += 90
-            if self.rotation_angle > 180:
-                self.rotation_angle -= 360
-            self.rotation_slider.blockSignals(True)
-            self.rotation_slider.setValue(self.rotation_angle)
-            self.rotation_slider.blockSignals(False)
-            self.rotation_label.setText(f"旋转角度: {self.rotation_angle}°")
+            angle = self.rotation_angle + 90
+            if angle > 180:
+                angle -= 360
+            self.set_rotation_angle(angle)
             self.rotate_pixmap(self.rotation_angle)
+            self.record_state()
             self.status_label.setText("")
         except Exception as e:
             QMessageBox.critical(self, "旋转失败", f"旋转图片时出错: {str(e)}")
 
+    def flip(self, axis):
+        """翻转旋转前的图像，然后重新应用当前旋转角度"""
+        self.ops = image_edits.append_op(self.ops, image_edits.EditOp('flip', axis))
+        self.rotate_pixmap(self.rotation_angle)
+        self.record_state()
+        self.status_label.setText("")
+
     def flip_horizontal(self):
         """水平翻转"""
         try:
-            self.history_stack.append(self.base_pixmap.copy())
-            self.base_pixmap = self.base_pixmap.transformed(QTransform().scale(-1, 1), Qt.SmoothTransformation)
-            self.rotate_pixmap(self.rotation_angle)  # 重新应用当前旋转角度
-            self.status_label.setText("")
+            self.flip('h')
         except Exception as e:
             QMessageBox.critical(self, "翻转失败", f"翻转图片时出错: {str(e)}")
 
     def flip_vertical(self):
         """垂直翻转"""
         try:
-            self.history_stack.append(self.base_pixmap.copy())
-            self.base_pixmap = self.base_pixmap.transformed(QTransform().scale(1, -1), Qt.SmoothTransformation)
-            self.rotate_pixmap(self.rotation_angle)  # 重新应用当前旋转角度
-            self.status_label.setText("")
+            self.flip('v')
         except Exception as e:
             QMessageBox.critical(self, "翻转失败", f"翻转图片时出错: {str(e)}")
 
     def manual_rotate_start(self):
-        """手动旋转开始，保存当前状态"""
-        self.manual_rotate_previous_pixmap = self.base_pixmap.copy()
+        """手动旋转开始"""
+        self.rotation_commit_timer.stop()
 
     def manual_rotate_end(self):
-        """手动旋转结束，保存状态到历史堆栈"""
-        if self.manual_rotate_previous_pixmap:
-            self.history_stack.append(self.manual_rotate_previous_pixmap)
-            self.manual_rotate_previous_pixmap = None
+        """手动旋转结束，记入撤销历史"""
+        self.commit_rotation()
 
     def manual_rotate(self, angle):
         """手动自由旋转"""
@@ -656,6 +1033,10 @@ class ImageEditorDialog(QDialog):
             self.rotation_angle = angle
             self.rotation_label.setText(f"旋转角度: {angle}°")
             self.rotate_pixmap(angle)
+            self.rotation_pending = True
+            if not self.rotation_slider.isSliderDown():
+                # 键盘或点击滑槽调整时没有 sliderReleased，停止调整一段时间后再记入历史
+                self.rotation_commit_timer.start()
             self.status_label.setText("")
         except Exception as e:
             QMessageBox.critical(self, "旋转失败", f"手动旋转时出错: {str(e)}")
@@ -703,14 +1084,14 @@ class ImageEditorDialog(QDialog):
             if self.crop_rect.isNull() or self.crop_rect.width() < 10 or self.crop_rect.height() < 10:
                 QMessageBox.warning(self, "裁剪区域过小", "请选择一个较大的裁剪区域。")
                 return
-            # 保存当前状态到历史堆栈
-            self.history_stack.append(self.base_pixmap.copy())
+            self.commit_rotation()
 
-            # 计算裁剪区域对应的图像坐标
+            # 计算裁剪区域对应的全分辨率图像坐标（显示的是旋转后的图像）
+            ops = self.current_ops(self.rotation_angle)
+            width, height = image_edits.output_size(ops, self.original_pixmap.width(), self.original_pixmap.height())
             label_size = self.image_label.size()
-            pixmap_size = self.base_pixmap.size()
-            scale_x = self.base_pixmap.width() / label_size.width()
-            scale_y = self.base_pixmap.height() / label_size.height()
+            scale_x = width / label_size.width()
+            scale_y = height / label_size.height()
             x = int(self.crop_rect.x() * scale_x)
             y = int(self.crop_rect.y() * scale_y)
             w = int(self.crop_rect.width() * scale_x)
@@ -718,17 +1099,14 @@ class ImageEditorDialog(QDialog):
             # 确保裁剪区域在图像范围内
             x = max(0, x)
             y = max(0, y)
-            w = min(w, self.base_pixmap.width() - x)
-            h = min(h, self.base_pixmap.height() - y)
-            cropped = self.base_pixmap.copy(x, y, w, h)
-            self.base_pixmap = cropped
-            self.rotate_pixmap(self.rotation_angle)  # 重新应用当前旋转角度
+            w = min(w, width - x)
+            h = min(h, height - y)
+            # 当前旋转角度成为已确定的操作，裁剪在旋转后的图像上进行
+            self.ops = image_edits.append_op(ops, image_edits.EditOp('crop', (x, y, w, h)))
             # 重置旋转滑动条
-            self.rotation_slider.blockSignals(True)
-            self.rotation_slider.setValue(0)
-            self.rotation_slider.blockSignals(False)
-            self.rotation_label.setText("旋转角度: 0°")
-            self.rotation_angle = 0
+            self.set_rotation_angle(0)
+            self.rotate_pixmap(0)
+            self.record_state()
 
             # 退出裁剪模式
             self.cropping = False
@@ -741,21 +1119,36 @@ class ImageEditorDialog(QDialog):
         except Exception as e:
             QMessageBox.critical(self, "裁剪失败", f"裁剪图片时出错: {str(e)}")
 
+    def restore_state(self, state):
+        self.ops = state.ops
+        self.set_rotation_angle(state.angle)
+        self.rotate_pixmap(state.angle)
+
     def undo_operation(self):
         """撤销上一步的操作"""
-        if self.history_stack:
-            last_pixmap = self.history_stack.pop()
-            self.base_pixmap = last_pixmap.copy()
-            self.rotate_pixmap(self.rotation_angle)  # 重新应用当前旋转角度
+        self.commit_rotation()
+        if self.history.can_undo():
+            self.restore_state(self.history.undo())
             self.status_label.setText("已撤销上一步的操作。")
         else:
             QMessageBox.information(self, "撤销", "没有可以撤销的操作。")
 
+    def redo_operation(self):
+        """重做被撤销的操作"""
+        if self.history.can_redo():
+            self.restore_state(self.history.redo())
+            self.status_label.setText("已重做。")
+        else:
+            QMessageBox.information(self, "重做", "没有可以重做的操作。")
+
     def save_edits(self):
-        if self.current_pixmap.isNull():
+        # 只在保存时从原图做一次全分辨率渲染
+        result = image_edits.render(self.original_pixmap, self.current_ops(self.rotation_angle),
+                                    self.background_color)
+        if result.isNull():
             QMessageBox.warning(self, "保存失败", "当前图片为空，无法保存。")
             return
-        self.edited_pixmap.emit(self.current_pixmap)
+        self.edited_pixmap.emit(result)
         self.accept()
 
 
@@ -782,11 +1175,27 @@ class ImageAnnotator(QMainWindow):
         self.image_view.setSizePolicy(
             QSizePolicy.Expanding, QSizePolicy.Expanding)
 
-        self.thumbnail_list = QListWidget()
+        # 缩略图磁盘缓存，缓存目录不可用时退回到每次重新生成
+        try:
+            self.thumbnail_cache = thumbnail_cache.ThumbnailCache()
+        except (OSError, sqlite3.Error):
+            self.thumbnail_cache = None
+        self.thumbnail_engine = ThumbnailEngine(100, self.thumbnail_cache, self)
+        self.thumbnail_model = ThumbnailListModel(self.thumbnail_engine, parent=self)
+
+        # 标注后的图片在后台渲染和编码
+        self.export_service = ExportService(self)
+        self.export_service.export_finished.connect(self.on_export_finished)
+        self.export_service.export_failed.connect(self.on_export_failed)
+
+        self.thumbnail_list = QListView()
+        self.thumbnail_list.setModel(self.thumbnail_model)
         self.thumbnail_list.setIconSize(QSize(100, 100))
         self.thumbnail_list.setFixedWidth(200)
         self.thumbnail_list.setViewMode(QListView.IconMode)
-        self.thumbnail_list.setResizeMode(QListWidget.Adjust)
+        self.thumbnail_list.setResizeMode(QListView.Adjust)
+        self.thumbnail_list.setUniformItemSizes(True)
+        self.thumbnail_list.setLayoutMode(QListView.Batched)
         self.splitter.addWidget(self.thumbnail_list)
         self.thumbnail_list.setSizePolicy(
             QSizePolicy.Fixed, QSizePolicy.Expanding)
@@ -801,6 +1210,15 @@ class ImageAnnotator(QMainWindow):
         self.image_paths = []
         self.current_image_path = ""
         self.current_pixmap = QPixmap()
+        self.current_pixmap_edited = False  # 当前图片是否经过旋转剪辑（尚未写回文件）
+        self.batch_thread = None
+        self.batch_worker = None
+        self.batch_errors = []
+        self.batch_message = ""
+        self.thumbnail_list.verticalScrollBar().valueChanged.connect(
+            self.prefetch_thumbnails)
+        self.thumbnail_list.verticalScrollBar().rangeChanged.connect(
+            self.prefetch_thumbnails)
 
         self.status_bar = QStatusBar()
         self.setStatusBar(self.status_bar)
@@ -924,6 +1342,24 @@ class ImageAnnotator(QMainWindow):
         self.save_button.setShortcut("Ctrl+P")
         grid.addWidget(self.save_button, 9, 0, 1, 3)
 
+        # 保存时的大小限制策略
+        self.save_policy_combo = QComboBox()
+        for key, label in size_cap.POLICY_LABELS.items():
+            self.save_policy_combo.addItem(label, key)
+        self.save_policy_combo.setToolTip("保存图片超过800KB时的处理方式")
+        grid.addWidget(QLabel("保存策略:"), 10, 0)
+        grid.addWidget(self.save_policy_combo, 10, 1, 1, 2)
+
+        # 保存标注文件，供命令行批量渲染
+        self.save_layout_button = QPushButton("保存标注文件")
+        self.save_layout_button.setToolTip("把标注保存为 JSON 文件，不修改原始图片")
+        grid.addWidget(self.save_layout_button, 11, 0, 1, 3)
+
+        # 把当前标注套用到文件夹中的全部图片（同一版式的商品图）
+        self.batch_render_button = QPushButton("套用到全部图片")
+        self.batch_render_button.setToolTip("按当前标注的位置渲染已打开的全部图片，保存到另一个文件夹")
+        grid.addWidget(self.batch_render_button, 12, 0, 1, 3)
+
         # 标注列表组
         self.annotations_group = QGroupBox("标注列表")
         annotations_layout = QVBoxLayout()
@@ -934,7 +1370,7 @@ class ImageAnnotator(QMainWindow):
         annotations_layout.addWidget(self.change_annotation_color_button)
         annotations_layout.addWidget(self.delete_annotation_button)
         self.annotations_group.setLayout(annotations_layout)
-        grid.addWidget(self.annotations_group, 10, 0, 1, 3)
+        grid.addWidget(self.annotations_group, 13, 0, 1, 3)
 
         self.control_layout.addLayout(grid)
         self.control_layout.addStretch()
@@ -943,9 +1379,11 @@ class ImageAnnotator(QMainWindow):
         self.open_button.clicked.connect(self.open_file_or_folder)
         self.undo_button.clicked.connect(self.undo_annotation)
         self.save_button.clicked.connect(self.save_image)
+        self.save_layout_button.clicked.connect(self.save_layout)
+        self.batch_render_button.clicked.connect(self.batch_render)
         self.color_button.clicked.connect(self.choose_current_annotation_color)
         self.size_confirm_button.clicked.connect(self.set_text_size)
-        self.thumbnail_list.itemClicked.connect(self.load_selected_image)
+        self.thumbnail_list.clicked.connect(self.load_selected_image)
         self.add_id_button.clicked.connect(self.add_id)
         self.id_size_confirm_button.clicked.connect(self.set_id_text_size)
         self.id_color_button.clicked.connect(self.choose_id_color)
@@ -994,7 +1432,7 @@ class ImageAnnotator(QMainWindow):
             QLabel {
                 font-size: 14px;
             }
-            QListWidget {
+            QListWidget, QListView {
                 background-color: white;
                 border: 1px solid #ccc;
             }
@@ -1064,48 +1502,65 @@ class ImageAnnotator(QMainWindow):
             pass
 
     def load_images_from_folder(self, folder):
-        self.image_paths = []
-        self.thumbnail_list.clear()
-
         image_extensions = ['.png', '.jpg', '.jpeg', '.bmp', '.gif']
         file_paths = []
         for filename in os.listdir(folder):
             if any(filename.lower().endswith(ext) for ext in image_extensions):
                 file_paths.append(os.path.join(folder, filename))
 
-        self.loader = ThumbnailLoader(file_paths, 100)
-        self.thread = QThread()
-        self.loader.moveToThread(self.thread)
-        self.thread.started.connect(self.loader.run)
-        self.loader.finished.connect(self.thread.quit)
-        self.loader.finished.connect(self.loader.deleteLater)
-        self.thread.finished.connect(self.thread.deleteLater)
-        self.loader.thumbnail_loaded.connect(self.add_thumbnail_to_list)
-        self.thread.start()
-
-    @pyqtSlot(str, QIcon)
-    def add_thumbnail_to_list(self, file_path, icon):
-        item = QListWidgetItem(icon, os.path.basename(file_path))
-        item.setData(Qt.UserRole, file_path)
-        self.thumbnail_list.addItem(item)
+        self.populate_thumbnail_list(file_paths)
 
     def populate_thumbnail_list(self, image_paths):
-        self.thumbnail_list.clear()
-        self.image_paths = []
-        self.loader = ThumbnailLoader(image_paths, 100)
-        self.thread = QThread()
-        self.loader.moveToThread(self.thread)
-        self.thread.started.connect(self.loader.run)
-        self.loader.finished.connect(self.thread.quit)
-        self.loader.finished.connect(self.loader.deleteLater)
-        self.thread.finished.connect(self.thread.deleteLater)
-        self.loader.thumbnail_loaded.connect(self.add_thumbnail_to_list)
-        self.thread.start()
+        """重置缩略图模型，缩略图在滚动到可见时才加载"""
+        self.image_paths = list(image_paths)
+        self.thumbnail_model.set_file_paths(self.image_paths)
+        # 等列表完成布局后再预取可见范围之后的缩略图
+        QTimer.singleShot(0, self.prefetch_thumbnails)
+
+    def visible_thumbnail_rows(self):
+        """返回缩略图列表中当前可见的行号（列表项按行号自上而下排列）"""
+        count = self.thumbnail_model.rowCount()
+        viewport_height = self.thumbnail_list.viewport().height()
+        lo, hi = 0, count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self.thumbnail_list.visualRect(self.thumbnail_model.index(mid)).bottom() < 0:
+                lo = mid + 1
+            else:
+                hi = mid
+        rows = []
+        row = lo
+        while row < count and \
+                self.thumbnail_list.visualRect(self.thumbnail_model.index(row)).top() <= viewport_height:
+            rows.append(row)
+            row += 1
+        return rows
+
+    def prefetch_thumbnails(self, *args, prefetch_rows=30):
+        """可见项由模型按需加载，这里以普通优先级预取可见范围前后的若干行"""
+        rows = self.visible_thumbnail_rows()
+        if not rows:
+            rows = [0]
+        first, last = rows[0], rows[-1]
+        self.thumbnail_model.prefetch(
+            list(range(last + 1, last + 1 + prefetch_rows)) +
+            list(range(max(0, first - prefetch_rows // 3), first)))
+
+    def closeEvent(self, event):
+        self.thumbnail_engine.shutdown()
+        self.image_view.tile_loader.shutdown()
+        self.export_service.wait_for_done()
+        if self.batch_thread:
+            self.batch_worker.cancel()
+            self.batch_thread.quit()
+            self.batch_thread.wait()
+        super().closeEvent(event)
 
     def load_image(self, image_path):
         try:
             self.current_image_path = image_path
             self.current_pixmap = QPixmap(image_path)
+            self.current_pixmap_edited = False
             if self.current_pixmap.isNull():
                 QMessageBox.critical(self, "加载图片失败", f"无法加载图片: {image_path}")
                 return
@@ -1116,8 +1571,8 @@ class ImageAnnotator(QMainWindow):
         except Exception as e:
             QMessageBox.critical(self, "错误", f"加载图片时出错：{str(e)}")
 
-    def load_selected_image(self, item):
-        image_path = item.data(Qt.UserRole)
+    def load_selected_image(self, index):
+        image_path = index.data(Qt.UserRole)
         if image_path:
             self.load_image(image_path)
 
@@ -1132,18 +1587,104 @@ class ImageAnnotator(QMainWindow):
                 self.image_view.set_fixed_y_mode(False)
                 self.status_bar.showMessage("固定水平绘制模式已关闭", 3000)
                 self.mode_label.setText("当前模式：普通标注")
-            success = self.image_view.save_image(self.current_image_path)
-            if success:
-                QMessageBox.information(
-                    self, "保存成功",
-                    f"图片已保存并覆盖原始图片: {self.current_image_path}")
-            else:
+            policy = size_cap.POLICIES[self.save_policy_combo.currentData()]
+            snapshot = self.image_view.export_snapshot(self.current_image_path)
+            if snapshot is None:
                 QMessageBox.warning(
                     self, "保存失败",
                     f"无法保存图片至 {self.current_image_path}")
+                return
+            layout, source = snapshot
+            # 渲染和编码在后台进行，可以立即切换到下一张图片
+            self.export_service.submit(layout, source, self.current_image_path, policy)
+            self.status_bar.showMessage(
+                f"正在后台保存: {os.path.basename(self.current_image_path)}"
+                f"（队列中 {self.export_service.pending} 个）", 3000)
         else:
             QMessageBox.warning(self, "保存失败", "没有加载任何图片。")
 
+    def on_export_finished(self, job_id, save_path, result):
+        self.status_bar.showMessage(
+            f"图片已保存并覆盖原始图片: {os.path.basename(save_path)}，"
+            f"尺寸: {result.size[0]}x{result.size[1]}，质量: {result.quality}，"
+            f"编码次数: {result.attempts}", 5000)
+
+    def on_export_failed(self, job_id, save_path, error):
+        QMessageBox.critical(self, "保存失败", f"保存图片 {save_path} 时出错: {error}")
+
+    def save_layout(self):
+        """把当前标注保存为图片旁的 .annotations.json，原始图片不变。"""
+        if not self.current_image_path:
+            QMessageBox.warning(self, "保存失败", "没有加载任何图片。")
+            return
+        image_path = self.current_image_path
+        try:
+            if self.current_pixmap_edited:
+                # 旋转剪辑后的图片与原文件不同，另存一份 PNG 作为标注的底图
+                image_path = os.path.splitext(self.current_image_path)[0] + ".edited.png"
+                if not self.current_pixmap.save(image_path, "PNG"):
+                    raise IOError(f"无法保存编辑后的图片: {image_path}")
+            path = annotation_layout.layout_path(self.current_image_path)
+            annotation_layout.save(path, self.image_view.layout_snapshot(image_path))
+            self.status_bar.showMessage(f"标注文件已保存: {path}", 5000)
+        except Exception as e:
+            QMessageBox.critical(self, "保存失败", f"保存标注文件时出错: {str(e)}")
+
+    def batch_render(self):
+        """把当前图片的标注布局套用到已打开的全部图片，在后台并行渲染"""
+        if not self.current_image_path or not self.image_paths:
+            QMessageBox.warning(self, "批量渲染", "没有加载任何图片。")
+            return
+        if self.batch_thread:
+            QMessageBox.information(self, "批量渲染", "上一次批量渲染尚未完成。")
+            return
+        output_dir = QFileDialog.getExistingDirectory(self, "选择保存渲染结果的文件夹")
+        if not output_dir:
+            return
+        source_dirs = {os.path.normcase(os.path.dirname(os.path.abspath(p))) for p in self.image_paths}
+        if os.path.normcase(os.path.abspath(output_dir)) in source_dirs:
+            QMessageBox.warning(self, "批量渲染", "请选择与原图不同的文件夹，以免覆盖原图。")
+            return
+        if self.image_view.fixed_y_mode:
+            # 与保存图片相同：不渲染未固定的悬浮标注
+            self.image_view.set_fixed_y_mode(False)
+            self.mode_label.setText("当前模式：普通标注")
+        layout = self.image_view.layout_snapshot(self.current_image_path)
+        policy = size_cap.POLICIES[self.save_policy_combo.currentData()]
+
+        self.batch_thread = QThread()
+        self.batch_worker = BatchRenderWorker(layout, list(self.image_paths), output_dir, policy,
+                                              image_pipeline.default_workers())
+        self.batch_worker.moveToThread(self.batch_thread)
+        self.batch_thread.started.connect(self.batch_worker.run)
+        self.batch_worker.progress.connect(
+            lambda value: self.status_bar.showMessage(f"批量渲染中... {value}%"))
+        self.batch_errors = []
+        self.batch_message = ""
+        self.batch_worker.error.connect(self.batch_errors.append)
+        self.batch_worker.finished.connect(self.set_batch_message)
+        self.batch_worker.finished.connect(self.batch_thread.quit)
+        # 线程真正结束后再清理，不在界面线程中等待线程
+        self.batch_thread.finished.connect(self.on_batch_render_finished)
+        self.batch_render_button.setEnabled(False)
+        self.batch_thread.start()
+
+    def set_batch_message(self, message):
+        self.batch_message = message
+
+    def on_batch_render_finished(self):
+        message = self.batch_message
+        self.batch_worker.deleteLater()
+        self.batch_thread.deleteLater()
+        self.batch_thread = None
+        self.batch_worker = None
+        self.batch_render_button.setEnabled(True)
+        self.status_bar.showMessage(message, 10000)
+        if self.batch_errors:
+            shown = "\n".join(self.batch_errors[:10])
+            more = f"\n……共 {len(self.batch_errors)} 个错误" if len(self.batch_errors) > 10 else ""
+            QMessageBox.warning(self, "批量渲染", f"{message}\n\n{shown}{more}")
+
     def choose_current_annotation_color(self):
         color = QColorDialog.getColor()
         if color.isValid():
@@ -1339,6 +1880,7 @@ class ImageAnnotator(QMainWindow):
             try:
                 # 更新当前_pixmap为编辑后的副本
                 self.current_pixmap = edited_pixmap
+                self.current_pixmap_edited = True
                 # 重新加载图片到视图
                 self.image_view.load_pixmap(self.current_pixmap)
                 self.status_bar.showMessage("图片已编辑。请在主界面点击“保存图片”以覆盖原文件。", 5000)
@@ -1349,6 +1891,7 @@ class ImageAnnotator(QMainWindow):
 
 
 if __name__ == "__main__":
+    multiprocessing.freeze_support()
     app = QApplication(sys.argv)
     main_window = ImageAnnotator()
     main_window.show()
@@ -1,52 +1,133 @@
 # -*- coding: utf-8 -*-
 import sys
+import time
 import traceback
+import multiprocessing
 import tempfile  # 确保导入
 from PyQt5.QtWidgets import (
     QApplication, QMainWindow, QPushButton, QVBoxLayout, QWidget, QFileDialog, QMessageBox,
-    QLabel, QProgressBar, QLineEdit, QHBoxLayout, QRadioButton, QButtonGroup
+    QLabel, QProgressBar, QLineEdit, QHBoxLayout, QRadioButton, QButtonGroup, QCheckBox,
+    QSpinBox, QComboBox, QTableWidget, QTableWidgetItem, QHeaderView, QGroupBox, QAbstractItemView
 )
-from PyQt5.QtCore import pyqtSignal, QObject, QThread
-from PIL import Image
+from PyQt5.QtCore import pyqtSignal, QObject, QThread, Qt
 import os
-import zipfile
 import py7zr  # For .7z files
 import rarfile  # For .rar files
-import tarfile  # For .tgz files
 import shutil  # To remove temp folder
 from pathlib import Path
+import archive_stream
+import image_pipeline
+import job_queue
+import size_cap
+import stage_trace
 
 # 设置 unrar 工具路径，使用原始字符串并确保路径正确
 rarfile.UNRAR_TOOL = r"D:\WinRar\UnRAR.exe"  # 请根据您的实际路径修改
 
 
+class JobCancelled(Exception):
+    """用户取消了任务，在处理完当前图片后抛出。"""
+
+
 class Worker(QObject):
     # 定义信号
     progress_update = pyqtSignal(int)
     status_update = pyqtSignal(str)
     error_signal = pyqtSignal(str)
     completion_signal = pyqtSignal(str)
-
-    def __init__(self, mode, selected_path, prefix, digits):
+    image_encoded = pyqtSignal(str, int, int)  # 输出文件名, JPEG 质量, 编码次数
+    stage_event = pyqtSignal(dict)  # 单张图片一个阶段的耗时，格式见 stage_trace
+    cancelled_signal = pyqtSignal(str)
+    eta_update = pyqtSignal(int)  # 按已处理的字节数估计的剩余秒数
+    finished_signal = pyqtSignal()  # run() 结束时总会发出，无论成功、失败还是取消
+
+    def __init__(self, mode, selected_path, prefix, digits, streaming=True, workers=1, chunk_size=1,
+                 policy=size_cap.DEFAULT_POLICY, trace_path=None, extract_threads=None):
         super().__init__()
         self.mode = mode  # 'decompress' or 'rename'
         self.selected_path = selected_path
         self.prefix = prefix
         self.digits = digits
+        self.streaming = streaming  # 直接从压缩包读取图片，不解压到临时目录
+        self.workers = workers  # 重编码进程数，1 表示在当前线程串行处理
+        self.chunk_size = chunk_size  # 每次分发给进程池的图片数
+        self.policy = policy  # 800KB 大小限制策略（先降分辨率还是先降质量）
+        self.trace_path = trace_path  # 不为 None 时把阶段耗时追加写入该 JSONL 文件
+        # zip 并行解压 / tar.gz 后台解压的线程数，1 表示在当前线程顺序解压
+        self.extract_threads = extract_threads or archive_stream.default_threads()
+        self.job_name = Path(selected_path).name
+        self.trace_writer = None
+        self.cancel_requested = False
+
+    def cancel(self):
+        """请求停止任务；可以从其他线程调用，已写出的图片保留。"""
+        self.cancel_requested = True
+
+    def check_cancelled(self):
+        if self.cancel_requested:
+            raise JobCancelled()
 
     def run(self):
         try:
+            if self.trace_path:
+                self.trace_writer = stage_trace.TraceWriter(self.trace_path)
             if self.mode == 'decompress':
                 self.decompress_and_rename()
             elif self.mode == 'rename':
                 self.rename_in_folder()
             else:
                 self.error_signal.emit("未知的操作模式。")
+        except JobCancelled:
+            self.cancelled_signal.emit("任务已取消，已处理的图片已保留。")
         except Exception as e:
             self.error_signal.emit(f"处理过程中出现意外错误：{str(e)}\n{traceback.format_exc()}")
+        finally:
+            if self.trace_writer is not None:
+                self.trace_writer.close()
+                self.trace_writer = None
+            self.finished_signal.emit()
+
+    def trace_stage(self, item, stage, seconds, nbytes=None, **extra):
+        event = stage_trace.make_event(self.job_name, item, stage, seconds, nbytes, **extra)
+        if self.trace_writer is not None:
+            self.trace_writer.write(event)
+        self.stage_event.emit(event)
+
+    def timed_members(self, members):
+        """逐个产出压缩包成员，同时记录读取（解压）每个成员的耗时。"""
+        start = time.perf_counter()
+        for name, data in members:
+            self.trace_stage(Path(name).name, 'extract', time.perf_counter() - start,
+                             len(data) if data is not None else None)
+            yield name, data
+            start = time.perf_counter()
+
+    def prescan(self):
+        """读取压缩包目录建立图片索引，有问题时立即报告并返回 None。"""
+        self.status_update.emit("正在读取压缩包目录...")
+        try:
+            index = archive_stream.scan(self.selected_path)
+        except ValueError as e:
+            self.error_signal.emit(str(e))
+            return None
+        if index.problems:
+            self.error_signal.emit("压缩包有问题，未开始解压：\n" + "\n".join(index.problems[:20]))
+            return None
+        if not index.members:
+            self.error_signal.emit("压缩包内未找到任何图片文件。")
+            return None
+        estimate = archive_stream.estimate_output_size(index, self.policy.max_size_kb * 1024)
+        self.status_update.emit(f"共 {len(index.members)} 张图片，解压后约 {index.total_size / 1048576:.1f} MB，"
+                                f"预计输出不超过 {estimate / 1048576:.1f} MB")
+        return index
 
     def decompress_and_rename(self):
         try:
+            # 先检查压缩包，损坏或没有图片时不创建输出文件夹
+            index = self.prescan()
+            if index is None:
+                return
+
             base_name = Path(self.selected_path).stem
             final_dir_base = Path(self.selected_path).parent / f"{base_name}-解压修改"
             final_dir = final_dir_base
@@ -56,12 +137,19 @@ class Worker(QObject):
                 counter += 1
             final_dir.mkdir(parents=True, exist_ok=True)
 
+            if self.streaming:
+                if self.stream_decompress_and_rename(final_dir, index):
+                    self.progress_update.emit(100)
+                    self.completion_signal.emit(f"文件已成功解压并改名至文件夹: {final_dir}")
+                return
+
             self.status_update.emit("开始解压文件...")
             image_paths = []
 
             # 使用默认临时目录
             with tempfile.TemporaryDirectory() as temp_dir:
                 temp_path = Path(temp_dir)
+                extract_start = time.perf_counter()
 
                 if self.selected_path.lower().endswith('.zip'):
                     self.extract_zip(temp_path, image_paths)
@@ -74,45 +162,26 @@ class Worker(QObject):
                 else:
                     self.error_signal.emit("不支持的文件格式！")
                     return
+                # 整个压缩包一次解压，记为一个事件
+                self.trace_stage(Path(self.selected_path).name, 'extract', time.perf_counter() - extract_start,
+                                 sum(path.stat().st_size for path in image_paths))
+                self.check_cancelled()
 
                 if not image_paths:
                     self.error_signal.emit("解压后未找到任何图片文件。")
                     return
 
-                total = len(image_paths)
-                if total == 0:
-                    self.error_signal.emit("没有需要处理的图片文件。")
-                    return
-
-                self.progress_update.emit(0)
                 self.status_update.emit("开始重命名图片...")
-
-                for index, image_path in enumerate(image_paths):
-                    new_name = f"{self.prefix}{str(index + 1).zfill(self.digits)}.jpg"
-                    new_path = final_dir / new_name
-
-                    try:
-                        # 打开图片
-                        with Image.open(image_path) as image:
-                            # 如果图片格式不是 JPEG，则转换为 JPEG
-                            if image.format.lower() != 'jpeg':
-                                image = image.convert('RGB')
-                            # 保存为 JPEG，使用较高质量参数以尽量减少损失
-                            image.save(new_path, format='JPEG', quality=95)
-
-                        # 调整图片大小（只在必要时），确保不超过800KB
-                        self.adjust_image_size(new_path)
-
-                        self.status_update.emit(f"处理文件: {new_name}")
-                        percentage = int((index + 1) / total * 100)
-                        self.progress_update.emit(percentage)
-                    except Exception as e:
-                        self.error_signal.emit(f"处理文件 {image_path.name} 时出错：{str(e)}\n{traceback.format_exc()}")
-                        continue  # 继续处理下一个文件
+                jobs = ((image_path.name, str(image_path),
+                         final_dir / f"{self.prefix}{str(index + 1).zfill(self.digits)}.jpg")
+                        for index, image_path in enumerate(image_paths))
+                self.reencode_images(jobs, [path.stat().st_size for path in image_paths])
 
             # 确保进度条达到100%后再发出完成信号
             self.progress_update.emit(100)
             self.completion_signal.emit(f"文件已成功解压并改名至文件夹: {final_dir}")
+        except JobCancelled:
+            raise
         except Exception as e:
             self.error_signal.emit(f"解压和重命名过程中出现意外错误：{str(e)}\n{traceback.format_exc()}")
 
@@ -134,58 +203,71 @@ class Worker(QObject):
                 counter += 1
             final_dir.mkdir(parents=True, exist_ok=True)
 
-            total = len(image_paths)
-            if total == 0:
-                self.error_signal.emit("没有需要处理的图片文件。")
-                return
-
-            self.progress_update.emit(0)
             self.status_update.emit("开始重命名图片...")
-
-            for index, image_path in enumerate(image_paths):
-                sanitized_name = self.sanitize_filename(f"{self.prefix}{str(index + 1).zfill(self.digits)}.jpg")
-                new_path = final_dir / sanitized_name
-
-                try:
-                    # 打开图片
-                    with Image.open(image_path) as image:
-                        # 如果图片格式不是 JPEG，则转换为 JPEG
-                        if image.format.lower() != 'jpeg':
-                            image = image.convert('RGB')
-                        # 保存为 JPEG，使用较高质量参数以尽量减少损失
-                        image.save(new_path, format='JPEG', quality=95)
-
-                    # 调整图片大小（只在必要时），确保不超过800KB
-                    self.adjust_image_size(new_path)
-
-                    self.status_update.emit(f"处理文件: {sanitized_name}")
-                    percentage = int((index + 1) / total * 100)
-                    self.progress_update.emit(percentage)
-                except Exception as e:
-                    self.error_signal.emit(f"处理文件 {image_path.name} 时出错：{str(e)}\n{traceback.format_exc()}")
-                    continue  # 继续处理下一个文件
+            jobs = ((image_path.name, str(image_path),
+                     final_dir / self.sanitize_filename(f"{self.prefix}{str(index + 1).zfill(self.digits)}.jpg"))
+                    for index, image_path in enumerate(image_paths))
+            self.reencode_images(jobs, [path.stat().st_size for path in image_paths])
 
             # 确保进度条达到100%后再发出完成信号
             self.progress_update.emit(100)
             self.completion_signal.emit(f"文件夹内图片已成功改名，并保存于: {final_dir}")
+        except JobCancelled:
+            raise
         except Exception as e:
             self.error_signal.emit(f"改名过程中出现意外错误：{str(e)}\n{traceback.format_exc()}")
 
-    def adjust_image_size(self, image_path):
-        """只在图片大小超过800KB时调整图片质量，以便减小文件大小。"""
+    def stream_decompress_and_rename(self, final_dir, index):
+        """逐个读取压缩包中的图片成员并直接写出最终 JPEG，非图片成员不会被解压。
+
+        index 是 prescan() 得到的成员索引，成员顺序与 iter_images 相同，按其大小计算进度。
+        """
+        self.status_update.emit("开始解压并重命名图片...")
+        jobs = ((Path(name).name, data,
+                 final_dir / f"{self.prefix}{str(index + 1).zfill(self.digits)}.jpg")
+                for index, (name, data) in enumerate(self.timed_members(
+                    archive_stream.iter_images(self.selected_path, self.extract_threads))))
         try:
-            max_size_kb = 800
-            image_size_kb = os.path.getsize(image_path) / 1024  # Get size in KB
-
-            if image_size_kb > max_size_kb:
-                quality = 90  # 开始的压缩质量参数，尽量保持高质量
-                with Image.open(image_path) as img:
-                    while image_size_kb > max_size_kb and quality > 10:
-                        quality -= 5
-                        img.save(image_path, format='JPEG', quality=quality)
-                        image_size_kb = os.path.getsize(image_path) / 1024
+            self.reencode_images(jobs, [member.size for member in index.members])
+        except JobCancelled:
+            raise
         except Exception as e:
-            self.error_signal.emit(f"调整图片大小时出现错误：{str(e)}\n{traceback.format_exc()}")
+            self.error_signal.emit(f"读取压缩包时出现错误: {str(e)}\n{traceback.format_exc()}")
+            return False
+        return True
+
+    def reencode_images(self, jobs, sizes):
+        """重编码 (原文件名, 来源, 目标路径) 任务，按顺序汇报进度。
+
+        每张图片按 self.policy 转为 JPEG 并压缩到800KB以内；workers > 1 时分发到进程池处理。
+        sizes 是每个任务的源文件字节数，进度和剩余时间按已处理的字节数计算，
+        大图和小图混在一起时比按张数更准确。
+        请求取消时在当前图片之后抛出 JobCancelled，并等待进程池中已提交的批次结束。
+        """
+        self.progress_update.emit(0)
+        total_bytes = sum(sizes) or len(sizes) or 1
+        done_bytes = 0
+        start = time.perf_counter()
+        results = image_pipeline.reencode_ordered(jobs, self.workers, self.chunk_size, self.policy)
+        try:
+            for index, (name, new_path, error, encode_stats, stages) in enumerate(results):
+                for stage, seconds, nbytes, extra in stages:
+                    self.trace_stage(name, stage, seconds, nbytes, **extra)
+                self.check_cancelled()
+                # 出错的图片也计入进度
+                done_bytes += (sizes[index] if index < len(sizes) else 0) or 1
+                fraction = min(1.0, done_bytes / total_bytes)
+                self.eta_update.emit(int(round((time.perf_counter() - start) * (1 - fraction) / fraction)))
+                self.progress_update.emit(int(fraction * 100))
+                if error:
+                    self.error_signal.emit(f"处理文件 {name} 时出错：{error}")
+                    continue  # 继续处理下一个文件
+                new_name = Path(new_path).name
+                quality, attempts = encode_stats
+                self.image_encoded.emit(new_name, quality, attempts)
+                self.status_update.emit(f"处理文件: {new_name}（质量 {quality}，编码 {attempts} 次）")
+        finally:
+            results.close()
 
     def sanitize_filename(self, filename):
         """移除或替换文件名中的无效字符。"""
@@ -196,13 +278,9 @@ class Worker(QObject):
 
     def extract_zip(self, extract_dir, image_paths):
         try:
-            with zipfile.ZipFile(self.selected_path, 'r') as zip_ref:
-                zip_ref.extractall(extract_dir)
-                for name in zip_ref.namelist():
-                    if name.lower().endswith(('.png', '.jpg', '.jpeg', '.bmp', '.gif')):
-                        image_path = extract_dir / name
-                        if image_path.is_file():
-                            image_paths.append(image_path)
+            # 只解压图片成员，多个线程各自打开压缩包并行解压
+            image_paths.extend(Path(path) for path in archive_stream.extract_images(
+                self.selected_path, extract_dir, self.extract_threads))
         except Exception as e:
             self.error_signal.emit(f"解压 .zip 文件时出现错误: {str(e)}\n{traceback.format_exc()}")
 
@@ -232,13 +310,9 @@ class Worker(QObject):
 
     def extract_tgz(self, extract_dir, image_paths):
         try:
-            with tarfile.open(self.selected_path, 'r:gz') as tar_ref:
-                tar_ref.extractall(extract_dir)
-                for member in tar_ref.getmembers():
-                    if member.name.lower().endswith(('.png', '.jpg', '.jpeg', '.bmp', '.gif')):
-                        image_path = extract_dir / member.name
-                        if image_path.is_file():
-                            image_paths.append(image_path)
+            # 后台线程解压 gzip，本线程同时把已解压的成员写入临时目录
+            image_paths.extend(Path(path) for path in archive_stream.extract_images(
+                self.selected_path, extract_dir, self.extract_threads))
         except Exception as e:
             self.error_signal.emit(f"解压 .tgz 文件时出现错误: {str(e)}\n{traceback.format_exc()}")
 
@@ -271,6 +345,38 @@ class DecompressRenameWindow(QMainWindow):
         self.prefix_input.setPlaceholderText("输入文件前缀，默认：BRSF")
         self.digits_input = QLineEdit()
         self.digits_input.setPlaceholderText("输入序号位数，默认：3")
+        self.streaming_checkbox = QCheckBox("流式解压（不解压整个压缩包到临时目录）")
+        self.streaming_checkbox.setChecked(True)
+        self.workers_spinbox = QSpinBox()
+        self.workers_spinbox.setRange(1, 64)
+        self.workers_spinbox.setValue(image_pipeline.default_workers())
+        self.workers_spinbox.setToolTip("同时重编码图片的进程数，1 表示不使用进程池")
+        self.chunk_size_spinbox = QSpinBox()
+        self.chunk_size_spinbox.setRange(1, 100)
+        self.chunk_size_spinbox.setValue(4)
+        self.chunk_size_spinbox.setToolTip("每次分发给一个进程的图片数")
+
+        self.policy_combo = QComboBox()
+        for key, label in size_cap.POLICY_LABELS.items():
+            self.policy_combo.addItem(label, key)
+        self.policy_combo.setCurrentIndex(self.policy_combo.findData('quality'))
+        self.policy_combo.setToolTip("图片超过800KB时的处理方式")
+
+        self.trace_checkbox = QCheckBox("保存阶段耗时记录（压缩包旁的 .trace.jsonl 文件）")
+        # 任务结束后显示各阶段的耗时汇总
+        self.stage_table = QTableWidget(0, len(stage_trace.SUMMARY_HEADERS))
+        self.stage_table.setHorizontalHeaderLabels(stage_trace.SUMMARY_HEADERS)
+        self.stage_table.horizontalHeader().setSectionResizeMode(QHeaderView.ResizeToContents)
+        self.stage_table.verticalHeader().setVisible(False)
+        self.stage_table.setEditTriggers(QTableWidget.NoEditTriggers)
+        self.stage_table.setVisible(False)
+        self.stage_summary = stage_trace.StageSummary()
+
+        parallel_layout = QHBoxLayout()
+        parallel_layout.addWidget(QLabel("并行进程数:"))
+        parallel_layout.addWidget(self.workers_spinbox)
+        parallel_layout.addWidget(QLabel("每批图片数:"))
+        parallel_layout.addWidget(self.chunk_size_spinbox)
         self.process_button = QPushButton("开始处理")
         self.progress_label = QLabel("")
         self.progress_bar = QProgressBar()
@@ -282,9 +388,16 @@ class DecompressRenameWindow(QMainWindow):
         layout.addWidget(self.select_button)
         layout.addWidget(self.prefix_input)
         layout.addWidget(self.digits_input)
+        layout.addWidget(self.streaming_checkbox)
+        layout.addLayout(parallel_layout)
+        layout.addWidget(QLabel("大小限制策略:"))
+        layout.addWidget(self.policy_combo)
+        layout.addWidget(self.trace_checkbox)
         layout.addWidget(self.process_button)
         layout.addWidget(self.progress_label)
         layout.addWidget(self.progress_bar)
+        layout.addWidget(self.stage_table)
+        layout.addWidget(self.create_queue_group())
 
         central_widget = QWidget()
         central_widget.setLayout(layout)
@@ -292,10 +405,173 @@ class DecompressRenameWindow(QMainWindow):
 
         # 连接信号与槽
         self.select_button.clicked.connect(self.select_file_or_folder)
+        self.decompress_mode_radio.toggled.connect(self.streaming_checkbox.setEnabled)
         self.process_button.clicked.connect(self.start_processing)
 
         self.selected_path = ""
 
+    def create_queue_group(self):
+        """批量队列：多个压缩包各自使用自己的前缀和位数，按顺序并发处理。"""
+        self.queue = job_queue.JobQueue(self.create_queue_worker, parent=self)
+        self.queue.jobs_reordered.connect(self.refresh_queue_table)
+        self.queue.job_changed.connect(self.update_queue_row)
+        self.queue.queue_finished.connect(self.on_queue_finished)
+
+        self.queue_table = QTableWidget(0, 5)
+        self.queue_table.setHorizontalHeaderLabels(["文件", "前缀", "位数", "状态", "进度"])
+        self.queue_table.horizontalHeader().setSectionResizeMode(0, QHeaderView.Stretch)
+        self.queue_table.verticalHeader().setVisible(False)
+        self.queue_table.setSelectionBehavior(QAbstractItemView.SelectRows)
+        self.queue_table.setSelectionMode(QAbstractItemView.SingleSelection)
+        self.queue_table.itemChanged.connect(self.queue_item_edited)
+
+        self.queue_add_button = QPushButton("添加到队列")
+        self.queue_up_button = QPushButton("上移")
+        self.queue_down_button = QPushButton("下移")
+        self.queue_cancel_button = QPushButton("取消所选")
+        self.queue_clear_button = QPushButton("清除已结束")
+        self.queue_start_button = QPushButton("开始队列")
+        self.concurrent_spinbox = QSpinBox()
+        self.concurrent_spinbox.setRange(1, 8)
+        self.concurrent_spinbox.setValue(job_queue.DEFAULT_MAX_RUNNING)
+        self.concurrent_spinbox.setToolTip("同时处理的任务数；并行进程数由这些任务平分")
+
+        self.queue_add_button.clicked.connect(self.add_to_queue)
+        self.queue_up_button.clicked.connect(lambda: self.move_selected_job(-1))
+        self.queue_down_button.clicked.connect(lambda: self.move_selected_job(1))
+        self.queue_cancel_button.clicked.connect(self.cancel_selected_job)
+        self.queue_clear_button.clicked.connect(self.queue.remove_finished)
+        self.queue_start_button.clicked.connect(self.start_queue)
+
+        buttons = QHBoxLayout()
+        for button in (self.queue_add_button, self.queue_up_button, self.queue_down_button,
+                       self.queue_cancel_button, self.queue_clear_button):
+            buttons.addWidget(button)
+        start_layout = QHBoxLayout()
+        start_layout.addWidget(QLabel("同时处理任务数:"))
+        start_layout.addWidget(self.concurrent_spinbox)
+        start_layout.addWidget(self.queue_start_button)
+
+        group_layout = QVBoxLayout()
+        group_layout.addWidget(self.queue_table)
+        group_layout.addLayout(buttons)
+        group_layout.addLayout(start_layout)
+        group = QGroupBox("批量队列（添加时使用上面的前缀和位数，等待中的任务可以在表格中修改）")
+        group.setLayout(group_layout)
+        return group
+
+    def current_naming(self):
+        prefix = self.prefix_input.text().strip() or "BRSF"
+        digits = int(self.digits_input.text().strip()) if self.digits_input.text().strip().isdigit() else 3
+        return prefix, digits
+
+    def create_worker(self, mode, path, prefix, digits, workers):
+        return Worker(mode, path, prefix, digits,
+                      streaming=self.streaming_checkbox.isChecked(),
+                      workers=workers,
+                      chunk_size=self.chunk_size_spinbox.value(),
+                      policy=size_cap.POLICIES[self.policy_combo.currentData()],
+                      trace_path=stage_trace.trace_path(path) if self.trace_checkbox.isChecked() else None)
+
+    def create_queue_worker(self, job, workers):
+        return self.create_worker(job.mode, job.path, job.prefix, job.digits, workers)
+
+    def add_to_queue(self):
+        prefix, digits = self.current_naming()
+        if self.decompress_mode_radio.isChecked():
+            files, _ = QFileDialog.getOpenFileNames(
+                self, "选择压缩文件", "", "Compressed Files (*.zip *.7z *.rar *.tgz);;All Files (*)")
+            for file in files:
+                self.queue.add('decompress', os.path.normpath(file), prefix, digits)
+        else:
+            folder = QFileDialog.getExistingDirectory(self, "选择文件夹", "")
+            if folder:
+                self.queue.add('rename', os.path.normpath(folder), prefix, digits)
+
+    def selected_job_id(self):
+        rows = self.queue_table.selectionModel().selectedRows()
+        if not rows:
+            return None
+        return self.queue.jobs[rows[0].row()].id
+
+    def move_selected_job(self, offset):
+        job_id = self.selected_job_id()
+        if job_id is not None and self.queue.move(job_id, offset):
+            row = [job.id for job in self.queue.jobs].index(job_id)
+            self.queue_table.selectRow(row)
+
+    def cancel_selected_job(self):
+        job_id = self.selected_job_id()
+        if job_id is not None:
+            self.queue.cancel(job_id)
+
+    def start_queue(self):
+        if not any(job.status == job_queue.PENDING for job in self.queue.jobs):
+            QMessageBox.warning(self, "错误", "队列中没有等待处理的任务！")
+            return
+        self.queue.max_running = self.concurrent_spinbox.value()
+        self.queue.total_workers = self.workers_spinbox.value()
+        self.queue_start_button.setEnabled(False)
+        self.queue.start()
+
+    def on_queue_finished(self):
+        self.queue_start_button.setEnabled(True)
+        counts = {}
+        for job in self.queue.jobs:
+            counts[job.status] = counts.get(job.status, 0) + 1
+        summary = "，".join(f"{job_queue.STATUS_LABELS[status]} {count} 个" for status, count in counts.items())
+        QMessageBox.information(self, "完成", f"队列处理结束：{summary}")
+
+    def refresh_queue_table(self):
+        self.queue_table.blockSignals(True)
+        self.queue_table.setRowCount(len(self.queue.jobs))
+        for row, job in enumerate(self.queue.jobs):
+            self.queue_table.setItem(row, 0, QTableWidgetItem(Path(job.path).name))
+            self.queue_table.setItem(row, 1, QTableWidgetItem(job.prefix))
+            self.queue_table.setItem(row, 2, QTableWidgetItem(str(job.digits)))
+            self.queue_table.setItem(row, 3, QTableWidgetItem(""))
+            progress_bar = QProgressBar()
+            progress_bar.setRange(0, 100)
+            self.queue_table.setCellWidget(row, 4, progress_bar)
+            self.fill_queue_row(row, job)
+        self.queue_table.blockSignals(False)
+
+    def update_queue_row(self, job_id):
+        ids = [job.id for job in self.queue.jobs]
+        if job_id not in ids:
+            return
+        row = ids.index(job_id)
+        self.queue_table.blockSignals(True)
+        self.fill_queue_row(row, self.queue.jobs[row])
+        self.queue_table.blockSignals(False)
+
+    def fill_queue_row(self, row, job):
+        editable = Qt.ItemIsSelectable | Qt.ItemIsEnabled
+        if job.status == job_queue.PENDING:
+            editable |= Qt.ItemIsEditable
+        for column in (1, 2):
+            self.queue_table.item(row, column).setFlags(editable)
+        for column in (0, 3):
+            self.queue_table.item(row, column).setFlags(Qt.ItemIsSelectable | Qt.ItemIsEnabled)
+        status = job_queue.STATUS_LABELS[job.status]
+        if job.errors:
+            status += f"（{job.errors} 个错误）"
+        self.queue_table.item(row, 3).setText(status)
+        self.queue_table.item(row, 3).setToolTip(job.message)
+        self.queue_table.item(row, 0).setToolTip(job.path)
+        self.queue_table.cellWidget(row, 4).setValue(job.progress)
+
+    def queue_item_edited(self, item):
+        job = self.queue.jobs[item.row()]
+        if job.status != job_queue.PENDING:
+            return
+        text = item.text().strip()
+        if item.column() == 1:
+            job.prefix = text or job.prefix
+        elif item.column() == 2 and text.isdigit():
+            job.digits = int(text)
+        self.update_queue_row(job.id)
+
     def select_file_or_folder(self):
         options = QFileDialog.Options()
         if self.decompress_mode_radio.isChecked():
@@ -321,8 +597,7 @@ class DecompressRenameWindow(QMainWindow):
                 self.progress_label.setText(f"已选择文件夹: {Path(folder).name}")
 
     def start_processing(self):
-        prefix = self.prefix_input.text().strip() or "BRSF"
-        digits = int(self.digits_input.text().strip()) if self.digits_input.text().strip().isdigit() else 3
+        prefix, digits = self.current_naming()
 
         if not self.selected_path:
             QMessageBox.warning(self, "错误", "请先选择一个有效的压缩文件或文件夹！")
@@ -330,26 +605,33 @@ class DecompressRenameWindow(QMainWindow):
 
         mode = 'decompress' if self.decompress_mode_radio.isChecked() else 'rename'
 
-        # 重置进度条
+        # 重置进度条和耗时汇总
         self.progress_bar.setValue(0)
+        self.progress_bar.setFormat("%p%")
         self.progress_label.setText("开始处理...")
+        self.stage_summary = stage_trace.StageSummary()
+        self.stage_table.setVisible(False)
 
         # 禁用处理按钮，防止重复点击
         self.process_button.setEnabled(False)
 
         # 创建并启动工作线程
         self.thread = QThread()
-        self.worker = Worker(mode, self.selected_path, prefix, digits)
+        self.worker = self.create_worker(mode, self.selected_path, prefix, digits, self.workers_spinbox.value())
         self.worker.moveToThread(self.thread)
 
         # 连接信号
         self.thread.started.connect(self.worker.run)
         self.worker.progress_update.connect(self.update_progress_bar)
+        self.worker.eta_update.connect(self.update_eta)
         self.worker.status_update.connect(self.update_status_label)
         self.worker.error_signal.connect(self.show_error)
+        self.worker.stage_event.connect(self.stage_summary.add)
+        self.worker.completion_signal.connect(self.show_stage_summary)
         self.worker.completion_signal.connect(self.show_completion)
-        self.worker.completion_signal.connect(self.thread.quit)
-        self.worker.completion_signal.connect(self.worker.deleteLater)
+        # 出错时也要结束线程，否则按钮不会重新启用
+        self.worker.finished_signal.connect(self.thread.quit)
+        self.worker.finished_signal.connect(self.worker.deleteLater)
         self.thread.finished.connect(self.thread.deleteLater)
         self.thread.finished.connect(lambda: self.process_button.setEnabled(True))  # 重新启用按钮
 
@@ -363,6 +645,10 @@ class DecompressRenameWindow(QMainWindow):
             value = 100
         self.progress_bar.setValue(value)
 
+    def update_eta(self, seconds):
+        minutes, seconds = divmod(max(0, seconds), 60)
+        self.progress_bar.setFormat(f"%p%（预计剩余 {minutes}:{seconds:02d}）")
+
     def update_status_label(self, text):
         self.progress_label.setText(text)
 
@@ -371,9 +657,18 @@ class DecompressRenameWindow(QMainWindow):
         # 可选择将进度条重置或保持当前状态
         # self.progress_bar.setValue(0)
 
+    def show_stage_summary(self):
+        rows = self.stage_summary.display_rows()
+        self.stage_table.setRowCount(len(rows))
+        for row, values in enumerate(rows):
+            for column, value in enumerate(values):
+                self.stage_table.setItem(row, column, QTableWidgetItem(value))
+        self.stage_table.setVisible(bool(rows))
+
     def show_completion(self, message):
         # 确保进度条达到100%
         self.progress_bar.setValue(100)
+        self.progress_bar.setFormat("%p%")
         QMessageBox.information(self, "完成", message)
 
 
@@ -385,4 +680,5 @@ def main():
 
 
 if __name__ == "__main__":
+    multiprocessing.freeze_support()
     main()
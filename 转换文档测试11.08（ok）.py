@@ -1,14 +1,17 @@
 import sys
 import os
+import io
+import functools
+import zipfile
 import logging
-import tempfile
-import shutil
+import multiprocessing
+import time
 from PyQt5.QtCore import QThread, pyqtSignal
 from PyQt5.QtWidgets import (
     QApplication, QMainWindow, QPushButton, QVBoxLayout, QWidget, QFileDialog, QMessageBox,
-    QLabel, QHBoxLayout, QProgressBar, QSizePolicy, QLineEdit, QRadioButton, QButtonGroup, QGroupBox
+    QLabel, QHBoxLayout, QProgressBar, QSizePolicy, QLineEdit, QRadioButton, QButtonGroup, QGroupBox,
+    QCheckBox, QComboBox, QSpinBox, QTableWidget, QTableWidgetItem, QHeaderView
 )
-from PIL import Image as PILImage
 import openpyxl
 from openpyxl import Workbook
 from openpyxl.drawing.image import Image as OpenpyxlImage
@@ -17,6 +20,12 @@ from openpyxl.drawing.spreadsheet_drawing import AnchorMarker, OneCellAnchor
 from openpyxl.utils.units import pixels_to_EMU
 from openpyxl.drawing.xdr import XDRPositiveSize2D
 
+import catalog_manifest
+import catalog_prepare
+import image_pipeline
+import stage_trace
+import xlsx_stream
+
 # 配置日志
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
@@ -25,8 +34,11 @@ class ExcelWorker(QThread):
     finished = pyqtSignal(str)
     error = pyqtSignal(str)
     skipped = pyqtSignal(str)
+    stage_event = pyqtSignal(dict)  # 单张图片一个阶段的耗时，格式见 stage_trace
 
-    def __init__(self, folder, output_path, use_height, size_cm, buffer_percentage_width, buffer_percentage_height):
+    def __init__(self, folder, output_path, use_height, size_cm, buffer_percentage_width, buffer_percentage_height,
+                 streaming=True, embed_scale=catalog_prepare.DEFAULT_EMBED_SCALE, workers=1, chunk_size=4,
+                 incremental=False, trace_path=None):
         super().__init__()
         self.folder = folder
         self.output_path = output_path
@@ -34,29 +46,43 @@ class ExcelWorker(QThread):
         self.size_cm = size_cm
         self.buffer_percentage_width = buffer_percentage_width
         self.buffer_percentage_height = buffer_percentage_height
-
-    def convert_mpo_to_jpg(self, image_path):
-        """将 MPO 格式的图像转换为 JPEG 格式，并返回新的图像路径。"""
-        try:
-            with PILImage.open(image_path) as im:
-                if hasattr(im, 'n_frames') and im.n_frames > 1:
-                    im.seek(0)  # 选择第一个帧
-                rgb_im = im.convert('RGB')
-                new_image_path = os.path.splitext(image_path)[0] + '_converted.jpg'
-                rgb_im.save(new_image_path, format='JPEG')
-                logging.info(f"已将 {image_path} 转换为 {new_image_path}")
-                return new_image_path
-        except Exception as e:
-            logging.error(f"转换图像 {image_path} 时出错: {e}")
-            return None
+        # 流式写入：每张图片写入 xlsx 后立即释放，内存占用不随图片总大小增长
+        self.streaming = streaming
+        # 嵌入分辨率：显示尺寸的倍数，0 表示嵌入原图
+        self.embed_scale = embed_scale
+        # 探测、转换和重新采样在进程池中进行，工作簿仍在本线程按顺序组装
+        self.workers = workers
+        self.chunk_size = chunk_size
+        # 增量更新：根据 xlsx 旁的清单只处理新增或修改的图片，总是使用流式写入
+        self.incremental = incremental
+        # 不为 None 时把阶段耗时追加写入该 JSONL 文件
+        self.trace_path = trace_path
+        self.trace_writer = None
+
+    def trace_stage(self, item, stage, seconds, nbytes=None, **extra):
+        event = stage_trace.make_event(os.path.basename(self.folder), item, stage, seconds, nbytes, **extra)
+        if self.trace_writer is not None:
+            self.trace_writer.write(event)
+        self.stage_event.emit(event)
+
+    def catalog_settings(self):
+        """影响版面和嵌入内容的设置，任何一项变化都需要完整导出。"""
+        return {
+            'use_height': self.use_height,
+            'size_cm': self.size_cm,
+            'buffer_percentage_width': self.buffer_percentage_width,
+            'buffer_percentage_height': self.buffer_percentage_height,
+            'embed_scale': self.embed_scale,
+        }
 
     def run(self):
         skipped_files = []
-        processed_images = []
-        new_sizes = []
-        temp_dir = tempfile.mkdtemp()
+        writer = None
+        previous_zip = None
 
         try:
+            if self.trace_path:
+                self.trace_writer = stage_trace.TraceWriter(self.trace_path)
             allowed_extensions = {'.png', '.jpg', '.jpeg', '.bmp', '.gif'}
             image_files = [
                 f for f in os.listdir(self.folder)
@@ -70,21 +96,24 @@ class ExcelWorker(QThread):
                 self.error.emit("文件夹中没有找到支持的图片文件！")
                 return
 
-            workbook = Workbook()
-            sheet = workbook.active
-            sheet.title = "图片列表"
+            settings = self.catalog_settings()
+            manifest = catalog_manifest.load(self.output_path, settings) if self.incremental else None
+            if self.incremental and manifest is None:
+                logging.info("没有可用的导出清单或导出设置已改变，进行完整导出。")
+            previous = {entry['name']: entry for entry in manifest['entries']} if manifest else {}
 
-            sheet["A1"] = "ID"
-            sheet["B1"] = "Picture"
-            sheet["A1"].font = Font(bold=True)
-            sheet["B1"].font = Font(bold=True)
-            sheet["A1"].alignment = Alignment(horizontal='center', vertical='center')
-            sheet["B1"].alignment = Alignment(horizontal='center', vertical='center')
-            sheet.column_dimensions['A'].width = 100 / 7
+            # 大小和修改时间都没变的已导出图片直接沿用清单，其余图片需要探测
+            reused = {}
+            to_probe = []
+            for image_name in image_files:
+                entry = previous.get(image_name)
+                if entry and entry['media'] and catalog_manifest.is_unchanged(
+                        entry, os.stat(os.path.join(self.folder, image_name))):
+                    reused[image_name] = entry
+                else:
+                    to_probe.append(image_name)
 
-            total_files = len(image_files)
             self.progress.emit(0)
-            progress_step = 100 / total_files if total_files > 0 else 100
 
             buffer_factor_width = 1 + (self.buffer_percentage_width / 100)
             buffer_factor_height = 1 + (self.buffer_percentage_height / 100)
@@ -93,34 +122,31 @@ class ExcelWorker(QThread):
             desired_size_pixels = self.size_cm * cm_to_pixels
             desired_size_points = self.size_cm * 28.3465
 
-            max_new_size = 0
-            for image_name in image_files:
-                image_path = os.path.join(self.folder, image_name)
+            probe_results = image_pipeline.map_ordered(
+                functools.partial(catalog_prepare.probe_image, with_hash=self.incremental),
+                [os.path.join(self.folder, image_name) for image_name in to_probe],
+                self.workers, catalog_prepare.PROBE_CHUNK_SIZE)
+            probed = {}
+            for image_name, probe_result in zip(to_probe, probe_results):
                 logging.info(f"正在处理图片: {image_name}")
-
-                try:
-                    with PILImage.open(image_path) as im:
-                        original_width, original_height = im.size
-                        image_format = im.format
-                        if image_format not in ['JPEG', 'PNG']:
-                            if image_format == 'MPO':
-                                converted_path = self.convert_mpo_to_jpg(image_path)
-                                if converted_path and os.path.isfile(converted_path):
-                                    image_path = converted_path
-                                    image_format = 'JPEG'
-                                else:
-                                    logging.warning(f"无法转换图像 {image_name}，跳过。格式: {image_format}")
-                                    skipped_files.append(image_name)
-                                    continue
-                            else:
-                                logging.warning(f"图像格式不支持 {image_name}，跳过。格式: {image_format}")
-                                skipped_files.append(image_name)
-                                continue
-                except Exception as e:
-                    logging.warning(f"无法打开图像文件 {image_name}，跳过。错误: {str(e)}")
+                self.trace_stage(image_name, 'probe', probe_result.seconds)
+                if probe_result.warning:
+                    logging.warning(probe_result.warning)
                     skipped_files.append(image_name)
                     continue
+                probed[image_name] = probe_result
 
+            # 每一行对应一个 (清单条目, 操作)，操作为 copy（沿用已有图片）、new（重新处理）或 deleted
+            catalog = []
+            next_row = max((entry['row'] for entry in previous.values()), default=1) + 1
+            for image_name in image_files:
+                if image_name in reused:
+                    catalog.append((dict(reused[image_name]), 'copy'))
+                    continue
+                probe_result = probed.get(image_name)
+                if probe_result is None:
+                    continue
+                original_width, original_height = probe_result.width, probe_result.height
                 if self.use_height:
                     new_height = desired_size_pixels
                     new_width = (original_width * new_height) / original_height
@@ -128,43 +154,115 @@ class ExcelWorker(QThread):
                     new_width = desired_size_pixels
                     new_height = (original_height * new_width) / original_width
 
-                new_sizes.append((new_width, new_height))
-                processed_images.append(image_path)
-                if self.use_height:
-                    max_new_size = max(max_new_size, new_width)
+                old_entry = previous.get(image_name)
+                stat = os.stat(probe_result.path)
+                entry = {
+                    'name': image_name,
+                    'id': os.path.splitext(image_name)[0],
+                    'row': old_entry['row'] if old_entry else next_row,
+                    'size': stat.st_size,
+                    'mtime_ns': stat.st_mtime_ns,
+                    'sha1': probe_result.sha1,
+                    'width': new_width,
+                    'height': new_height,
+                    'format': probe_result.format,
+                    'media': None,
+                    'deleted': False,
+                }
+                if old_entry is None:
+                    next_row += 1
+                if old_entry and old_entry['media'] and probe_result.sha1 and old_entry['sha1'] == probe_result.sha1:
+                    # 只有修改时间变了，内容相同
+                    entry['media'] = old_entry['media']
+                    catalog.append((entry, 'copy'))
                 else:
-                    max_new_size = max(max_new_size, new_height)
+                    catalog.append((entry, 'new'))
+
+            # 清单中有但文件夹中已没有（或已无法读取）的图片保留原来的行并标记为已删除
+            present = {entry['name'] for entry, _ in catalog}
+            for image_name, old_entry in previous.items():
+                if image_name not in present:
+                    catalog.append((dict(old_entry, media=None, deleted=True), 'deleted'))
+            catalog.sort(key=lambda item: item[0]['row'])
 
-            if not new_sizes:
+            live_entries = [entry for entry, action in catalog if action != 'deleted']
+            if not live_entries:
                 self.error.emit("没有有效的图片被处理！")
                 return
 
             if self.use_height:
-                sheet.column_dimensions['B'].width = (max_new_size * buffer_factor_width) / 7.58
+                max_new_size = max(entry['width'] for entry in live_entries)
             else:
-                sheet.column_dimensions['B'].width = (self.size_cm * buffer_factor_width * cm_to_pixels) / 7.58
+                max_new_size = max(entry['height'] for entry in live_entries)
 
+            if self.use_height:
+                column_b_width = (max_new_size * buffer_factor_width) / 7.58
+            else:
+                column_b_width = (self.size_cm * buffer_factor_width * cm_to_pixels) / 7.58
+
+            if self.streaming or self.incremental:
+                if manifest is not None:
+                    # 先写到临时文件，完成后再替换原 xlsx，沿用的图片从原 xlsx 中复制
+                    previous_zip = zipfile.ZipFile(self.output_path)
+                    writer = xlsx_stream.StreamingCatalogWriter(self.output_path + '.tmp', "图片列表")
+                else:
+                    writer = xlsx_stream.StreamingCatalogWriter(self.output_path, "图片列表")
+                writer.set_cell(1, 1, "ID", xlsx_stream.STYLE_BOLD_CENTER)
+                writer.set_cell(1, 2, "Picture", xlsx_stream.STYLE_BOLD_CENTER)
+                writer.set_column_width(1, 100 / 7)
+                writer.set_column_width(2, column_b_width)
+            else:
+                workbook = Workbook()
+                sheet = workbook.active
+                sheet.title = "图片列表"
+
+                sheet["A1"] = "ID"
+                sheet["B1"] = "Picture"
+                sheet["A1"].font = Font(bold=True)
+                sheet["B1"].font = Font(bold=True)
+                sheet["A1"].alignment = Alignment(horizontal='center', vertical='center')
+                sheet["B1"].alignment = Alignment(horizontal='center', vertical='center')
+                sheet.column_dimensions['A'].width = 100 / 7
+                sheet.column_dimensions['B'].width = column_b_width
+
+            # 重新采样和编码在进程池中按顺序产出，本线程只负责写入
+            embed_jobs = (
+                (os.path.join(self.folder, entry['name']), entry['format'],
+                 (entry['width'], entry['height']), self.embed_scale)
+                for entry, action in catalog if action == 'new'
+            )
+            prepared_images = iter(image_pipeline.map_ordered(
+                catalog_prepare.prepare_embed, embed_jobs, self.workers, self.chunk_size))
+
+            progress_step = 100 / len(live_entries)
             processed_files = 0
-            for i, image_path in enumerate(processed_images):
-                image_name = os.path.basename(image_path)
-                image_id = os.path.splitext(image_name)[0]
+            for entry, action in catalog:
+                row = entry['row']
+                image_name = entry['name']
+                image_id = entry['id']
+                new_width, new_height = entry['width'], entry['height']
+                if self.use_height:
+                    row_height = desired_size_points * buffer_factor_height
+                else:
+                    row_height = (new_height / cm_to_pixels) * 28.3465 * buffer_factor_height
 
-                cell = sheet.cell(row=i + 2, column=1)
-                cell.value = image_id
-                cell.font = Font(bold=True)
-                cell.alignment = Alignment(horizontal='center', vertical='center')
+                if action == 'deleted':
+                    writer.set_cell(row, 1, f"{image_id}（已删除）", xlsx_stream.STYLE_BOLD_CENTER)
+                    writer.set_row_height(row, row_height)
+                    continue
 
-                try:
-                    new_width, new_height = new_sizes[i]
-                    if self.use_height:
-                        sheet.row_dimensions[i + 2].height = desired_size_points * buffer_factor_height
-                    else:
-                        sheet.row_dimensions[i + 2].height = (new_height / cm_to_pixels) * 28.3465 * buffer_factor_height
+                if writer is not None:
+                    writer.set_cell(row, 1, image_id, xlsx_stream.STYLE_BOLD_CENTER)
+                else:
+                    cell = sheet.cell(row=row, column=1)
+                    cell.value = image_id
+                    cell.font = Font(bold=True)
+                    cell.alignment = Alignment(horizontal='center', vertical='center')
 
-                    img = OpenpyxlImage(image_path)
-                    img.width = new_width
-                    img.height = new_height
+                # 每个 new 条目都要取出对应的结果，保持与任务顺序一致
+                prepared = next(prepared_images) if action == 'new' else None
 
+                try:
                     if self.use_height:
                         cell_width_pixels = max_new_size * buffer_factor_width
                         cell_height_pixels = self.size_cm * cm_to_pixels * buffer_factor_height
@@ -175,37 +273,95 @@ class ExcelWorker(QThread):
                     offset_x = (cell_width_pixels - new_width) / 2
                     offset_y = (cell_height_pixels - new_height) / 2
 
-                    emu_offset_x = pixels_to_EMU(offset_x)
-                    emu_offset_y = pixels_to_EMU(offset_y)
-
-                    marker = AnchorMarker(col=1, colOff=emu_offset_x, row=i + 1, rowOff=emu_offset_y)
-                    img.anchor = OneCellAnchor(_from=marker, ext=XDRPositiveSize2D(pixels_to_EMU(new_width), pixels_to_EMU(new_height)))
-                    sheet.add_image(img)
+                    if action == 'copy':
+                        writer.set_row_height(row, row_height)
+                        copy_start = time.perf_counter()
+                        copied_size = previous_zip.getinfo(entry['media']).file_size
+                        entry['media'] = writer.copy_image(previous_zip, entry['media'], entry['format'], 1, row - 1,
+                                                           offset_x, offset_y, new_width, new_height)
+                        self.trace_stage(image_name, 'copy', time.perf_counter() - copy_start, copied_size)
+                    else:
+                        # 按显示尺寸重新采样后的图片，只嵌入实际需要的像素
+                        image_data, embed_format, prepare_error, stages = prepared
+                        for stage, seconds, nbytes, extra in stages:
+                            self.trace_stage(image_name, stage, seconds, nbytes, **extra)
+                        if prepare_error:
+                            raise RuntimeError(prepare_error)
+                        entry['format'] = embed_format
+
+                        write_start = time.perf_counter()
+                        image_size = len(image_data)
+                        if writer is not None:
+                            # 图片数据写入压缩包后即释放，只保留锚点信息
+                            writer.set_row_height(row, row_height)
+                            entry['media'] = writer.add_image(image_data, embed_format, 1, row - 1,
+                                                              offset_x, offset_y, new_width, new_height)
+                            del image_data
+                        else:
+                            sheet.row_dimensions[row].height = row_height
+
+                            img = OpenpyxlImage(io.BytesIO(image_data))
+                            img.width = new_width
+                            img.height = new_height
+
+                            emu_offset_x = pixels_to_EMU(offset_x)
+                            emu_offset_y = pixels_to_EMU(offset_y)
+
+                            marker = AnchorMarker(col=1, colOff=emu_offset_x, row=row - 1, rowOff=emu_offset_y)
+                            img.anchor = OneCellAnchor(_from=marker, ext=XDRPositiveSize2D(pixels_to_EMU(new_width), pixels_to_EMU(new_height)))
+                            sheet.add_image(img)
+                        self.trace_stage(image_name, 'write', time.perf_counter() - write_start, image_size)
 
                     processed_files += 1
                     self.progress.emit(int((processed_files) * progress_step))
 
-                except IndexError as index_error:
-                    logging.error(f"插入图片 {image_name} 时发生错误: {index_error}")
-                    skipped_files.append(image_name)
-                    continue
                 except Exception as insert_error:
                     logging.error(f"插入图片 {image_name} 时发生错误: {insert_error}")
                     skipped_files.append(image_name)
+                    # 清单中不记录媒体部件，下次增量导出时重新处理
+                    entry['media'] = None
                     continue
 
             try:
-                workbook.save(self.output_path)
+                save_start = time.perf_counter()
+                if writer is not None:
+                    writer.close()
+                    if previous_zip is not None:
+                        previous_zip.close()
+                        previous_zip = None
+                        os.replace(writer.output_path, self.output_path)
+                else:
+                    workbook.save(self.output_path)
+                self.trace_stage(os.path.basename(self.output_path), 'save', time.perf_counter() - save_start,
+                                 os.path.getsize(self.output_path))
+                if self.incremental:
+                    catalog_manifest.save(self.output_path, settings, [entry for entry, _ in catalog])
+                else:
+                    catalog_manifest.remove(self.output_path)
                 logging.info(f"Excel 已生成并保存到 {self.output_path}！")
                 if skipped_files:
                     self.skipped.emit(", ".join(skipped_files))
-                self.finished.emit(f"Excel 已生成并保存到 {self.output_path}！")
+                message = f"Excel 已生成并保存到 {self.output_path}！"
+                if manifest is not None:
+                    new_count = sum(1 for _, action in catalog if action == 'new')
+                    deleted_count = sum(1 for _, action in catalog if action == 'deleted')
+                    message += (f"\n增量更新：处理 {new_count} 张，沿用 {len(live_entries) - new_count} 张，"
+                                f"标记删除 {deleted_count} 张。")
+                self.finished.emit(message)
             except Exception as save_error:
                 logging.error(f"保存 Excel 文件时出错: {save_error}")
                 self.error.emit(f"保存 Excel 文件时出错: {save_error}")
 
         finally:
-            shutil.rmtree(temp_dir)
+            if writer is not None:
+                writer.abort()
+                if writer.output_path != self.output_path and os.path.exists(writer.output_path):
+                    os.remove(writer.output_path)
+            if previous_zip is not None:
+                previous_zip.close()
+            if self.trace_writer is not None:
+                self.trace_writer.close()
+                self.trace_writer = None
 
 class ConvertDocWindow(QMainWindow):
     def __init__(self):
@@ -258,8 +414,47 @@ class ConvertDocWindow(QMainWindow):
         self.buffer_height_label = QLabel("输入单元格高度相对于图片高度的缓冲百分比，默认为10%。")
         self.buffer_height_label.setStyleSheet("font-size: 12px; color: #555;")
 
+        # 流式写入选项：大量图片时内存占用保持恒定
+        self.streaming_checkbox = QCheckBox("流式写入 Excel（图片很多时占用内存更少）")
+        self.streaming_checkbox.setChecked(True)
+
+        # 增量更新：只处理新增或修改的图片，需要流式写入
+        self.incremental_checkbox = QCheckBox("增量更新（只处理新增或修改的图片，需要流式写入）")
+        self.incremental_checkbox.setChecked(False)
+        self.incremental_checkbox.toggled.connect(self.toggle_incremental)
+
+        # 嵌入分辨率：按单元格显示尺寸的倍数缩小后再嵌入
+        self.embed_scale_label = QLabel("嵌入分辨率：")
+        self.embed_scale_combo = QComboBox()
+        for scale, label in catalog_prepare.EMBED_SCALES.items():
+            self.embed_scale_combo.addItem(label, scale)
+        self.embed_scale_combo.setCurrentIndex(
+            self.embed_scale_combo.findData(catalog_prepare.DEFAULT_EMBED_SCALE))
+        embed_scale_layout = QHBoxLayout()
+        embed_scale_layout.addWidget(self.embed_scale_label)
+        embed_scale_layout.addWidget(self.embed_scale_combo)
+
+        # 并行处理图片的进程数
+        self.workers_label = QLabel("并行进程数：")
+        self.workers_spinbox = QSpinBox()
+        self.workers_spinbox.setRange(1, max(1, image_pipeline.default_workers() * 2))
+        self.workers_spinbox.setValue(image_pipeline.default_workers())
+        embed_scale_layout.addWidget(self.workers_label)
+        embed_scale_layout.addWidget(self.workers_spinbox)
+
+        self.trace_checkbox = QCheckBox("保存阶段耗时记录（文件夹旁的 .trace.jsonl 文件）")
+
+        # 任务结束后显示各阶段的耗时汇总
+        self.stage_table = QTableWidget(0, len(stage_trace.SUMMARY_HEADERS))
+        self.stage_table.setHorizontalHeaderLabels(stage_trace.SUMMARY_HEADERS)
+        self.stage_table.horizontalHeader().setSectionResizeMode(QHeaderView.ResizeToContents)
+        self.stage_table.verticalHeader().setVisible(False)
+        self.stage_table.setEditTriggers(QTableWidget.NoEditTriggers)
+        self.stage_table.setVisible(False)
+        self.stage_summary = stage_trace.StageSummary()
+
         # 创建提示标签，用于通知用户跳过了不支持的文件
-        self.unsupported_files_label = QLabel("注意: 文件夹中包含不支持的文件类型（如 .mpo），这些文件将被忽略。")
+        self.unsupported_files_label = QLabel("注意: 文件夹中有无法读取的图片文件，这些文件将被忽略。")
         self.unsupported_files_label.setStyleSheet("font-size: 12px; color: red;")
         self.unsupported_files_label.setVisible(False)
 
@@ -305,9 +500,14 @@ class ConvertDocWindow(QMainWindow):
         main_layout.addWidget(self.height_input)
         main_layout.addWidget(self.width_input)
         main_layout.addWidget(buffer_group)
+        main_layout.addWidget(self.streaming_checkbox)
+        main_layout.addWidget(self.incremental_checkbox)
+        main_layout.addLayout(embed_scale_layout)
+        main_layout.addWidget(self.trace_checkbox)
         main_layout.addWidget(self.unsupported_files_label)
         main_layout.addWidget(self.selected_folder_label)
         main_layout.addWidget(self.progress_bar)
+        main_layout.addWidget(self.stage_table)
 
         central_widget = QWidget()
         central_widget.setLayout(main_layout)
@@ -371,6 +571,11 @@ class ConvertDocWindow(QMainWindow):
             self.height_input.setVisible(False)
             self.width_input.setVisible(True)
 
+    def toggle_incremental(self, checked):
+        if checked:
+            self.streaming_checkbox.setChecked(True)
+        self.streaming_checkbox.setEnabled(not checked)
+
     def select_folder(self):
         options = QFileDialog.Options()
         folder = QFileDialog.getExistingDirectory(self, "选择文件夹", options=options)
@@ -415,6 +620,8 @@ class ConvertDocWindow(QMainWindow):
         self.process_button.setEnabled(False)
         self.select_folder_button.setEnabled(False)
         self.unsupported_files_label.setVisible(False)
+        self.stage_summary = stage_trace.StageSummary()
+        self.stage_table.setVisible(False)
 
         parent_directory = os.path.dirname(self.selected_folder)
         excel_path = os.path.join(parent_directory, "converted.xlsx")
@@ -426,9 +633,17 @@ class ConvertDocWindow(QMainWindow):
                 use_height, 
                 size_cm, 
                 buffer_percentage_width, 
-                buffer_percentage_height
+                buffer_percentage_height,
+                streaming=self.streaming_checkbox.isChecked(),
+                embed_scale=self.embed_scale_combo.currentData(),
+                workers=self.workers_spinbox.value(),
+                incremental=self.incremental_checkbox.isChecked(),
+                trace_path=(stage_trace.trace_path(self.selected_folder)
+                            if self.trace_checkbox.isChecked() else None)
             )
             self.worker.progress.connect(self.update_progress)
+            self.worker.stage_event.connect(self.stage_summary.add)
+            self.worker.finished.connect(self.show_stage_summary)
             self.worker.finished.connect(self.show_finished)
             self.worker.finished.connect(lambda: self.progress_bar.setVisible(False))
             self.worker.finished.connect(lambda: self.process_button.setEnabled(True))
@@ -445,6 +660,14 @@ class ConvertDocWindow(QMainWindow):
     def update_progress(self, value):
         self.progress_bar.setValue(value)
 
+    def show_stage_summary(self):
+        rows = self.stage_summary.display_rows()
+        self.stage_table.setRowCount(len(rows))
+        for row, values in enumerate(rows):
+            for column, value in enumerate(values):
+                self.stage_table.setItem(row, column, QTableWidgetItem(value))
+        self.stage_table.setVisible(bool(rows))
+
     def show_finished(self, message):
         QMessageBox.information(self, "完成", message)
 
@@ -463,4 +686,5 @@ def main():
     sys.exit(app.exec_())
 
 if __name__ == "__main__":
+    multiprocessing.freeze_support()
     main()